@@ -0,0 +1,101 @@
+"""Simulate adaptive polling against webcams with known refresh periods.
+
+Run with `uv run python -m benchmarks.bench_adaptive`. Uses simulated time, so
+a whole day per webcam takes well under a second. Reports requests per day and
+how long after each refresh it was captured, for fixed and adaptive polling.
+"""
+
+import argparse
+import math
+import random
+from email.utils import formatdate
+
+from sfu_webcams_recorder.config.settings import INTERVAL
+from sfu_webcams_recorder.scheduler.adaptive import RefreshEstimator
+
+DAY = 86400
+
+
+def simulate(period: float, jitter: float, adaptive: bool, last_modified: bool):
+    """Poll one simulated webcam for a day.
+
+    Returns the number of requests, the captured share of refreshes, and the
+    mean delay from a refresh to its capture.
+    """
+
+    rng = random.Random(0)
+    phase = rng.uniform(0, period)
+
+    def refresh_at(n):
+        return phase + n * period + rng.uniform(0, jitter)
+
+    refreshes = [refresh_at(n) for n in range(math.ceil(DAY / period))]
+
+    estimator = RefreshEstimator()
+    now = 0.0
+    seen = -1
+    requests = 0
+    delays = []
+    index = 0
+
+    while now < DAY:
+        requests += 1
+
+        # The newest refresh at this time.
+        while index + 1 < len(refreshes) and refreshes[index + 1] <= now:
+            index += 1
+        current = index if refreshes[index] <= now else -1
+
+        changed = current != seen
+        if changed and current >= 0:
+            delays.append(now - refreshes[current])
+        seen = current
+
+        next_run = None
+        if adaptive:
+            modified = (
+                formatdate(refreshes[current]) if last_modified and changed else None
+            )
+            estimator.observe(now, changed, modified)
+            next_run = estimator.next_run(now)
+
+        now = next_run if next_run is not None else now + INTERVAL
+
+    captured = len(delays) / len(refreshes)
+    return requests, captured, sum(delays) / max(1, len(delays))
+
+
+def main():
+    """Run the simulation."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--periods", type=float, nargs="+", default=[5, 10, 30, 60, 120]
+    )
+    parser.add_argument("--jitter", type=float, default=1, help="Seconds")
+    args = parser.parse_args()
+
+    print(
+        f"{'Period':>8}{'Mode':>24}{'Requests/Day':>14}"
+        f"{'Saved/Day':>11}{'Captured':>10}{'Delay':>9}"
+    )
+
+    modes = (
+        ("fixed", False, False),
+        ("adaptive", True, False),
+        ("adaptive+last-modified", True, True),
+    )
+    for period in args.periods:
+        fixed_requests = None
+        for name, adaptive, last_modified in modes:
+            requests, captured, delay = simulate(
+                period, args.jitter, adaptive, last_modified
+            )
+            fixed_requests = fixed_requests or requests
+            print(
+                f"{period:>7.0f}s{name:>24}{requests:>14}"
+                f"{fixed_requests - requests:>11}{captured:>10.0%}{delay:>8.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark the "mjpeg" video format and its deferred transcode.
+
+Run with `uv run python -m benchmarks.bench_archive`. Makes a daily video of a
+synthetic day in the "h264" and "mjpeg" formats and reports the wall time, CPU
+time and size of each. Then transcodes the "mjpeg" video as the idle-time
+transcoder does, and checks a frame can still be read through its time index.
+Needs ffmpeg on the path.
+"""
+
+import argparse
+import resource
+import shutil
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import enter_workdir, fmt_mb
+from benchmarks.synthetic import generate_day
+
+
+def children_cpu_seconds() -> float:
+    """Get the CPU time used by finished child processes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640, help="Images in the day")
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--threads", type=int, help="ffmpeg threads")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("Skipped: ffmpeg is not on the path")
+        return
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR, VIDEOS_DIR
+    from sfu_webcams_recorder.io.timeindex import read_frame, video_path
+    from sfu_webcams_recorder.io.video import (
+        FrameFeed,
+        VideoFormat,
+        day_images,
+        encode_images,
+        image_timestamp,
+        is_mjpeg_video,
+        transcode_video,
+    )
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    day = datetime(2025, 1, 1)
+    day_name = day_folder_name(day)
+    code = "aqn"
+    camdir = PICTURES_DIR / day_name / code
+    generate_day(camdir, code, args.frames, start=day, size=args.size)
+    imgs = day_images(camdir)
+
+    print(f"Work directory: {workdir}")
+    print(f"Day: {len(imgs)} images of {args.size // 1000} KB")
+    print()
+    print(f"{'Format':<12}{'Wall':>9}{'CPU':>9}{'Video':>12}")
+
+    outfile = video_path(code, day_name)
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+
+    for video_format in (VideoFormat.H264, VideoFormat.MJPEG):
+        cpu = children_cpu_seconds()
+        start = time.perf_counter()
+        encode_images(
+            imgs,
+            outfile,
+            FrameFeed.PIPE,
+            args.threads,
+            video_format=video_format,
+        )
+        wall = time.perf_counter() - start
+        cpu = children_cpu_seconds() - cpu
+        size = fmt_mb(outfile.stat().st_size)
+        print(f"{video_format:<12}{wall:>8.2f}s{cpu:>8.2f}s{size:>12}")
+
+    # Leave the "mjpeg" video as a daily video is left, then transcode it.
+    timestamps_file = VIDEOS_DIR / day_name / "timestamps" / f"{code}.txt"
+    timestamps_file.parent.mkdir(parents=True, exist_ok=True)
+    timestamps_file.write_text("\n".join(image_timestamp(src) for src in imgs))
+    mjpeg = is_mjpeg_video(outfile)
+
+    cpu = children_cpu_seconds()
+    start = time.perf_counter()
+    transcode_video(code, day_name, args.threads)
+    wall = time.perf_counter() - start
+    cpu = children_cpu_seconds() - cpu
+    size = fmt_mb(outfile.stat().st_size)
+    print(f"{'transcode':<12}{wall:>8.2f}s{cpu:>8.2f}s{size:>12}")
+
+    # Synthetic images are 10 seconds apart.
+    entry, content = read_frame(code, day + timedelta(seconds=5 * len(imgs)))
+    print()
+    print(f"Was mjpeg before transcode: {mjpeg}, after: {is_mjpeg_video(outfile)}")
+    print(f"Middle frame after transcode: {entry.frame}, {len(content)} bytes")
+
+
+if __name__ == "__main__":
+    main()
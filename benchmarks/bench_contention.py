@@ -0,0 +1,166 @@
+"""Benchmark lock contention between webcam threads and the UI.
+
+Run with `uv run python -m benchmarks.bench_contention`. Simulated webcam
+threads make the state changes of a download back to back while a
+reader takes snapshots at the UI's rate. Compares one global lock for every
+change with per-webcam state locks and per-thread counters. Both tell the UI
+after every change, as the program does.
+"""
+
+import argparse
+import copy
+import threading
+import time
+from enum import StrEnum
+
+from benchmarks.common import TimedLock
+
+
+def run_threads(
+    cameras: int,
+    duration: float,
+    download,
+    snapshot,
+    ui_rate: float,
+    network_time: float,
+):
+    """Run simulated webcams and a reader, returning the number of downloads."""
+
+    stop = threading.Event()
+    downloads = [0] * cameras
+
+    def webcam(i):
+        while not stop.is_set():
+            download(i)
+            downloads[i] += 1
+            # Stands in for waiting on the network between downloads.
+            time.sleep(network_time)
+
+    def reader():
+        while not stop.is_set():
+            snapshot()
+            time.sleep(1 / ui_rate)
+
+    threads = [threading.Thread(target=webcam, args=(i,)) for i in range(cameras)]
+    threads.append(threading.Thread(target=reader))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    count = sum(downloads)
+    for thread in threads:
+        thread.join()
+
+    return count
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, nargs="+", default=[9, 100, 500])
+    parser.add_argument("--duration", type=float, default=2, help="Seconds")
+    parser.add_argument("--ui-rate", type=float, default=10, help="Snapshots/s")
+    parser.add_argument(
+        "--network-time", type=float, default=0.001, help="Seconds per download"
+    )
+    args = parser.parse_args()
+
+    from sfu_webcams_recorder.ui.state import (
+        DownloadState,
+        ProgramState,
+        WebcamState,
+    )
+
+    print(f"{'Webcams':>8}{'Mode':>10}{'Downloads/s':>14}{'Lock Wait/Download':>20}")
+
+    for cameras in args.cameras:
+        BenchWebcamID = StrEnum("BenchWebcamID", [f"CAM{i}" for i in range(cameras)])
+        cam_ids = list(BenchWebcamID)
+
+        # One global lock, as every change used to take, setting the UI's
+        # event after each change as the old `ProgramState.update` did.
+        states = {cam_id: WebcamState() for cam_id in cam_ids}
+        totals = {"bytes": 0, "images": 0, "requests": 0}
+        lock = TimedLock()
+        changed = threading.Event()
+
+        def global_download(i):
+            state = states[cam_ids[i]]
+            with lock:
+                state.download_state = DownloadState.DOWNLOADING
+                state.download_start_time = time.time()
+            changed.set()
+            with lock:
+                totals["bytes"] += 60_000
+                totals["images"] += 1
+            changed.set()
+            with lock:
+                state.error = None
+            changed.set()
+            with lock:
+                state.last_download_elapsed_time = 0.1
+                state.download_start_time = None
+                totals["requests"] += 1
+            changed.set()
+
+        def global_snapshot():
+            changed.clear()
+            with lock:
+                copies = {cam_id: copy.copy(s) for cam_id, s in states.items()}
+                dict(totals)
+            return copies
+
+        count = run_threads(
+            cameras,
+            args.duration,
+            global_download,
+            global_snapshot,
+            args.ui_rate,
+            args.network_time,
+        )
+        print(
+            f"{cameras:>8}{'global':>10}{count / args.duration:>14.0f}"
+            f"{lock.waited / count * 1e6:>18.2f}us"
+        )
+
+        # Per-webcam locks and per-thread counters.
+        program_state = ProgramState()
+        for cam_id in cam_ids:
+            program_state.webcam_state[cam_id] = WebcamState(lock=TimedLock())
+
+        def sharded_download(i):
+            cam_id = cam_ids[i]
+            program_state.update_webcam(
+                cam_id,
+                download_state=DownloadState.DOWNLOADING,
+                download_start_time=time.time(),
+            )
+            program_state.total_downloaded_bytes.add(60_000)
+            program_state.total_downloaded_images.add()
+            program_state.update_webcam(cam_id, error=None)
+            program_state.update_webcam(
+                cam_id, last_download_elapsed_time=0.1, download_start_time=None
+            )
+            program_state.total_requests.add()
+
+        def sharded_snapshot():
+            program_state.changed.clear()
+            return program_state.snapshot()
+
+        count = run_threads(
+            cameras,
+            args.duration,
+            sharded_download,
+            sharded_snapshot,
+            args.ui_rate,
+            args.network_time,
+        )
+        waited = sum(s.lock.waited for s in program_state.webcam_state.values())
+        print(
+            f"{cameras:>8}{'sharded':>10}{count / args.duration:>14.0f}"
+            f"{waited / count * 1e6:>18.2f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark rendering the dashboard.
+
+Run with `uv run python -m benchmarks.bench_dashboard`. Renders the dashboard
+for a number of webcams, with every webcam waiting in the video queue, and
+reports the time per render and how long the webcam state locks were held.
+Drawing is timed for a terminal of `--height` lines, as the live dashboard
+draws, and for every webcam, as a saved snapshot is. Then the share of a CPU
+core the live dashboard spends redrawing, at its fastest.
+"""
+
+import argparse
+import time
+from enum import StrEnum
+from io import StringIO
+
+from rich.console import Console
+
+from benchmarks.common import TimedLock
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, nargs="+", default=[9, 500])
+    parser.add_argument("--renders", type=int, default=50)
+    parser.add_argument("--height", type=int, default=50, help="Terminal lines")
+    args = parser.parse_args()
+
+    from sfu_webcams_recorder.ui.dashboard import (
+        MAX_DRAW_SHARE,
+        MIN_REDRAW_SECONDS,
+        render_table,
+    )
+    from sfu_webcams_recorder.ui.state import WebcamState, program_state
+
+    print(
+        f"{'Webcams':>8}{'Render':>12}{'Lock Held':>12}{'Draw':>12}"
+        f"{'Full Draw':>12}{'CPU':>8}"
+    )
+
+    for cameras in args.cameras:
+        BenchWebcamID = StrEnum("BenchWebcamID", [f"CAM{i}" for i in range(cameras)])
+
+        # Start from an empty queue with every webcam waiting in it.
+        while not program_state.video_queue.empty():
+            program_state.take_video_job()
+        program_state.webcam_state.clear()
+
+        now = time.time()
+        for cam_id in BenchWebcamID:
+            program_state.webcam_state[cam_id] = WebcamState(
+                next_run_time=now + 5,
+                last_download_elapsed_time=0.5,
+                lock=TimedLock(),
+            )
+            program_state.put_video_job("2025-1-1-wed", cam_id)
+
+        start = time.perf_counter()
+        for _ in range(args.renders):
+            renderable = render_table(height=args.height)
+        render = (time.perf_counter() - start) / args.renders
+
+        # Drawing to a terminal is the other half of the cost.
+        out = Console(file=StringIO(), width=200, height=args.height)
+        start = time.perf_counter()
+        for _ in range(args.renders):
+            out.print(renderable)
+        draw = (time.perf_counter() - start) / args.renders
+
+        full = render_table()
+        start = time.perf_counter()
+        for _ in range(args.renders):
+            out.print(full)
+        full_draw = (time.perf_counter() - start) / args.renders
+
+        # The live dashboard waits longer after a slow redraw.
+        cost = render + draw
+        cpu = cost / (cost + max(MIN_REDRAW_SECONDS, cost / MAX_DRAW_SHARE - cost))
+
+        held = (
+            sum(state.lock.held for state in program_state.webcam_state.values())
+            / args.renders
+        )
+        print(
+            f"{cameras:>8}{render * 1000:>10.2f}ms"
+            f"{held * 1000:>10.3f}ms{draw * 1000:>10.2f}ms"
+            f"{full_draw * 1000:>10.2f}ms{cpu:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
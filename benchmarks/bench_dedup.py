@@ -0,0 +1,83 @@
+"""Benchmark duplicate detection cost as a camera's day folder fills up.
+
+Run with `uv run python -m benchmarks.bench_dedup`. Compares saving an image
+with the in-memory digest cache against the old approach of globbing, sorting
+and hashing files on disk after every download.
+"""
+
+import argparse
+import hashlib
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.common import enter_workdir
+from benchmarks.synthetic import generate_day, synthetic_jpeg
+
+
+def legacy_save(camdir: Path, outfile: Path, content: bytes):
+    """Save an image and detect duplicates the way it was done before."""
+
+    def md5sum(path):
+        with path.open("rb") as f:
+            return hashlib.file_digest(f, "md5").hexdigest()
+
+    outfile.write_bytes(content)
+    files = sorted(camdir.glob("*.jpg"), key=lambda p: p.stat().st_mtime, reverse=True)
+    if len(files) > 1 and md5sum(files[1]) == md5sum(outfile):
+        outfile.unlink()
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640)
+    parser.add_argument("--steps", type=int, default=6)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR
+    from sfu_webcams_recorder.io.webcam import iso_filename_section, save_webcam_image
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    code = "bench"
+    camdir = PICTURES_DIR / day_folder_name() / code
+    images = [
+        synthetic_jpeg(size=args.size, tag=f"sample {i}".encode())
+        for i in range(args.samples)
+    ]
+
+    print(f"{'Images In Folder':>16}{'Cache':>14}{'Legacy':>14}")
+
+    filled = 0
+    for step in range(args.steps + 1):
+        target = max(1, args.frames * step // args.steps)
+        generate_day(
+            camdir,
+            code,
+            frames=target - filled,
+            start=datetime(2025, 1, 1) + timedelta(seconds=filled * 10),
+            size=args.size,
+        )
+        filled = target
+
+        start = time.perf_counter()
+        for content in images:
+            save_webcam_image(code, content)
+        cache = (time.perf_counter() - start) / len(images)
+
+        start = time.perf_counter()
+        for content in images:
+            outfile = camdir / f"{code}_{iso_filename_section()}.jpg"
+            legacy_save(camdir, outfile, content)
+        legacy = (time.perf_counter() - start) / len(images)
+
+        print(f"{filled:>16}{cache * 1000:>12.3f}ms{legacy * 1000:>12.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
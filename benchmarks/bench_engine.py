@@ -0,0 +1,77 @@
+"""Benchmark the asyncio download engine against many local webcams.
+
+Run with `uv run python -m benchmarks.bench_engine`. Serves `--cameras`
+webcams from a local stand-in host, runs the engine for `--duration` seconds
+and reports the achieved fetch rate and how far apart each webcam's fetches
+drift from the interval.
+"""
+
+import argparse
+import asyncio
+from enum import StrEnum
+
+from benchmarks.common import enter_workdir
+from benchmarks.fake_webcam_server import FakeWebcamServer
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=10, help="Seconds")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.scheduler.engine import DownloadEngine
+    from sfu_webcams_recorder.ui.state import WebcamState, program_state
+
+    BenchWebcamID = StrEnum("BenchWebcamID", [f"CAM{i}" for i in range(args.cameras)])
+
+    with FakeWebcamServer(args.cameras, latency=args.latency) as server:
+        cameras = dict(zip(BenchWebcamID, server.urls()))
+        for cam_id in cameras:
+            program_state.webcam_state[cam_id] = WebcamState()
+
+        engine = DownloadEngine(cameras, args.interval, args.concurrency)
+
+        async def run():
+            try:
+                await asyncio.wait_for(engine.run(), args.duration)
+            except TimeoutError:
+                pass
+
+        asyncio.run(run())
+        stats = server.stats
+
+    # The first round starts every webcam at once, so measure after it.
+    firsts = [times[0] for times in stats.request_times.values()]
+    startup = max(firsts) - min(firsts)
+    steady = stats.requests - len(firsts)
+    gaps = [
+        later - earlier
+        for times in stats.request_times.values()
+        for earlier, later in zip(times[1:], times[2:])
+    ]
+    jitter = sorted(abs(gap - args.interval) for gap in gaps)
+    expected = args.cameras / args.interval
+
+    print(f"Webcams: {args.cameras}, interval {args.interval}s")
+    print(f"Concurrency: {args.concurrency}, server latency {args.latency}s")
+    print(f"First round: {startup:.2f}s")
+    print(f"Fetch rate: {steady / (args.duration - startup):.1f}/s")
+    print(f"Scheduled rate: {expected:.1f}/s")
+    if jitter:
+        p50 = jitter[len(jitter) // 2]
+        p99 = jitter[int(len(jitter) * 0.99)]
+        print(f"Jitter p50: {p50 * 1000:.1f}ms")
+        print(f"Jitter p99: {p99 * 1000:.1f}ms")
+        print(f"Jitter max: {jitter[-1] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark extracting the capture at a time of day from many days of video.
+
+Run with `uv run python -m benchmarks.bench_extract`. Creates a synthetic
+archive of daily videos, then times `extract_captures` against extracting
+each day one after another by decoding its video from the start. Needs ffmpeg
+on the path.
+"""
+
+import argparse
+import shutil
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as day_time
+
+from benchmarks.bench_frame_at import decode_from_start
+from benchmarks.common import enter_workdir
+from benchmarks.synthetic import generate_day
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--frames", type=int, default=8640, help="Per day")
+    parser.add_argument("--size", type=int, default=20_000, help="Bytes per image")
+    parser.add_argument("--workers", type=int, help="Default: CPU cores")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("Skipped: ffmpeg is not on the path")
+        return
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR
+    from sfu_webcams_recorder.io.extract import archive_days, extract_captures
+    from sfu_webcams_recorder.io.timeindex import frame_at, video_path
+    from sfu_webcams_recorder.io.video import create_daily_video
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    code = "bench"
+    noon = day_time(12)
+    start = date(2025, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+    interval = 86400 / args.frames
+
+    print(f"Work directory: {workdir}")
+    print(f"Archive: {args.days} days x {args.frames} frames")
+
+    for day in archive_days(start, end):
+        midnight = datetime.combine(day, day_time())
+        name = day_folder_name(midnight)
+        generate_day(PICTURES_DIR / name / code, code, args.frames, interval, midnight)
+        create_daily_video(code, name)
+
+    print()
+    begin = time.perf_counter()
+    outfile = workdir / "frame.jpg"
+    for day in archive_days(start, end):
+        when = datetime.combine(day, noon)
+        video = video_path(code, day_folder_name(when))
+        decode_from_start(video, frame_at(code, when).frame, outfile)
+    serial = time.perf_counter() - begin
+    print(f"Serial, decoding from the start: {serial:.2f}s")
+
+    for timelapse in (False, True):
+        begin = time.perf_counter()
+        summary = extract_captures(
+            [code],
+            noon,
+            start,
+            end,
+            workdir / "extract",
+            timelapse=timelapse,
+            workers=args.workers,
+        )
+        elapsed = time.perf_counter() - begin
+        output = "timelapse" if timelapse else "JPEGs"
+        print(
+            f"extract_captures to {output}: {elapsed:.2f}s "
+            f"({summary.saved} saved, {serial / elapsed:.1f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark getting the frame of a daily video captured nearest a time.
+
+Run with `uv run python -m benchmarks.bench_frame_at`. Creates daily videos of
+different lengths from synthetic days, then times looking captures up in the
+time index and extracting them with `extract_frame`, compared to decoding the
+video from the start up to the frame. Needs ffmpeg on the path.
+"""
+
+import argparse
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import enter_workdir
+from benchmarks.synthetic import generate_day
+
+
+def decode_from_start(video, frame: int, outfile):
+    """Get a frame by decoding a video from the start, without an index."""
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        str(video),
+        "-vf",
+        f"select=eq(n\\,{frame})",
+        "-frames:v",
+        "1",
+        str(outfile),
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, nargs="+", default=[1000, 4000, 8640])
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--size", type=int, default=20_000, help="Bytes per image")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("Skipped: ffmpeg is not on the path")
+        return
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import KEYFRAME_INTERVAL, PICTURES_DIR
+    from sfu_webcams_recorder.io.timeindex import extract_frame, frame_at, video_path
+    from sfu_webcams_recorder.io.video import create_daily_video
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    start = datetime(2025, 1, 1)
+    day = day_folder_name(start)
+    outfile = workdir / "frame.jpg"
+
+    print(f"Work directory: {workdir}")
+    print(f"Keyframe interval: {KEYFRAME_INTERVAL} frames")
+    print()
+    print(
+        f"{'Frames':>8}{'Lookup':>12}{'Extract':>12}{'Extract max':>14}{'Decode':>12}"
+    )
+
+    for frames in args.frames:
+        code = f"bench{frames}"
+        interval = 86400 / frames
+        generate_day(PICTURES_DIR / day / code, code, frames, interval, start)
+        create_daily_video(code, day)
+
+        # Captures spread evenly through the video.
+        times = [
+            start + timedelta(seconds=interval * frames * (i + 0.5) / args.samples)
+            for i in range(args.samples)
+        ]
+
+        begin = time.perf_counter()
+        for when in times:
+            frame_at(code, when)
+        lookup = (time.perf_counter() - begin) / len(times)
+
+        extracts = []
+        for when in times:
+            begin = time.perf_counter()
+            extract_frame(code, when, outfile)
+            extracts.append(time.perf_counter() - begin)
+
+        # The last sample is the worst case for decoding from the start.
+        begin = time.perf_counter()
+        decode_from_start(
+            video_path(code, day), frame_at(code, times[-1]).frame, outfile
+        )
+        decode = time.perf_counter() - begin
+
+        print(
+            f"{frames:>8}{lookup * 1e6:>10.1f}us"
+            f"{sum(extracts) / len(extracts) * 1000:>10.1f}ms"
+            f"{max(extracts) * 1000:>12.1f}ms{decode * 1000:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark how images are fed to ffmpeg when creating a daily video.
+
+Run with `uv run python -m benchmarks.bench_frame_feed`. When ffmpeg is on the
+path the full `create_daily_video` is timed, otherwise only feeding the frames
+to a reader is.
+"""
+
+import argparse
+import shutil
+
+from benchmarks.common import enter_workdir, fmt_mb, measure
+from benchmarks.synthetic import generate_day
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640)
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR
+    from sfu_webcams_recorder.io.video import (
+        FrameFeed,
+        create_daily_video,
+        frame_sequence,
+        pipe_frames,
+    )
+
+    encode = shutil.which("ffmpeg") is not None
+    day = "2025-1-1-wed"
+    code = "bench"
+    camdir = PICTURES_DIR / day / code
+
+    print(f"Work directory: {workdir}")
+    print(f"Frames: {args.frames} x {fmt_mb(args.size)}")
+    print("Mode: " + ("full encode" if encode else "frame feed only (no ffmpeg)"))
+    print()
+    print(f"{'Feed':<10}{'Wall':>10}{'Written':>14}{'Read':>14}")
+
+    for feed in FrameFeed:
+        shutil.rmtree(camdir, ignore_errors=True)
+        imgs = generate_day(camdir, code, frames=args.frames, size=args.size)
+
+        with measure() as m:
+            if encode:
+                create_daily_video(code, day, feed)
+            elif feed == FrameFeed.PIPE:
+                pipe_frames(["dd", "of=/dev/null", "status=none"], imgs)
+            else:
+                with frame_sequence(imgs, feed) as pattern:
+                    for path in sorted(pattern.parent.iterdir()):
+                        path.read_bytes()
+
+        print(
+            f"{feed:<10}{m.wall_seconds:>9.2f}s"
+            f"{fmt_mb(m.written_bytes):>14}{fmt_mb(m.read_bytes):>14}"
+        )
+
+    shutil.rmtree(camdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
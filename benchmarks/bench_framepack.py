@@ -0,0 +1,76 @@
+"""Benchmark storing images as one file each compared to a pack per day.
+
+Run with `uv run python -m benchmarks.bench_framepack`. Saves a synthetic day
+of images both ways, then times listing them and, when ffmpeg is on the path,
+creating the daily video from them.
+"""
+
+import argparse
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import enter_workdir, fmt_mb, measure
+from benchmarks.synthetic import synthetic_jpeg
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640)
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--listings", type=int, default=20)
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR
+    from sfu_webcams_recorder.io.framepack import append_frame
+    from sfu_webcams_recorder.io.video import create_daily_video, day_images
+
+    encode = shutil.which("ffmpeg") is not None
+    day = "2025-1-1-wed"
+    start = datetime(2025, 1, 1)
+    content = synthetic_jpeg(size=args.size)
+
+    print(f"Work directory: {workdir}")
+    print(f"Frames: {args.frames} x {fmt_mb(args.size)}")
+    print()
+    print(f"{'Storage':<10}{'Save':>10}{'Files':>8}{'List':>10}{'Encode':>10}")
+
+    for storage in ("files", "pack"):
+        code = f"bench{storage}"
+        camdir = PICTURES_DIR / day / code
+        camdir.mkdir(parents=True)
+
+        begin = time.perf_counter()
+        for i in range(args.frames):
+            stamp = (start + timedelta(seconds=i * 10)).strftime("%Y%m%dT%H%M%S")
+            if storage == "pack":
+                append_frame(camdir, stamp, content)
+            else:
+                (camdir / f"{code}_{stamp}.jpg").write_bytes(content)
+        save = time.perf_counter() - begin
+        files = len(os.listdir(camdir))
+
+        begin = time.perf_counter()
+        for _ in range(args.listings):
+            day_images(camdir)
+        listing = (time.perf_counter() - begin) / args.listings
+
+        encode_time = "-"
+        if encode:
+            with measure() as m:
+                create_daily_video(code, day)
+            encode_time = f"{m.wall_seconds:.2f}s"
+
+        print(
+            f"{storage:<10}{save:>9.2f}s{files:>8}{listing * 1000:>8.1f}ms"
+            f"{encode_time:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
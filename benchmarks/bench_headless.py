@@ -0,0 +1,119 @@
+"""Benchmark the CPU used by the dashboard compared to running headless.
+
+Run with `uv run python -m benchmarks.bench_headless`. Simulates webcams whose
+state changes as downloads come and go, then measures the CPU the program uses
+for a while with the live dashboard drawing to a hidden terminal, and headless
+with the status socket answering a client once a second. Also reports the time
+to fetch the status over the socket.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import enter_workdir
+
+
+def cpu_percent(duration: float, run) -> float:
+    """Measure the process's CPU use while `run` is going, as a percentage."""
+    cpu = time.process_time()
+    start = time.perf_counter()
+    run(duration)
+    return (time.process_time() - cpu) / (time.perf_counter() - start) * 100
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per mode")
+    parser.add_argument("--requests", type=int, default=200, help="Status fetches")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    workdir = enter_workdir(args.workdir)
+
+    import rich
+
+    from sfu_webcams_recorder.config.settings import INTERVAL
+    from sfu_webcams_recorder.config.webcams import WebcamID
+    from sfu_webcams_recorder.ui.dashboard import ui_loop
+    from sfu_webcams_recorder.ui.state import (
+        DownloadState,
+        WebcamState,
+        program_state,
+    )
+    from sfu_webcams_recorder.ui.status_server import (
+        read_status,
+        start_status_server,
+        stop_status_server,
+    )
+
+    for cam_id in WebcamID:
+        program_state.webcam_state[cam_id] = WebcamState()
+
+    def simulate_downloads():
+        # Each webcam downloads for a moment once every INTERVAL, out of phase.
+        step = INTERVAL / len(WebcamID)
+        while True:
+            for cam_id in WebcamID:
+                now = time.time()
+                program_state.update_webcam(
+                    cam_id,
+                    download_state=DownloadState.DOWNLOADING,
+                    download_start_time=now,
+                    next_run_time=now + INTERVAL,
+                )
+                time.sleep(0.1)
+                program_state.update_webcam(
+                    cam_id,
+                    download_state=DownloadState.SLEEPING,
+                    download_start_time=None,
+                    last_download_elapsed_time=0.1,
+                )
+                time.sleep(max(0, step - 0.1))
+
+    threading.Thread(target=simulate_downloads, daemon=True).start()
+
+    def dashboard(duration):
+        # Draw to a hidden terminal of the usual size.
+        rich.reconfigure(
+            file=open(os.devnull, "w"), force_terminal=True, width=120, height=40
+        )
+        threading.Thread(target=ui_loop, daemon=True).start()
+        time.sleep(duration)
+
+    socket_path = workdir / "status.sock"
+
+    def headless(duration):
+        server = start_status_server(socket_path)
+        end = time.time() + duration
+        while time.time() < end:
+            time.sleep(1)
+            read_status(socket_path)
+        stop_status_server(server)
+
+    print(f"Simulating {len(WebcamID)} webcams for {args.duration:g}s per mode")
+    print()
+    print(f"{'Mode':<12}{'CPU':>8}")
+    print(f"{'Headless':<12}{cpu_percent(args.duration, headless):>7.2f}%")
+
+    server = start_status_server(socket_path)
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        read_status(socket_path)
+    fetch = (time.perf_counter() - start) / args.requests
+    stop_status_server(server)
+
+    # The dashboard thread can't be stopped, so it's measured last. It keeps
+    # stdout redirected to its hidden terminal, so print to the real one.
+    cpu = cpu_percent(args.duration, dashboard)
+    out = sys.__stdout__
+    print(f"{'Dashboard':<12}{cpu:>7.2f}%", file=out)
+    print(file=out)
+    print(f"Status over the socket: {fetch * 1000:.2f}ms per fetch", file=out)
+
+
+if __name__ == "__main__":
+    main()
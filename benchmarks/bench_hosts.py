@@ -0,0 +1,124 @@
+"""Benchmark staggered, capped and circuit-broken downloads from one host.
+
+Run with `uv run python -m benchmarks.bench_hosts`. Downloads every webcam of
+a local stand-in webcam host (`benchmarks/fake_webcam_server.py`) in a loop
+per webcam, first all starting at once with no host limits, then staggered
+over the interval with the per-host cap and circuit breaker. Partway through
+each run the host answers every request with an error for a while. Reports
+the most requests the host had at once, the busiest second, and how many
+requests the host got during the outage.
+"""
+
+import argparse
+import time
+from enum import StrEnum
+from threading import Event, Thread
+from urllib.parse import urlsplit
+
+from benchmarks.common import enter_workdir
+from benchmarks.fake_webcam_server import FakeWebcamServer
+
+
+def busiest_second(request_times: dict[int, list[float]]) -> int:
+    """Get the most requests that arrived within one second."""
+    times = sorted(t for camera_times in request_times.values() for t in camera_times)
+    busiest = 0
+    first = 0
+    for last, t in enumerate(times):
+        while t - times[first] >= 1:
+            first += 1
+        busiest = max(busiest, last - first + 1)
+    return busiest
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=9)
+    parser.add_argument("--interval", type=float, default=2, help="Seconds")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds")
+    parser.add_argument("--duration", type=float, default=40, help="Seconds per run")
+    parser.add_argument("--outage", type=float, default=15, help="Seconds")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import (
+        CIRCUIT_FAILURE_THRESHOLD,
+        HOST_MAX_CONCURRENCY,
+    )
+    from sfu_webcams_recorder.scheduler.download import download_once, next_run_after
+    from sfu_webcams_recorder.scheduler.hosts import HostGate, gates, stagger_offsets
+    from sfu_webcams_recorder.ui.state import WebcamState, program_state
+
+    BenchWebcamID = StrEnum("BenchWebcamID", [f"CAM{i}" for i in range(args.cameras)])
+
+    def download_loop(cam_id, url, offset, stop):
+        # Like `webcam_loop`, with the benchmark's interval and a way to stop.
+        next_run = time.time() + offset
+        while not stop.is_set():
+            stop.wait(max(0, next_run - time.time()))
+            if stop.is_set():
+                return
+            elapsed = download_once(cam_id, url, args.interval)
+            next_run = next_run_after(next_run, elapsed, args.interval)
+
+    def run(name, staggered):
+        server = FakeWebcamServer(args.cameras, latency=args.latency).start()
+        cameras = dict(zip(BenchWebcamID, server.urls()))
+        host = urlsplit(server.url(0)).netloc
+        if staggered:
+            gates[host] = HostGate(host)
+            offsets = stagger_offsets(cameras, args.interval)
+        else:
+            gates[host] = HostGate(host, None, None)
+            offsets = {}
+
+        for cam_id in cameras:
+            program_state.webcam_state[cam_id] = WebcamState()
+
+        stop = Event()
+        threads = [
+            Thread(
+                target=download_loop,
+                args=(cam_id, url, offsets.get(cam_id, 0), stop),
+                daemon=True,
+            )
+            for cam_id, url in cameras.items()
+        ]
+        for thread in threads:
+            thread.start()
+
+        # The outage starts a third of the way in.
+        time.sleep(args.duration / 3)
+        server.fail_for(args.outage)
+        time.sleep(args.duration * 2 / 3)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        server.stop()
+
+        stats = server.stats
+        print(
+            f"{name:<20}{stats.peak_in_flight:>10}"
+            f"{busiest_second(stats.request_times):>10}"
+            f"{stats.failed:>10}{stats.requests:>10}"
+        )
+
+    print(
+        f"{args.cameras} webcams every {args.interval:g}s, "
+        f"{args.latency:g}s latency, {args.outage:g}s outage"
+    )
+    print(
+        f"Host cap: {HOST_MAX_CONCURRENCY}, "
+        f"circuit opens after {CIRCUIT_FAILURE_THRESHOLD} failures"
+    )
+    print()
+    print(f"{'Run':<20}{'At once':>10}{'Per sec':>10}{'Outage':>10}{'Served':>10}")
+    run("All at once", False)
+    run("Staggered, gated", True)
+
+
+if __name__ == "__main__":
+    main()
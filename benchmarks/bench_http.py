@@ -0,0 +1,127 @@
+"""Benchmark downloading from a local stand-in webcam host.
+
+Run with `uv run python -m benchmarks.bench_http`. First checks that a repeat
+download sends the cache validators, and that the host's 304 is counted and
+saves nothing. Then compares a bare request per download with the pooled,
+conditional downloads of `download_webcam_image`.
+"""
+
+import argparse
+import time
+
+import requests
+
+from benchmarks.common import enter_workdir, fmt_mb
+from benchmarks.fake_webcam_server import FakeWebcamServer
+
+
+def check_unchanged(server: FakeWebcamServer):
+    """Check a repeat download of an unchanged image against the host.
+
+    It must send the validators from the first download, raise
+    `UnchangedWebcamImageError`, write no file, and count the bytes it saved.
+    """
+
+    from sfu_webcams_recorder.io.webcam import (
+        UnchangedWebcamImageError,
+        download_webcam_image,
+        validators,
+    )
+    from sfu_webcams_recorder.ui.state import program_state
+
+    url = server.url(0)
+    first = download_webcam_image("check", url)
+    cached = validators["check"]
+    assert server.stats.conditions[0] == {}, "first download was conditional"
+    assert cached.etag and cached.last_modified, "validators not remembered"
+
+    files = set(first.parent.iterdir())
+    unchanged = program_state.total_unchanged_images.value()
+    saved = program_state.total_saved_bytes.value()
+    try:
+        download_webcam_image("check", url)
+    except UnchangedWebcamImageError:
+        pass
+    else:
+        raise AssertionError("unchanged image did not raise")
+
+    assert server.stats.conditions[0] == {
+        "If-None-Match": cached.etag,
+        "If-Modified-Since": cached.last_modified,
+    }, "validators not sent"
+    assert set(first.parent.iterdir()) == files, "unchanged image wrote a file"
+    assert program_state.total_unchanged_images.value() == unchanged + 1
+    assert program_state.total_saved_bytes.value() == saved + cached.size
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=9)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--refresh", type=float, default=2, help="Seconds")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.io.webcam import (
+        DuplicateWebcamImageError,
+        UnchangedWebcamImageError,
+        download_webcam_image,
+        save_webcam_image,
+    )
+    from sfu_webcams_recorder.ui.state import program_state
+
+    with FakeWebcamServer(1, refresh=3600) as server:
+        check_unchanged(server)
+    print("Unchanged image check passed")
+    print()
+    saved = program_state.total_saved_bytes.value()
+
+    with FakeWebcamServer(args.cameras, refresh=args.refresh) as server:
+        urls = server.urls()
+
+        def bare(i, url):
+            r = requests.get(url, timeout=5)
+            try:
+                save_webcam_image(f"bare{i}", r.content)
+            except DuplicateWebcamImageError:
+                pass
+
+        def pooled(i, url):
+            try:
+                download_webcam_image(f"pooled{i}", url)
+            except (DuplicateWebcamImageError, UnchangedWebcamImageError):
+                pass
+
+        print(f"{'Method':<10}{'Per Fetch':>12}{'Body':>12}{'Unchanged':>12}")
+
+        for name, fetch in (("bare", bare), ("pooled", pooled)):
+            before = server.stats.body_bytes, server.stats.not_modified
+            elapsed = 0
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                for i, url in enumerate(urls):
+                    fetch(i, url)
+                elapsed += time.perf_counter() - start
+                time.sleep(args.interval)
+
+            fetches = args.rounds * len(urls)
+            body = server.stats.body_bytes - before[0]
+            unchanged = server.stats.not_modified - before[1]
+            print(
+                f"{name:<10}{elapsed / fetches * 1000:>10.2f}ms"
+                f"{fmt_mb(body):>12}{unchanged:>12}"
+            )
+
+    print()
+    print(
+        "Saved by unchanged checks: "
+        f"{fmt_mb(program_state.total_saved_bytes.value() - saved)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
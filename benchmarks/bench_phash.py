@@ -0,0 +1,117 @@
+"""Benchmark perceptual hashing of a full day of frames.
+
+Run with `uv run python -m benchmarks.bench_phash`. Needs the "perceptual"
+extra. Renders a synthetic day of webcam frames: a still scene with a
+timestamp overlay, re-encoded by the "camera" at a varying quality, with
+stretches where something moves and some frames sent twice. Reports the
+throughput of md5 and of the difference hash one frame at a time and in a
+batch, then how many frames the exact and near-duplicate filters reject at
+each threshold.
+"""
+
+import argparse
+import hashlib
+import time
+from io import BytesIO
+
+
+def render_day(frames: int, width: int, height: int) -> list[bytes]:
+    """Render a synthetic day of JPEG frames."""
+
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    scene = (
+        90 + 60 * np.sin(x / 70) * np.cos(y / 50) + rng.normal(0, 8, (height, width))
+    )
+
+    contents = []
+    for i in range(frames):
+        # Daylight changes slowly over the day.
+        light = 0.6 + 0.4 * np.sin(np.pi * i / frames)
+        pixels = np.clip(scene * light + rng.normal(0, 2, scene.shape), 0, 255)
+        img = Image.fromarray(pixels.astype(np.uint8)).convert("RGB")
+        draw = ImageDraw.Draw(img)
+
+        # Something moves around the view in one of every three stretches.
+        if (i // 200) % 3 == 0:
+            left = int(rng.integers(0, width - 120))
+            draw.rectangle((left, height // 2, left + 120, height // 2 + 90), "black")
+
+        draw.text((8, 8), f"SFU {i * 86400 // frames:06d}", fill="white")
+
+        # Some frames are sent twice, byte for byte.
+        if i % 25 == 0 and contents:
+            contents.append(contents[-1])
+            continue
+
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=80 + i % 10)
+        contents.append(buffer.getvalue())
+
+    return contents
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640, help="Frames in the day")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument(
+        "--thresholds", type=int, nargs="+", default=[0, 2, 4, 8], help="In bits"
+    )
+    args = parser.parse_args()
+
+    from sfu_webcams_recorder.io.perceptual import (
+        dhash,
+        dhashes,
+        hash_distance,
+        hash_distances,
+        perceptual_available,
+    )
+
+    if not perceptual_available():
+        print("Skipped: NumPy and Pillow are not installed")
+        return
+
+    start = time.perf_counter()
+    contents = render_day(args.frames, args.width, args.height)
+    size = sum(map(len, contents)) // len(contents)
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {len(contents)} frames of {size // 1000} KB in {elapsed:.1f}s")
+    print()
+
+    def rate(name, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24}{elapsed:>8.2f}s{len(contents) / elapsed:>10.0f} fps")
+        return result
+
+    digests = rate("md5", lambda: [hashlib.md5(c).hexdigest() for c in contents])
+    single = rate("dhash, one at a time", lambda: [dhash(c) for c in contents])
+    batch = rate("dhash, batch", lambda: dhashes(contents))
+    rate("distances, batch", lambda: hash_distances(batch))
+    assert [int(h) for h in batch] == single
+
+    print()
+    print(f"{'Threshold':>9}  {'Exact':>6}{'Near':>7}{'Kept':>7}")
+    for threshold in args.thresholds:
+        exact = near = 0
+        last_digest = last_hash = None
+        for digest, phash in zip(digests, single):
+            if digest == last_digest:
+                exact += 1
+            elif last_hash is not None and hash_distance(phash, last_hash) <= threshold:
+                near += 1
+            else:
+                last_digest, last_hash = digest, phash
+        kept = len(contents) - exact - near
+        print(f"{threshold:>9}  {exact:>6}{near:>7}{kept:>7}")
+
+
+if __name__ == "__main__":
+    main()
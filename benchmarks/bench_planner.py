@@ -0,0 +1,105 @@
+"""Benchmark the encode planner picking presets to meet a deadline.
+
+Run with `uv run python -m benchmarks.bench_planner`. Fills a scratch
+`PICTURES_DIR` with a synthetic day for every webcam and calibrates each
+preset's speed. Then, for each time budget, it picks a preset with
+`pick_preset`, encodes every webcam with it, and reports whether the encodes
+finished within the budget, compared to the fixed preset in
+`FFMPEG_CODEC_ARGS`. Needs ffmpeg on the path.
+"""
+
+import argparse
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.common import enter_workdir, fmt_mb
+from benchmarks.synthetic import generate_pictures
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=2000, help="Per webcam")
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--workers", type=int, help="Default: VIDEO_WORKERS")
+    parser.add_argument(
+        "--budgets",
+        type=float,
+        nargs="+",
+        default=[5, 15, 60],
+        help="Seconds to finish every webcam in",
+    )
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("Skipped: ffmpeg is not on the path")
+        return
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR, VIDEOS_DIR
+    from sfu_webcams_recorder.io.video import FrameFeed, day_images, encode_images
+    from sfu_webcams_recorder.scheduler.loop import (
+        ffmpeg_threads_per_job,
+        video_worker_count,
+    )
+    from sfu_webcams_recorder.scheduler.planner import (
+        calibrate,
+        calibration_key,
+        pick_preset,
+    )
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    day = datetime(2025, 1, 1)
+    pictures = generate_pictures(day, args.frames, args.size)
+    workers = args.workers or video_worker_count()
+    threads = ffmpeg_threads_per_job(workers)
+    day_dir = PICTURES_DIR / day_folder_name(day)
+    images = {code: day_images(day_dir / code) for code in pictures}
+    frames = sum(len(imgs) for imgs in images.values())
+    VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+
+    print(f"Work directory: {workdir}")
+    print(f"Webcams: {len(pictures)} x {args.frames} images of {args.size // 1000} KB")
+    print(f"Video workers: {workers}, ffmpeg threads each: {threads}")
+
+    start = time.perf_counter()
+    first = next(iter(images.values()))
+    calibration = calibrate(first[:120], threads, calibration_key(threads))
+    print(f"Calibration: {time.perf_counter() - start:.2f}s")
+    for preset, fps in calibration.fps.items():
+        print(f"  {preset:<10}{fps:>8.1f} fps")
+
+    def encode_all(preset):
+        def encode(code):
+            outfile = VIDEOS_DIR / f"{code}.mp4"
+            encode_images(images[code], outfile, FrameFeed.PIPE, threads, 0, preset)
+            return outfile.stat().st_size
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            size = sum(pool.map(encode, images))
+        return time.perf_counter() - start, size
+
+    parallel = min(workers, len(images))
+    print()
+    print(f"{'Budget':>8}  {'Preset':<10}{'Planned':>10}{'Took':>9}  Met  Videos")
+    for budget in args.budgets:
+        preset, planned_fps = pick_preset(calibration, frames / budget, parallel)
+        elapsed, size = encode_all(preset)
+        met = "yes" if elapsed <= budget else "no"
+        print(
+            f"{budget:>7.0f}s  {preset:<10}{planned_fps:>6.0f} fps"
+            f"{elapsed:>8.2f}s  {met:<4} {fmt_mb(size)}"
+        )
+
+    elapsed, size = encode_all(None)
+    fixed = f"{'fixed':>8}  {'(config)':<10}{'':>10}{elapsed:>8.2f}s"
+    print(f"{fixed}       {fmt_mb(size)}")
+
+
+if __name__ == "__main__":
+    main()
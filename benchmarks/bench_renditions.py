@@ -0,0 +1,167 @@
+"""Benchmark making a daily video's renditions in the same ffmpeg run.
+
+Run with `uv run python -m benchmarks.bench_renditions`. Renders a day of
+detailed frames with ffmpeg's test source, then makes the daily video alone,
+with its proxy and thumbnails in one run (`RENDITIONS`), and then the video
+followed by a second run that decodes it again for the proxy and thumbnails.
+Reports wall and CPU time of each. Needs ffmpeg on the path.
+"""
+
+import argparse
+import resource
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.common import enter_workdir, fmt_mb
+
+
+def children_cpu_seconds() -> float:
+    """Get the CPU time used by finished child processes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def render_frames(outdir: Path, frames: int, size: str):
+    """Render detailed test frames as numbered JPEGs."""
+    outdir.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc2=size={size}:rate=1",
+        "-frames:v",
+        str(frames),
+        "-q:v",
+        "3",
+        str(outdir / "%06d.jpg"),
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def lay_out_day(frames_dir: Path, camdir: Path, code: str, day: datetime):
+    """Copy rendered frames into a webcam's day folder under capture names."""
+    frames = sorted(frames_dir.glob("*.jpg"))
+    interval = 86400 / len(frames)
+    camdir.mkdir(parents=True, exist_ok=True)
+    for i, frame in enumerate(frames):
+        stamp = (day + timedelta(seconds=i * interval)).strftime("%Y%m%dT%H%M%S")
+        shutil.copyfile(frame, camdir / f"{code}_{stamp}.jpg")
+
+
+def second_pass(video: Path, outdir: Path, every: int):
+    """Decode a finished video again to make its proxy and thumbnails."""
+
+    from sfu_webcams_recorder.config.settings import (
+        PROXY_CODEC_ARGS,
+        PROXY_HEIGHT,
+        THUMBNAIL_HEIGHT,
+    )
+
+    outdir.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        str(video),
+        "-filter_complex",
+        f"[0:v]split=2[a][b];[a]scale=-2:{PROXY_HEIGHT}[proxy];"
+        f"[b]select='not(mod(n,{every}))',scale=-2:{THUMBNAIL_HEIGHT}[thumbnails]",
+        "-map",
+        "[proxy]",
+        *PROXY_CODEC_ARGS,
+        str(outdir / "proxy.mp4"),
+        "-map",
+        "[thumbnails]",
+        "-fps_mode",
+        "passthrough",
+        "-q:v",
+        "3",
+        str(outdir / "%06d.jpg"),
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640, help="Images in the day")
+    parser.add_argument("--size", default="1280x720", help="Image size")
+    parser.add_argument("--threads", type=int, help="ffmpeg threads")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("Skipped: ffmpeg is not on the path")
+        return
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import (
+        PICTURES_DIR,
+        THUMBNAIL_INTERVAL_MINUTES,
+        VIDEOS_DIR,
+    )
+    from sfu_webcams_recorder.io.timeindex import (
+        proxy_path,
+        thumbnails_path,
+        video_path,
+    )
+    from sfu_webcams_recorder.io.video import create_daily_video
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    day = datetime(2025, 1, 1)
+    day_name = day_folder_name(day)
+    code = "aqn"
+    camdir = PICTURES_DIR / day_name / code
+    frames_dir = workdir / "frames"
+
+    start = time.perf_counter()
+    render_frames(frames_dir, args.frames, args.size)
+    print(f"Work directory: {workdir}")
+    print(
+        f"Rendered {args.frames} frames of {args.size} "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    print()
+    print(f"{'Run':<28}{'Wall':>9}{'CPU':>9}")
+
+    def run(name, renditions, then=None):
+        shutil.rmtree(VIDEOS_DIR, ignore_errors=True)
+        lay_out_day(frames_dir, camdir, code, day)
+        cpu = children_cpu_seconds()
+        start = time.perf_counter()
+        create_daily_video(code, day_name, threads=args.threads, renditions=renditions)
+        if then is not None:
+            then()
+        wall = time.perf_counter() - start
+        cpu = children_cpu_seconds() - cpu
+        print(f"{name:<28}{wall:>8.2f}s{cpu:>8.2f}s")
+
+    every = args.frames * THUMBNAIL_INTERVAL_MINUTES // 1440
+    run("Video only", [])
+    run(
+        "Video, then second decode",
+        [],
+        lambda: second_pass(video_path(code, day_name), workdir / "second", every),
+    )
+    run("Video and renditions, once", ["proxy", "thumbnails"])
+
+    thumbnails = sorted(thumbnails_path(code, day_name).glob("*.jpg"))
+    print()
+    print(f"Video: {fmt_mb(video_path(code, day_name).stat().st_size)}")
+    print(f"Proxy: {fmt_mb(proxy_path(code, day_name).stat().st_size)}")
+    print(f"Thumbnails: {len(thumbnails)}, first {thumbnails[0].name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark how evenly shards split the webcams, and how many move on a resize.
+
+Run with `uv run python -m benchmarks.bench_shards`. Splits a list of made-up
+webcam codes between 1 to N shards with the recorder's rendezvous hashing and
+with a plain hash modulo the shard count. Reports the largest shard compared
+to an even split, and the share of webcams that change shard going from one
+shard count to the next. Only the webcams of the new shard should move.
+"""
+
+import argparse
+import hashlib
+import time
+
+
+def modulo_shard(code: str, count: int) -> int:
+    """Pick a shard by hashing the code modulo the shard count."""
+    digest = hashlib.blake2b(code.encode(), digest_size=8).digest()
+    return int.from_bytes(digest) % count
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--webcams", type=int, default=1000, help="Webcams to split")
+    parser.add_argument("--shards", type=int, default=16, help="Most shards")
+    args = parser.parse_args()
+
+    from sfu_webcams_recorder.scheduler.shards import shard_of
+
+    codes = [f"cam{i:05d}" for i in range(args.webcams)]
+
+    start = time.perf_counter()
+    for code in codes:
+        shard_of(code, args.shards)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Assigned {len(codes)} webcams to {args.shards} shards "
+        f"in {elapsed * 1000:.1f}ms"
+    )
+    print()
+    print(f"{'Shards':>6}  {'Largest / even':>28}  {'Moved from one fewer':>28}")
+    print(
+        f"{'':>6}  {'rendezvous':>14}{'modulo':>14}  {'rendezvous':>14}{'modulo':>14}"
+    )
+
+    last = None
+    for count in range(1, args.shards + 1):
+        assigned = {
+            "rendezvous": [shard_of(code, count) for code in codes],
+            "modulo": [modulo_shard(code, count) for code in codes],
+        }
+        even = len(codes) / count
+
+        largest = ""
+        moved = ""
+        for name, shards in assigned.items():
+            sizes = [shards.count(shard) for shard in range(count)]
+            largest += f"{max(sizes) / even:>14.2f}"
+            if last is None:
+                moved += f"{'-':>14}"
+            else:
+                changed = sum(a != b for a, b in zip(shards, last[name]))
+                moved += f"{changed / len(codes):>14.1%}"
+        last = assigned
+
+        print(f"{count:>6}  {largest}  {moved}")
+
+    print()
+    print("Going from N - 1 to N shards, the least that can move is 1 / N.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark streaming image downloads compared to reading them whole.
+
+Run with `uv run python -m benchmarks.bench_stream`. Downloads large images
+from a local stand-in webcam host (`benchmarks/fake_webcam_server.py`), first
+reading each response whole and saving it, as downloads used to, then with the
+streaming `download_webcam_image`. Reports the time and peak memory per
+download. Then the host cuts off some images halfway, and the broken JPEGs each
+way leaves for the daily video are counted.
+"""
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.common import enter_workdir, fmt_mb
+from benchmarks.fake_webcam_server import FakeWebcamServer
+
+
+def is_whole_jpeg(path: Path) -> bool:
+    """Check whether a file starts and ends like a JPEG."""
+    content = path.read_bytes()
+    return content.startswith(b"\xff\xd8") and content.rstrip(b"\x00").endswith(
+        b"\xff\xd9"
+    )
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--size", type=int, default=2_000_000, help="Bytes per image")
+    parser.add_argument("--truncate-every", type=int, default=5)
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    enter_workdir(args.workdir)
+
+    import requests
+
+    from sfu_webcams_recorder.config.settings import (
+        DOWNLOAD_CHUNK_SIZE,
+        DOWNLOAD_TIMEOUT_SECONDS,
+        PICTURES_DIR,
+    )
+    from sfu_webcams_recorder.io.webcam import (
+        InvalidWebcamImageError,
+        LastImage,
+        download_webcam_image,
+        host_session,
+        last_images,
+        save_webcam_image,
+        validators,
+    )
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    def buffered(code, url):
+        # Read the whole response, then hash and save it.
+        r = host_session(url).get(url, timeout=DOWNLOAD_TIMEOUT_SECONDS)
+        r.raise_for_status()
+        save_webcam_image(code, r.content)
+
+    def streamed(code, url):
+        download_webcam_image(code, url)
+
+    def fetch(fetcher, code, url):
+        # Download and save every time: forget the last image and validators,
+        # without making the next save look for the newest file.
+        validators.pop(code, None)
+        last_images[code] = LastImage(day_folder_name(), Path(), "")
+        try:
+            fetcher(code, url)
+        except (requests.RequestException, InvalidWebcamImageError):
+            pass
+
+    def run(name, fetcher, truncate_every=0):
+        server = FakeWebcamServer(
+            args.cameras, size=args.size, refresh=3600, truncate_every=truncate_every
+        )
+        with server:
+            urls = server.urls()
+
+            start = time.perf_counter()
+            for i in range(args.rounds):
+                for camera, url in enumerate(urls):
+                    # A new code each time, so no save replaces another.
+                    fetch(fetcher, f"{name}{camera}x{i}", url)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            peak = 0
+            for camera, url in enumerate(urls):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                fetch(fetcher, f"{name}{camera}mem", url)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+            tracemalloc.stop()
+
+        files = [
+            path
+            for path in PICTURES_DIR.rglob("*")
+            if path.is_file() and path.parent.name.startswith(name)
+        ]
+        jpegs = [path for path in files if path.suffix == ".jpg"]
+        broken = sum(not is_whole_jpeg(path) for path in jpegs)
+        parts = len(files) - len(jpegs)
+        fetches = args.rounds * len(urls)
+        print(
+            f"{name:<20}{elapsed / fetches * 1000:>10.2f}ms{fmt_mb(peak):>12}"
+            f"{len(jpegs) - broken:>8}{broken:>8}{parts:>8}"
+        )
+
+    print(
+        f"{args.cameras} webcams, {args.rounds} rounds, {fmt_mb(args.size)} images, "
+        f"{DOWNLOAD_CHUNK_SIZE // 1024} KB chunks"
+    )
+    print()
+    print(
+        f"{'Run':<20}{'Per Fetch':>12}{'Peak Mem':>12}"
+        f"{'Whole':>8}{'Broken':>8}{'Partial':>8}"
+    )
+    run("buffered", buffered)
+    run("streamed", streamed)
+    print()
+    print(f"One in {args.truncate_every} images cut off halfway:")
+    run("buffered-cut", buffered, args.truncate_every)
+    run("streamed-cut", streamed, args.truncate_every)
+
+
+if __name__ == "__main__":
+    main()
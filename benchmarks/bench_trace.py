@@ -0,0 +1,88 @@
+"""Benchmark the cost of download tracing, and show its report.
+
+Run with `uv run python -m benchmarks.bench_trace`. Downloads from a local
+stand-in webcam host (`benchmarks/fake_webcam_server.py`) with tracing off and
+on, and reports the time per download of each. Then writes the traces and
+prints the phase percentiles `trace-report` would show for a few webcams.
+"""
+
+import argparse
+import time
+
+from benchmarks.common import enter_workdir
+from benchmarks.fake_webcam_server import FakeWebcamServer
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=9)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--refresh", type=float, default=0.5, help="Seconds")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.io.webcam import (
+        DuplicateWebcamImageError,
+        UnchangedWebcamImageError,
+        download_webcam_image,
+        sessions,
+    )
+    from sfu_webcams_recorder.ui.trace import (
+        PERCENTILES,
+        phase_percentiles,
+        read_traces,
+        tracer,
+    )
+
+    tracer.path = workdir / "trace.jsonl"
+
+    with FakeWebcamServer(
+        args.cameras, refresh=args.refresh, latency=args.latency
+    ) as server:
+        urls = server.urls()
+
+        def run(name, enabled):
+            tracer.enabled = enabled
+            # Start each run with new connections.
+            sessions.clear()
+            elapsed = 0
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                for i, url in enumerate(urls):
+                    trace = tracer.begin(f"cam{i}")
+                    error = None
+                    try:
+                        download_webcam_image(f"cam{i}", url)
+                    except (DuplicateWebcamImageError, UnchangedWebcamImageError) as e:
+                        error = type(e).__name__
+                    tracer.end(trace, error)
+                elapsed += time.perf_counter() - start
+            fetches = args.rounds * len(urls)
+            print(f"{name:<14}{elapsed / fetches * 1000:>10.3f}ms per download")
+
+        run("Tracing off", False)
+        run("Tracing on", True)
+
+    start = time.perf_counter()
+    tracer.write()
+    traces = read_traces([tracer.path])
+    report = phase_percentiles(traces)
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"Wrote and summarized {len(traces)} traces in {elapsed * 1000:.1f}ms")
+
+    header = "".join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES)
+    for code in list(report)[:3]:
+        print()
+        print(f"{code:<10}{'Count':>8}{header}")
+        for phase, (count, values) in report[code].items():
+            cells = "".join(f"{value:>10.2f}" for value in values)
+            print(f"  {phase:<8}{count:>8}{cells}")
+
+
+if __name__ == "__main__":
+    main()
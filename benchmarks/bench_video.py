@@ -0,0 +1,72 @@
+"""Benchmark creating every webcam's daily video, as happens at midnight.
+
+Run with `uv run python -m benchmarks.bench_video`. Fills a scratch
+`PICTURES_DIR` with a synthetic day for every webcam, then creates the videos
+with the configured video workers and reports wall time and disk I/O. Needs
+ffmpeg on the path.
+"""
+
+import argparse
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.common import enter_workdir, fmt_mb, measure
+from benchmarks.synthetic import generate_pictures
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=8640, help="Per webcam")
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--workers", type=int, help="Default: VIDEO_WORKERS")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        print("Skipped: ffmpeg is not on the path")
+        return
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.io.video import create_daily_video
+    from sfu_webcams_recorder.scheduler.loop import (
+        ffmpeg_threads_per_job,
+        video_worker_count,
+    )
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    day = datetime(2025, 1, 1)
+    pictures = generate_pictures(day, args.frames, args.size)
+    workers = args.workers or video_worker_count()
+    threads = ffmpeg_threads_per_job(workers)
+
+    print(f"Work directory: {workdir}")
+    print(f"Webcams: {len(pictures)} x {args.frames} images of {args.size // 1000} KB")
+    print(f"Video workers: {workers}, ffmpeg threads each: {threads}")
+
+    durations = {}
+
+    def encode(code):
+        start = time.perf_counter()
+        frames = create_daily_video(code, day_folder_name(day), threads=threads)
+        durations[code] = time.perf_counter() - start
+        return frames
+
+    with measure() as m:
+        with ThreadPoolExecutor(workers) as pool:
+            frames = sum(pool.map(encode, pictures))
+
+    print()
+    for code, elapsed in durations.items():
+        print(f"{code:<10}{elapsed:>9.2f}s")
+    print()
+    print(f"Wall time: {m.wall_seconds:.2f}s ({frames / m.wall_seconds:.0f} fps)")
+    print(f"Disk written: {fmt_mb(m.written_bytes)}")
+    print(f"Disk read: {fmt_mb(m.read_bytes)}")
+
+
+if __name__ == "__main__":
+    main()
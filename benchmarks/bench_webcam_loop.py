@@ -0,0 +1,89 @@
+"""Benchmark the download loops against a local stand-in webcam host.
+
+Run with `uv run python -m benchmarks.bench_webcam_loop`. Starts a download
+loop for each served webcam, with a thread per webcam like `run_loop` or with
+the asyncio engine, and reports download throughput and how far apart each
+webcam's downloads drift from the interval.
+"""
+
+import argparse
+import time
+from enum import StrEnum
+from threading import Thread
+
+from benchmarks.common import enter_workdir
+from benchmarks.fake_webcam_server import FakeWebcamServer
+
+
+def report(request_times: dict[int, list[float]], interval: float):
+    """Print throughput and jitter from the times the server saw requests."""
+
+    # Webcams start spread over the interval, so measure after the first round.
+    firsts = [times[0] for times in request_times.values()]
+    startup = max(firsts) - min(firsts)
+    steady = sum(len(times) - 1 for times in request_times.values())
+    span = max(times[-1] for times in request_times.values()) - min(firsts)
+    gaps = [
+        later - earlier
+        for times in request_times.values()
+        for earlier, later in zip(times[1:], times[2:])
+    ]
+    jitter = sorted(abs(gap - interval) for gap in gaps)
+
+    print(f"First round: {startup:.2f}s")
+    print(f"Downloads: {steady / span:.1f}/s")
+    print(f"Scheduled: {len(request_times) / interval:.1f}/s")
+    if jitter:
+        print(f"Jitter p50: {jitter[len(jitter) // 2] * 1000:.1f}ms")
+        print(f"Jitter p99: {jitter[int(len(jitter) * 0.99)] * 1000:.1f}ms")
+        print(f"Jitter max: {jitter[-1] * 1000:.1f}ms")
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--cameras", type=int, default=9)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds")
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--refresh", type=float, default=30, help="Seconds")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.config.settings import INTERVAL
+    from sfu_webcams_recorder.scheduler.engine import engine_loop
+    from sfu_webcams_recorder.scheduler.loop import webcam_loop
+    from sfu_webcams_recorder.ui.state import WebcamState, program_state
+
+    BenchWebcamID = StrEnum("BenchWebcamID", [f"CAM{i}" for i in range(args.cameras)])
+
+    server = FakeWebcamServer(
+        args.cameras, args.size, args.refresh, args.latency
+    ).start()
+    cameras = dict(zip(BenchWebcamID, server.urls()))
+    for cam_id in cameras:
+        program_state.webcam_state[cam_id] = WebcamState()
+
+    # The loops run forever, so they are left to end with the process.
+    if args.engine == "asyncio":
+        Thread(target=engine_loop, args=(cameras,), daemon=True).start()
+    else:
+        for cam_id, url in cameras.items():
+            Thread(target=webcam_loop, args=(cam_id, url), daemon=True).start()
+
+    time.sleep(args.duration)
+    request_times = {
+        camera: list(times) for camera, times in server.stats.request_times.items()
+    }
+    server.stop()
+
+    print(f"Engine: {args.engine}, webcams: {args.cameras}, interval: {INTERVAL}s")
+    print(f"Server latency: {args.latency}s, refresh: {args.refresh}s")
+    report(request_times, INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark how long saving an image holds up a downloader, with a busy disk.
+
+Run with `uv run python -m benchmarks.bench_write_behind`. Simulated webcams
+save images as fast as `--rate` allows while another thread keeps the disk
+busy with large fsynced writes, like ffmpeg at midnight. Saving on the
+downloader thread is compared with the write-behind queue (`WRITE_BEHIND`).
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from benchmarks.common import enter_workdir, fmt_mb
+from benchmarks.synthetic import synthetic_jpeg
+
+
+def disk_hog(path, stop: threading.Event, chunk_mb: int):
+    """Write and fsync large chunks until stopped."""
+    chunk = os.urandom(chunk_mb * 1024 * 1024)
+    with open(path, "wb") as f:
+        while not stop.is_set():
+            f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Get a percentile of some values."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=9)
+    parser.add_argument("--rate", type=float, default=5, help="Saves/s per webcam")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds")
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--hog-mb", type=int, default=64, help="Busy writer chunk")
+    parser.add_argument("--workdir", help="Scratch directory (default: temporary)")
+    args = parser.parse_args()
+
+    workdir = enter_workdir(args.workdir)
+
+    from sfu_webcams_recorder.io import webcam
+    from sfu_webcams_recorder.io.writer import disk_writer
+    from sfu_webcams_recorder.ui.state import program_state
+
+    print(f"Work directory: {workdir}")
+    print(f"Webcams: {args.cameras} saving {args.rate}/s of {fmt_mb(args.size)}")
+    print(f"Busy writer: {args.hog_mb} MB fsynced chunks")
+    print()
+    print(f"{'Mode':<14}{'Saves':>8}{'p50':>10}{'p99':>10}{'max':>10}{'Flush':>10}")
+
+    for mode in ("sync", "write-behind"):
+        if mode == "write-behind":
+            disk_writer.start()
+
+        stop = threading.Event()
+        hog = threading.Thread(
+            target=disk_hog, args=(workdir / "hog.bin", stop, args.hog_mb)
+        )
+        hog.start()
+
+        latencies = []
+        serial = iter(range(10**9))
+
+        def downloader(camera: int):
+            code = f"{mode}{camera}"
+            deadline = time.monotonic() + args.duration
+            while time.monotonic() < deadline:
+                content = synthetic_jpeg(size=args.size, tag=str(next(serial)).encode())
+                begin = time.perf_counter()
+                webcam.save_webcam_image(code, content)
+                latencies.append(time.perf_counter() - begin)
+                time.sleep(1 / args.rate)
+
+        # Give every save its own name, since names have one second resolution.
+        webcam.iso_filename_section = lambda: f"20250101T{next(serial):06d}"
+
+        threads = [
+            threading.Thread(target=downloader, args=(camera,))
+            for camera in range(args.cameras)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        begin = time.perf_counter()
+        disk_writer.flush()
+        flush = time.perf_counter() - begin
+
+        stop.set()
+        hog.join()
+
+        print(
+            f"{mode:<14}{len(latencies):>8}"
+            f"{percentile(latencies, 0.5) * 1000:>8.1f}ms"
+            f"{percentile(latencies, 0.99) * 1000:>8.1f}ms"
+            f"{max(latencies) * 1000:>8.1f}ms{flush:>9.2f}s"
+        )
+
+    print()
+    print(f"Waited for queue space: {program_state.total_write_wait_ms.value()}ms")
+    print(f"Failed writes: {program_state.total_failed_writes.value()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Helpers shared by the benchmarks."""
+
+import os
+import resource
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+
+def enter_workdir(path: str | None = None) -> Path:
+    """Change into a scratch working directory.
+
+    The recorder resolves its media and log folders from the working directory
+    when its settings are imported, so call this before importing
+    `sfu_webcams_recorder`.
+    """
+
+    workdir = Path(path) if path else Path(tempfile.mkdtemp(prefix="sfu-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+    return workdir
+
+
+def io_counters() -> dict[str, int]:
+    """Read this process's I/O counters, plus finished children's block I/O."""
+
+    counters = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, value = line.split(":")
+                counters[key] = int(value)
+    except OSError:
+        pass
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    counters["children_inblock"] = children.ru_inblock
+    counters["children_oublock"] = children.ru_oublock
+    return counters
+
+
+@dataclass(slots=True)
+class Measurement:
+    """Wall time and storage I/O used by a block of code."""
+
+    wall_seconds: float = 0
+    written_bytes: int = 0
+    read_bytes: int = 0
+
+
+class measure:
+    """Context manager that records wall time and storage I/O of its block."""
+
+    def __enter__(self) -> Measurement:
+        self.result = Measurement()
+        self.before = io_counters()
+        self.start = time.perf_counter()
+        return self.result
+
+    def __exit__(self, *exc):
+        self.result.wall_seconds = time.perf_counter() - self.start
+        after = io_counters()
+
+        def delta(key):
+            return after.get(key, 0) - self.before.get(key, 0)
+
+        # Storage layer bytes only, so pipes and page cache hits don't count.
+        # Children report 512 byte blocks.
+        self.result.written_bytes = (
+            delta("write_bytes") + delta("children_oublock") * 512
+        )
+        self.result.read_bytes = delta("read_bytes") + delta("children_inblock") * 512
+        return False
+
+
+def fmt_mb(size_bytes: float) -> str:
+    """Format bytes as MB."""
+    return f"{size_bytes / (1024**2):.1f} MB"
+
+
+class TimedLock:
+    """A lock that adds up how long it was waited for and held."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.waited = 0.0
+        self.held = 0.0
+        self.acquired = 0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.start = time.perf_counter()
+        self.waited += self.start - start
+        self.acquired += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.held += time.perf_counter() - self.start
+        self.lock.release()
+        return False
@@ -0,0 +1,243 @@
+"""A local HTTP server that stands in for the webcam host.
+
+Serves synthetic JPEGs at `/<n>.jpg`. Each webcam's image changes every
+`refresh` seconds, at a different phase per webcam, and the server honours
+`If-None-Match` and `If-Modified-Since` like a static file server would. With
+`truncate_every`, every nth image is cut off halfway, with no Content-Length,
+like a camera dropping the connection.
+
+Run it on its own with `uv run python -m benchmarks.fake_webcam_server`.
+"""
+
+import argparse
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import synthetic_jpeg
+
+
+@dataclass(slots=True)
+class ServerStats:
+    """Counts of what the server has served."""
+
+    requests: int = 0
+    not_modified: int = 0
+    body_bytes: int = 0
+    # Requests answered with an error during an outage.
+    failed: int = 0
+    # Images cut off halfway.
+    truncated: int = 0
+    # Requests being answered at once, now and at most.
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    request_times: dict[int, list[float]] = field(default_factory=dict)
+    # The If-None-Match and If-Modified-Since of each webcam's last request.
+    conditions: dict[int, dict[str, str]] = field(default_factory=dict)
+
+
+class FakeWebcamServer:
+    """Serve synthetic webcam images on a background thread."""
+
+    def __init__(
+        self,
+        cameras: int = 9,
+        size: int = 60_000,
+        refresh: float = 30,
+        latency: float = 0,
+        truncate_every: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.cameras = cameras
+        self.size = size
+        self.refresh = refresh
+        self.latency = latency
+        self.truncate_every = truncate_every
+        self.stats = ServerStats()
+        self.lock = threading.Lock()
+        # Answer every request with a 503 until this time.
+        self.down_until = 0.0
+        self.images: dict[int, tuple[int, bytes]] = {}
+
+        self.httpd = ThreadingHTTPServer((host, port), self.handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def handler_class(self):
+        """Build a request handler bound to this server."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def url(self, camera: int) -> str:
+        """Get the URL of a webcam."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/{camera}.jpg"
+
+    def urls(self) -> list[str]:
+        """Get the URLs of every webcam."""
+        return [self.url(camera) for camera in range(self.cameras)]
+
+    def version(self, camera: int) -> tuple[int, float]:
+        """Get a webcam's current image version and when it was made."""
+        phase = self.refresh * camera / max(1, self.cameras)
+        version = int((time.time() - phase) // self.refresh)
+        return version, version * self.refresh + phase
+
+    def image(self, camera: int, version: int) -> bytes:
+        """Get the image bytes for a webcam's image version."""
+        with self.lock:
+            cached = self.images.get(camera)
+            if cached is None or cached[0] != version:
+                tag = f"{camera}-{version}".encode()
+                cached = (version, synthetic_jpeg(size=self.size, tag=tag))
+                self.images[camera] = cached
+            return cached[1]
+
+    def fail_for(self, seconds: float):
+        """Start an outage, answering every request with a 503."""
+        self.down_until = time.time() + seconds
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        """Answer one request, counting how many are answered at once."""
+        with self.lock:
+            self.stats.in_flight += 1
+            self.stats.peak_in_flight = max(
+                self.stats.peak_in_flight, self.stats.in_flight
+            )
+        try:
+            self.answer(request)
+        finally:
+            with self.lock:
+                self.stats.in_flight -= 1
+
+    def answer(self, request: BaseHTTPRequestHandler):
+        """Answer one request."""
+        if self.latency:
+            time.sleep(self.latency)
+
+        if time.time() < self.down_until:
+            with self.lock:
+                self.stats.failed += 1
+            request.send_error(503)
+            return
+
+        try:
+            camera = int(request.path.strip("/").removesuffix(".jpg"))
+        except ValueError:
+            camera = -1
+        if not 0 <= camera < self.cameras:
+            request.send_error(404)
+            return
+
+        version, modified = self.version(camera)
+        etag = f'"{camera}-{version}"'
+        last_modified = formatdate(modified, usegmt=True)
+
+        not_modified = request.headers.get("If-None-Match") == etag
+        since = request.headers.get("If-Modified-Since")
+        if since and not request.headers.get("If-None-Match"):
+            try:
+                not_modified = parsedate_to_datetime(since).timestamp() >= int(modified)
+            except (TypeError, ValueError):
+                pass
+
+        with self.lock:
+            self.stats.requests += 1
+            self.stats.request_times.setdefault(camera, []).append(time.time())
+            self.stats.conditions[camera] = {
+                name: request.headers[name]
+                for name in ("If-None-Match", "If-Modified-Since")
+                if name in request.headers
+            }
+            self.stats.not_modified += not_modified
+
+        if not_modified:
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.send_header("Last-Modified", last_modified)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        body = self.image(camera, version)
+        with self.lock:
+            truncate = (
+                self.truncate_every > 0
+                and self.stats.requests % self.truncate_every == 0
+            )
+            self.stats.truncated += truncate
+            self.stats.body_bytes += len(body) // 2 if truncate else len(body)
+
+        if truncate:
+            request.send_response(200)
+            request.send_header("Content-Type", "image/jpeg")
+            request.send_header("Connection", "close")
+            request.end_headers()
+            request.wfile.write(body[: len(body) // 2])
+            request.close_connection = True
+            return
+
+        request.send_response(200)
+        request.send_header("Content-Type", "image/jpeg")
+        request.send_header("Content-Length", str(len(body)))
+        request.send_header("ETag", etag)
+        request.send_header("Last-Modified", last_modified)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> "FakeWebcamServer":
+        """Start serving."""
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeWebcamServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main():
+    """Run the server until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", type=int, default=9)
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    parser.add_argument("--refresh", type=float, default=30, help="Seconds")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = FakeWebcamServer(
+        args.cameras, args.size, args.refresh, args.latency, port=args.port
+    )
+    with server:
+        print(f"Serving {args.cameras} webcams, first at {server.url(0)}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Run every offline benchmark in turn.
+
+Run with `uv run python -m benchmarks.suite`. Each benchmark runs in its own
+process, since the recorder's settings and state are fixed at import time.
+`--quick` shrinks every benchmark to finish in a few minutes.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+# Arguments each benchmark gets with `--quick`.
+BENCHMARKS = {
+    "bench_frame_feed": ["--frames", "1000"],
+    "bench_dedup": ["--frames", "1000"],
+    "bench_phash": ["--frames", "1000"],
+    "bench_http": ["--rounds", "5"],
+    "bench_trace": ["--rounds", "10"],
+    "bench_stream": ["--rounds", "10"],
+    "bench_webcam_loop": ["--duration", "25"],
+    "bench_engine": ["--duration", "20"],
+    "bench_hosts": ["--duration", "20", "--outage", "6"],
+    "bench_adaptive": [],
+    "bench_dashboard": ["--renders", "10"],
+    "bench_headless": ["--duration", "5"],
+    "bench_contention": ["--cameras", "9", "100"],
+    "bench_video": ["--frames", "1000"],
+    "bench_frame_at": ["--frames", "500", "2000"],
+    "bench_framepack": ["--frames", "1000"],
+    "bench_write_behind": ["--duration", "5"],
+    "bench_extract": ["--days", "4", "--frames", "1000"],
+    "bench_planner": ["--frames", "500"],
+    "bench_archive": ["--frames", "1000"],
+    "bench_renditions": ["--frames", "360", "--size", "640x360"],
+    "bench_shards": ["--webcams", "200"],
+}
+
+
+def main():
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="Smaller runs")
+    parser.add_argument("only", nargs="*", help="Benchmarks to run (default: all)")
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    failed = []
+
+    for name in names:
+        cmd = [sys.executable, "-m", f"benchmarks.{name}"]
+        if args.quick:
+            cmd += BENCHMARKS[name]
+
+        print(f"=== {name} ===", flush=True)
+        start = time.perf_counter()
+        result = subprocess.run(cmd)
+        print(f"--- {time.perf_counter() - start:.1f}s\n", flush=True)
+
+        if result.returncode:
+            failed.append(name)
+
+    if failed:
+        sys.exit(f"Failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
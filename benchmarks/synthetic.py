@@ -0,0 +1,117 @@
+"""Generate synthetic webcam images and days of images.
+
+Run with `uv run python -m benchmarks.synthetic` to fill `PICTURES_DIR` of the
+working directory with a synthetic day for every webcam.
+"""
+
+import argparse
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+def segment(marker: int, payload: bytes) -> bytes:
+    """Build a JPEG marker segment."""
+    return struct.pack(">HH", marker, len(payload) + 2) + payload
+
+
+def synthetic_jpeg(
+    width: int = 640, height: int = 480, size: int = 0, tag: bytes = b""
+) -> bytes:
+    """Build a valid flat grey baseline JPEG.
+
+    Every 8x8 block only encodes a zero DC difference and an end of block, so
+    the image can be any size without an encoder. The file is padded with
+    comment segments up to roughly `size` bytes, and `tag` is stored in a
+    comment so frames can be made byte-unique.
+    """
+
+    blocks = ((width + 7) // 8) * ((height + 7) // 8)
+    # Each block is two zero bits, and the final byte is padded with ones.
+    bits = blocks * 2
+    scan = bytearray(bits // 8)
+    if bits % 8:
+        scan.append(0xFF >> (bits % 8))
+
+    # One single bit code for DC category 0 and one for AC end of block.
+    huffman = bytes([1] + [0] * 15) + b"\x00"
+
+    parts = [
+        b"\xff\xd8",
+        segment(0xFFDB, b"\x00" + b"\x01" * 64),
+        segment(0xFFC0, struct.pack(">BHHB", 8, height, width, 1) + b"\x01\x11\x00"),
+        segment(0xFFC4, b"\x00" + huffman),
+        segment(0xFFC4, b"\x10" + huffman),
+        segment(0xFFFE, tag or b"synthetic"),
+    ]
+
+    padding = size - sum(map(len, parts)) - len(scan) - 14
+    while padding > 4:
+        chunk = min(padding - 4, 65533)
+        parts.append(segment(0xFFFE, b"\x00" * chunk))
+        padding -= chunk + 4
+
+    parts.append(segment(0xFFDA, b"\x01\x01\x00\x00\x3f\x00"))
+    parts.append(bytes(scan))
+    parts.append(b"\xff\xd9")
+
+    return b"".join(parts)
+
+
+def generate_day(
+    camdir: Path,
+    code: str,
+    frames: int = 8640,
+    interval: float = 10,
+    start: datetime | None = None,
+    size: int = 60_000,
+) -> list[Path]:
+    """Fill a camera's day folder with named synthetic images."""
+
+    camdir.mkdir(parents=True, exist_ok=True)
+    start = start or datetime(2025, 1, 1)
+
+    paths = []
+    for i in range(frames):
+        stamp = (start + timedelta(seconds=i * interval)).strftime("%Y%m%dT%H%M%S")
+        path = camdir / f"{code}_{stamp}.jpg"
+        path.write_bytes(synthetic_jpeg(size=size, tag=str(i).encode()))
+        paths.append(path)
+
+    return paths
+
+
+def generate_pictures(
+    day: datetime, frames: int = 8640, size: int = 60_000
+) -> dict[str, list[Path]]:
+    """Fill `PICTURES_DIR` with a synthetic day for every webcam."""
+
+    from sfu_webcams_recorder.config.settings import PICTURES_DIR
+    from sfu_webcams_recorder.config.webcams import WEBCAM_URLS
+    from sfu_webcams_recorder.utils import day_folder_name
+
+    interval = 86400 / frames
+    pictures = {}
+    for cam_id in WEBCAM_URLS:
+        code = cam_id.name.lower()
+        camdir = PICTURES_DIR / day_folder_name(day) / code
+        pictures[code] = generate_day(camdir, code, frames, interval, day, size)
+
+    return pictures
+
+
+def main():
+    """Generate a synthetic day for every webcam."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--day", default="2025-01-01", help="YYYY-MM-DD")
+    parser.add_argument("--frames", type=int, default=8640, help="Per webcam")
+    parser.add_argument("--size", type=int, default=60_000, help="Bytes per image")
+    args = parser.parse_args()
+
+    day = datetime.strptime(args.day, "%Y-%m-%d")
+    pictures = generate_pictures(day, args.frames, args.size)
+    print(f"Generated {args.frames} images for each of {len(pictures)} webcams")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from pathlib import Path
 # -----------------------------
 
 FPS = 60
+# Frames between keyframes. Getting a single frame decodes at most this many.
+KEYFRAME_INTERVAL = FPS
 FFMPEG_CODEC_ARGS = [
     "-c:v",
     "libx264",
@@ -14,14 +16,165 @@ FFMPEG_CODEC_ARGS = [
     "slow",
     "-crf",
     "23",
+    "-g",
+    str(KEYFRAME_INTERVAL),
+    # Put the index at the start of the file, so readers can seek right away.
+    "-movflags",
+    "+faststart",
 ]
 
+# How daily videos are made. One of:
+# - "h264": Encode the images with FFMPEG_CODEC_ARGS.
+# - "mjpeg": Copy the images into the video as they are. Uses almost no CPU and
+#   keeps their quality, but the videos are several times larger.
+VIDEO_FORMAT = "h264"
+# Transcode "mjpeg" videos with FFMPEG_CODEC_ARGS later, while the machine is
+# idle: no videos are being made and the load average per CPU core is below
+# TRANSCODE_IDLE_LOAD. Idleness is checked every TRANSCODE_IDLE_CHECK_SECONDS.
+DEFERRED_TRANSCODE = False
+TRANSCODE_IDLE_LOAD = 0.5
+TRANSCODE_IDLE_CHECK_SECONDS = 60
+TRANSCODE_NICE = 19
+
+# How images are given to ffmpeg. One of:
+# - "pipe": Stream each image into ffmpeg's stdin. Nothing is written to disk.
+# - "symlink": Symlink each image into a temporary numbered sequence.
+# - "copy": Copy each image into a temporary numbered sequence.
+VIDEO_FRAME_FEED = "pipe"
+
+# Number of videos to encode at the same time. 0 uses half the CPU cores.
+VIDEO_WORKERS = 0
+
+# ffmpeg threads for each encode. 0 splits the CPU cores evenly between the
+# video workers so they don't oversubscribe the CPU. None lets ffmpeg decide.
+FFMPEG_THREADS_PER_JOB = 0
+
+# Finish each night's videos by this time of day, such as "06:00", by picking
+# the slowest of ENCODE_PRESETS that is fast enough for the queued images.
+# None always uses the preset in FFMPEG_CODEC_ARGS.
+ENCODE_DEADLINE = None
+# Presets the planner picks from, slowest first.
+ENCODE_PRESETS = ["slower", "slow", "medium", "fast", "faster", "veryfast"]
+# Images encoded with each preset to measure its speed on this machine. The
+# measurements are saved and kept for CALIBRATION_MAX_AGE_DAYS.
+CALIBRATION_FRAMES = 120
+CALIBRATION_MAX_AGE_DAYS = 30
+# Plan for encodes running this fraction of their measured speed.
+ENCODE_SAFETY_FACTOR = 0.8
+
+# Smaller versions of each daily video, made by the same ffmpeg run so the
+# images are only decoded once. Any of:
+# - "proxy": A video PROXY_HEIGHT pixels high, in `proxies/`, with its own time
+#   index.
+# - "thumbnails": A JPEG THUMBNAIL_HEIGHT pixels high of the first image in
+#   every THUMBNAIL_INTERVAL_MINUTES, in `thumbnails/`, named by capture time.
+RENDITIONS: list[str] = []
+PROXY_HEIGHT = 240
+PROXY_CODEC_ARGS = [
+    "-c:v",
+    "libx264",
+    "-preset",
+    "veryfast",
+    "-crf",
+    "28",
+    "-g",
+    str(KEYFRAME_INTERVAL),
+    "-movflags",
+    "+faststart",
+]
+THUMBNAIL_HEIGHT = 180
+THUMBNAIL_INTERVAL_MINUTES = 60
+
+# Encode each finished hour of images into a segment during the day, so the
+# daily video only needs the segments joined at midnight.
+SEGMENT_ENCODING = False
+# Seconds after the hour to wait for the last images of the previous hour.
+SEGMENT_DELAY_SECONDS = 60
+# Niceness of segment encodes, so they don't slow down downloads.
+SEGMENT_NICE = 10
+
+# Days left unencoded by a crash or restart are found at startup and encoded
+# by this many backlog workers, at this niceness.
+BACKLOG_WORKERS = 1
+BACKLOG_NICE = 10
+# Times a day's video is tried before it's left for a person to look at.
+JOB_MAX_ATTEMPTS = 3
+
 # -----------------------------
 # Image Download
 # -----------------------------
 
 INTERVAL = 10
 DOWNLOAD_TIMEOUT_SECONDS = 5
+# Largest image accepted, in bytes. Bigger downloads are stopped early.
+MAX_IMAGE_BYTES = 10_000_000
+# Bytes read from the connection at a time while downloading an image.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Also reject images that look the same as the last saved one, such as a frame
+# re-encoded by the camera or with only its timestamp overlay changed. Compares
+# 64-bit perceptual hashes. Needs the "perceptual" extra: NumPy and Pillow.
+NEAR_DUPLICATE_FILTER = False
+# Most bits an image's hash can differ by and still be rejected.
+NEAR_DUPLICATE_THRESHOLD = 2
+# Thresholds for particular webcams, by code, such as {"towern": 4}.
+NEAR_DUPLICATE_THRESHOLDS: dict[str, int] = {}
+
+# How downloaded images are stored. One of:
+# - "files": One file per image.
+# - "pack": Appended to one pack file per webcam per day, with a small index.
+#   Avoids creating a file per image. `unpack` turns a pack back into files.
+FRAME_STORAGE = "files"
+
+# Write images on a background thread, so a slow disk doesn't delay downloads.
+WRITE_BEHIND = False
+# Images waiting to be written, at most.
+WRITE_QUEUE_SIZE = 256
+# What a download does when the write queue is full. One of:
+# - "block": Wait for space. Nothing is lost, but downloads fall behind.
+# - "drop": Drop the image and count it.
+# - "sync": Write the image on the downloader thread.
+WRITE_QUEUE_FULL_POLICY = "block"
+# Images written between each fsync, and the longest one waits for it.
+WRITE_BATCH_SIZE = 64
+WRITE_BATCH_SECONDS = 0.5
+
+# Keep-alive connections kept open to each webcam host.
+DOWNLOAD_POOL_SIZE = 16
+
+# How downloads are scheduled. One of:
+# - "threads": One thread per webcam.
+# - "asyncio": One event loop for every webcam, running at most
+#   DOWNLOAD_CONCURRENCY downloads at a time. Suits hundreds of webcams.
+DOWNLOAD_ENGINE = "threads"
+DOWNLOAD_CONCURRENCY = 16
+
+# Spread the first downloads of each host's webcams evenly over INTERVAL, so
+# they don't all hit the host at the same moment every INTERVAL.
+STAGGER_DOWNLOADS = True
+# Downloads from one host at the same time, at most, in each process. None for
+# no limit.
+HOST_MAX_CONCURRENCY = 4
+# Failed downloads from a host in a row before its circuit opens, and its
+# webcams' downloads are skipped. Timeouts, connection errors and 5xx responses
+# are failures. None never opens the circuit.
+CIRCUIT_FAILURE_THRESHOLD = 5
+# Seconds the circuit stays open, doubling each time it opens again in a row up
+# to CIRCUIT_MAX_BACKOFF_SECONDS, less up to half at random so webcams don't
+# come back in step. Then one download tests the host before the rest resume.
+CIRCUIT_BACKOFF_SECONDS = 10
+CIRCUIT_MAX_BACKOFF_SECONDS = 300
+
+# Learn how often each webcam refreshes and download just after it does,
+# instead of every INTERVAL seconds.
+ADAPTIVE_POLLING = False
+# Seconds after an expected refresh to download.
+ADAPTIVE_MARGIN_SECONDS = 1
+# Seconds before downloading again when a refresh is late. Doubles each time.
+ADAPTIVE_RETRY_SECONDS = 2
+# Shortest and longest time between downloads of a webcam.
+ADAPTIVE_MIN_INTERVAL = 2
+ADAPTIVE_MAX_STALENESS_SECONDS = 60
 
 # -----------------------------
 # Paths
@@ -29,6 +182,10 @@ DOWNLOAD_TIMEOUT_SECONDS = 5
 
 BASE_DIR = Path.cwd()
 
+# Webcam codes and URLs. Without this file, the SFU webcams are recorded. See
+# `webcams.example.toml`.
+WEBCAMS_FILE = BASE_DIR / "webcams.toml"
+
 #  Media.
 MEDIA_DIR = BASE_DIR / "media"
 PICTURES_DIR = MEDIA_DIR / "pictures"
@@ -37,6 +194,25 @@ VIDEOS_DIR = MEDIA_DIR / "videos"
 # Logging.
 LOG_DIR = BASE_DIR / "log"
 SNAPSHOT_DIR = LOG_DIR / "snapshots"
+JOB_JOURNAL_FILE = LOG_DIR / "jobs.jsonl"
+CALIBRATION_FILE = LOG_DIR / "encode_calibration.json"
+# Each shard's status, merged by the dashboard of sharded runs.
+STATUS_DIR = LOG_DIR / "status"
+# Where the program serves its status, for the `status` and `top` commands.
+STATUS_SOCKET = LOG_DIR / "status.sock"
+# Download traces, with TRACE_DOWNLOADS.
+TRACE_FILE = LOG_DIR / "trace.jsonl"
+
+# -----------------------------
+# Sharding
+# -----------------------------
+
+# Seconds between writes of each shard's status file.
+STATUS_WRITE_SECONDS = 2
+# A shard whose status file is older than this is left out of the dashboard.
+STATUS_STALE_SECONDS = 30
+# Seconds between checks that every shard process is still running.
+SHARD_RESTART_SECONDS = 10
 
 # -----------------------------
 # Display
@@ -44,6 +220,26 @@ SNAPSHOT_DIR = LOG_DIR / "snapshots"
 
 USE_24H_CLOCK = False
 
+# -----------------------------
+# Metrics
+# -----------------------------
+
+# Serve Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics. None
+# turns the endpoint off.
+METRICS_PORT = None
+METRICS_HOST = "127.0.0.1"
+
+# Time each phase of every download (connect, TLS, time to first byte, body,
+# duplicate checks and write) and save them to TRACE_FILE, for
+# `sfu-webcams-recorder trace-report`.
+TRACE_DOWNLOADS = False
+# Traces kept in memory between writes. When full, the oldest are dropped.
+TRACE_BUFFER_SIZE = 10_000
+TRACE_WRITE_SECONDS = 5
+# Once TRACE_FILE is this big it's moved to TRACE_FILE.1, replacing the last
+# one, so at most twice this is kept.
+TRACE_MAX_BYTES = 20_000_000
+
 # -----------------------------
 # Debug
 # -----------------------------
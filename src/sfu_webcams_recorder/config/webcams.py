@@ -1,30 +1,83 @@
-"""Webcam config."""
+"""Webcam config.
 
-from enum import StrEnum, auto
+The webcams are read from `WEBCAMS_FILE` if it exists. Otherwise the SFU
+webcams are recorded.
+"""
 
+import re
+import tomllib
+from enum import StrEnum
+from pathlib import Path
 
-class WebcamID(StrEnum):
-    """The different webcams."""
+from sfu_webcams_recorder.config.settings import WEBCAMS_FILE
 
-    AQN = auto()
-    AQSW = auto()
-    AQSE = auto()
-    GAGLARDI = auto()
-    TOWERN = auto()
-    TOWERS = auto()
-    UDN = auto()
-    WMCROOF = auto()
-    BRH = auto()
+SFU_WEBCAMS = {
+    "aqn": "https://ns-webcams.its.sfu.ca/public/images/aqn-current.jpg",
+    "aqsw": "https://ns-webcams.its.sfu.ca/public/images/aqsw-current.jpg",
+    "aqse": "https://ns-webcams.its.sfu.ca/public/images/aqse-current.jpg",
+    "gaglardi": "https://ns-webcams.its.sfu.ca/public/images/gaglardi-current.jpg",
+    "towern": "https://ns-webcams.its.sfu.ca/public/images/towern-current.jpg",
+    "towers": "https://ns-webcams.its.sfu.ca/public/images/towers-current.jpg",
+    "udn": "https://ns-webcams.its.sfu.ca/public/images/udn-current.jpg",
+    "wmcroof": "https://ns-webcams.its.sfu.ca/public/images/wmcroof-current.jpg",
+    "brh": "https://ns-webcams.its.sfu.ca/public/images/brh-current.jpg",
+}
+
+# Codes name the webcam's folders and files, so they are kept to characters
+# that can't leave the media folders.
+WEBCAM_CODE_PATTERN = re.compile(r"[a-z0-9_-]+")
+
+
+class WebcamConfigError(Exception):
+    """Raised when the webcams file is invalid."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def load_webcams(path: Path) -> dict[str, str]:
+    """Read webcam codes and URLs from a TOML file, in order.
+
+    Each webcam is a `[webcams.<code>]` table with a `url`. Codes name the
+    webcam's folders and files, so they may only have lower case letters,
+    digits, "_" and "-".
+    """
+
+    try:
+        with path.open("rb") as f:
+            tables = tomllib.load(f).get("webcams", {})
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise WebcamConfigError(f"Can't read {path}: {e}") from e
+
+    webcams = {}
+    for code, table in tables.items():
+        if not WEBCAM_CODE_PATTERN.fullmatch(code):
+            raise WebcamConfigError(
+                f"Webcam code {code!r} may only have lower case letters, digits, "
+                '"_" and "-"'
+            )
+        if not isinstance(table, dict) or not isinstance(table.get("url"), str):
+            raise WebcamConfigError(f"Webcam {code!r} needs a url")
+        webcams[code] = table["url"]
+
+    if not webcams:
+        raise WebcamConfigError(f"No webcams in {path}")
+    return webcams
+
+
+# A bad webcams file leaves no webcams, and the error for `main` to report, so
+# it isn't a traceback from whichever module was imported first.
+webcams_error: WebcamConfigError | None = None
+try:
+    WEBCAMS = load_webcams(WEBCAMS_FILE) if WEBCAMS_FILE.exists() else SFU_WEBCAMS
+except WebcamConfigError as e:
+    WEBCAMS = {}
+    webcams_error = e
 
+# The different webcams. Each value is its code and each name the upper case
+# code, so `WebcamID(code)` finds a webcam and `cam_id.name.lower()` is its code.
+WebcamID = StrEnum("WebcamID", {code.upper(): code for code in WEBCAMS})
 
 WEBCAM_URLS: dict[WebcamID, str] = {
-    WebcamID.AQN: "https://ns-webcams.its.sfu.ca/public/images/aqn-current.jpg",
-    WebcamID.AQSW: "https://ns-webcams.its.sfu.ca/public/images/aqsw-current.jpg",
-    WebcamID.AQSE: "https://ns-webcams.its.sfu.ca/public/images/aqse-current.jpg",
-    WebcamID.GAGLARDI: "https://ns-webcams.its.sfu.ca/public/images/gaglardi-current.jpg",
-    WebcamID.TOWERN: "https://ns-webcams.its.sfu.ca/public/images/towern-current.jpg",
-    WebcamID.TOWERS: "https://ns-webcams.its.sfu.ca/public/images/towers-current.jpg",
-    WebcamID.UDN: "https://ns-webcams.its.sfu.ca/public/images/udn-current.jpg",
-    WebcamID.WMCROOF: "https://ns-webcams.its.sfu.ca/public/images/wmcroof-current.jpg",
-    WebcamID.BRH: "https://ns-webcams.its.sfu.ca/public/images/brh-current.jpg",
+    WebcamID(code): url for code, url in WEBCAMS.items()
 }
@@ -0,0 +1,171 @@
+"""Extract the capture nearest a time of day from every day of the archive.
+
+Each day's frame is read from its daily video with the time index, so only
+one group of pictures is decoded per day. Days are spread over a process pool.
+"""
+
+import logging
+import os
+import subprocess
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+from sfu_webcams_recorder.config.settings import FFMPEG_CODEC_ARGS
+from sfu_webcams_recorder.io.timeindex import (
+    IndexEntry,
+    TimeIndexError,
+    build_time_index,
+    index_path,
+    read_frame,
+    video_path,
+)
+from sfu_webcams_recorder.io.video import pipe_frames
+from sfu_webcams_recorder.utils import TZ, day_folder_name
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Capture:
+    """The frame extracted from one day's video, or why there isn't one."""
+
+    code: str
+    when: datetime
+    entry: IndexEntry | None = None
+    jpeg: bytes | None = None
+    error: str | None = None
+
+
+@dataclass(slots=True)
+class ExtractSummary:
+    """Counts of what a batch extraction did."""
+
+    saved: int = 0
+    missing: int = 0
+    failed: int = 0
+
+
+def archive_days(start: date, end: date) -> Iterator[date]:
+    """Yield every day from `start` to `end`, inclusive."""
+    for offset in range((end - start).days + 1):
+        yield start + timedelta(days=offset)
+
+
+def capture(code: str, when: datetime) -> Capture:
+    """Extract the frame nearest a time from that day's video.
+
+    Videos created before time indexes get their index built first.
+    """
+
+    result = Capture(code, when)
+    day = day_folder_name(when)
+
+    if not video_path(code, day).exists():
+        return result
+
+    try:
+        if not index_path(code, day).exists():
+            build_time_index(code, day)
+        result.entry, result.jpeg = read_frame(code, when)
+    except (TimeIndexError, subprocess.CalledProcessError, OSError) as e:
+        result.error = str(e)
+
+    return result
+
+
+def timelapse_cmd(outfile: Path, fps: int) -> list[str]:
+    """Build the ffmpeg command that encodes piped JPEGs into a timelapse."""
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-framerate",
+        str(fps),
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "mjpeg",
+        "-i",
+        "-",
+        *FFMPEG_CODEC_ARGS,
+        str(outfile),
+    ]
+
+
+def extract_captures(
+    codes: list[str],
+    time_of_day: time,
+    start: date,
+    end: date,
+    outdir: Path,
+    timelapse: bool = False,
+    fps: int = 30,
+    workers: int | None = None,
+) -> ExtractSummary:
+    """Extract the capture nearest a time of day for each webcam and day.
+
+    Writes `<outdir>/<code>/<code>_<timestamp>.jpg` for each day, or with
+    `timelapse`, `<outdir>/<code>.mp4` and its timestamps file. Days without a
+    video are skipped.
+    """
+
+    outdir.mkdir(parents=True, exist_ok=True)
+    summary = ExtractSummary()
+
+    with ProcessPoolExecutor(workers or os.process_cpu_count()) as pool:
+        for code in codes:
+            times = [
+                datetime.combine(day, time_of_day) for day in archive_days(start, end)
+            ]
+            captures = pool.map(capture, [code] * len(times), times, chunksize=4)
+
+            frames = []
+            for result in captures:
+                if result.error is not None:
+                    logger.warning("%s %s: %s", code, result.when, result.error)
+                    summary.failed += 1
+                elif result.jpeg is None:
+                    summary.missing += 1
+                else:
+                    frames.append(result)
+
+            summary.saved += len(frames)
+            if timelapse:
+                write_timelapse(frames, outdir / f"{code}.mp4", fps)
+            else:
+                write_sequence(frames, outdir / code)
+
+    return summary
+
+
+def capture_timestamp(result: Capture) -> str:
+    """Get the image file name timestamp of when a capture was taken."""
+    taken = datetime.fromtimestamp(result.entry.timestamp, TZ)
+    return taken.strftime("%Y%m%dT%H%M%S")
+
+
+def write_sequence(frames: list[Capture], outdir: Path):
+    """Save captures as JPEGs named like downloaded webcam images."""
+
+    outdir.mkdir(parents=True, exist_ok=True)
+    for result in frames:
+        outfile = outdir / f"{result.code}_{capture_timestamp(result)}.jpg"
+        outfile.write_bytes(result.jpeg)
+
+
+def write_timelapse(frames: list[Capture], outfile: Path, fps: int):
+    """Encode captures into a timelapse, with a timestamps file next to it."""
+
+    if not frames:
+        return
+
+    pipe_frames(timelapse_cmd(outfile, fps), (result.jpeg for result in frames))
+
+    outfile.with_suffix(".txt").write_text(
+        "\n".join(capture_timestamp(result) for result in frames)
+    )
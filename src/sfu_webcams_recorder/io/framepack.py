@@ -0,0 +1,138 @@
+"""Append-only pack files holding a webcam's images for a day.
+
+With `FRAME_STORAGE = "pack"`, a webcam's day folder holds two files instead
+of one file per image: `frames.pack`, the images one after another, and
+`frames.idx`, a fixed size record per image with its timestamp, offset and
+size. An image is written to the pack before its record, so after a crash the
+index only lists complete images.
+"""
+
+import struct
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+PACK_NAME = "frames.pack"
+INDEX_NAME = "frames.idx"
+
+# Timestamp as in image file names, offset in the pack, and size.
+PACK_RECORD = struct.Struct("<15sQI")
+
+# Held while appending to a pack. With write-behind, the writer thread and a
+# downloader writing around a full queue can append to the same pack.
+pack_locks: dict[Path, Lock] = {}
+
+
+@dataclass(slots=True, frozen=True)
+class PackedFrame:
+    """An image stored in a pack file."""
+
+    pack: Path
+    timestamp: str
+    offset: int
+    size: int
+
+    def read(self) -> bytes:
+        """Read the image's bytes."""
+        with self.pack.open("rb") as f:
+            f.seek(self.offset)
+            return f.read(self.size)
+
+
+def pack_lock(camdir: Path) -> Lock:
+    """Get the lock held while appending to a webcam's pack."""
+    return pack_locks.setdefault(camdir, Lock())
+
+
+def append_frame(camdir: Path, timestamp: str, content: bytes):
+    """Add an image to the end of a webcam's pack for the day."""
+
+    index = camdir / INDEX_NAME
+
+    # The offset is read before the image is written, and the record written
+    # after, so appends must not interleave.
+    with pack_lock(camdir):
+        # A record torn by a crash would misalign every record after it.
+        try:
+            size = index.stat().st_size
+            if size % PACK_RECORD.size:
+                with index.open("r+b") as f:
+                    f.truncate(size - size % PACK_RECORD.size)
+        except FileNotFoundError:
+            pass
+
+        with (camdir / PACK_NAME).open("ab") as f:
+            offset = f.tell()
+            f.write(content)
+
+        with index.open("ab") as f:
+            f.write(PACK_RECORD.pack(timestamp.encode(), offset, len(content)))
+
+
+def packed_frames(camdir: Path) -> list[PackedFrame]:
+    """List the images in a webcam's pack for the day, in the order added."""
+
+    pack = camdir / PACK_NAME
+    try:
+        data = (camdir / INDEX_NAME).read_bytes()
+    except FileNotFoundError:
+        return []
+
+    # A torn last record is left out.
+    end = len(data) - len(data) % PACK_RECORD.size
+    return [
+        PackedFrame(pack, timestamp.decode(), offset, size)
+        for timestamp, offset, size in PACK_RECORD.iter_unpack(data[:end])
+    ]
+
+
+def last_packed_frame(camdir: Path) -> PackedFrame | None:
+    """Get the newest image in a webcam's pack without reading the whole index."""
+
+    try:
+        with (camdir / INDEX_NAME).open("rb") as f:
+            size = f.seek(0, 2)
+            end = size - size % PACK_RECORD.size
+            if not end:
+                return None
+            f.seek(end - PACK_RECORD.size)
+            timestamp, offset, size = PACK_RECORD.unpack(f.read(PACK_RECORD.size))
+    except FileNotFoundError:
+        return None
+
+    return PackedFrame(camdir / PACK_NAME, timestamp.decode(), offset, size)
+
+
+def read_frames(frames: Iterable[PackedFrame]) -> Iterator[bytes]:
+    """Read images from packs in turn, keeping the current pack open."""
+
+    pack = None
+    f = None
+    try:
+        for frame in frames:
+            if frame.pack != pack:
+                if f is not None:
+                    f.close()
+                pack = frame.pack
+                f = pack.open("rb")
+            f.seek(frame.offset)
+            yield f.read(frame.size)
+    finally:
+        if f is not None:
+            f.close()
+
+
+def unpack_frames(camdir: Path, code: str) -> int:
+    """Write a webcam's packed images out as image files and remove the pack.
+
+    Returns the number of images written.
+    """
+
+    frames = packed_frames(camdir)
+    for frame, content in zip(frames, read_frames(frames)):
+        (camdir / f"{code}_{frame.timestamp}.jpg").write_bytes(content)
+
+    (camdir / INDEX_NAME).unlink(missing_ok=True)
+    (camdir / PACK_NAME).unlink(missing_ok=True)
+    return len(frames)
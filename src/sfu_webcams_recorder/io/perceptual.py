@@ -0,0 +1,80 @@
+"""Perceptual hashes of webcam images, for catching near-duplicates.
+
+A difference hash (dHash) shrinks an image to 9x8 greys and keeps one bit per
+pair of neighbouring pixels: whether the left one is brighter. Images that look
+the same, such as a frame re-encoded by the camera or with only its timestamp
+overlay changed, differ in few bits. Needs the optional "perceptual"
+dependencies, NumPy and Pillow.
+"""
+
+from collections.abc import Iterable
+from io import BytesIO
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+from sfu_webcams_recorder.config.settings import (
+    NEAR_DUPLICATE_THRESHOLD,
+    NEAR_DUPLICATE_THRESHOLDS,
+)
+
+# The hash is HASH_SIZE x HASH_SIZE bits.
+HASH_SIZE = 8
+
+
+def perceptual_available() -> bool:
+    """Check whether NumPy and Pillow are installed."""
+    return np is not None and Image is not None
+
+
+def grey_thumbnail(content: bytes) -> "np.ndarray":
+    """Decode a JPEG straight to a tiny greyscale image, as a pixel array.
+
+    `draft` lets the JPEG decoder scale the image down while decoding, which is
+    much faster than decoding it at full size.
+    """
+
+    with Image.open(BytesIO(content)) as img:
+        img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        thumb = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX)
+        return np.asarray(thumb, dtype=np.int16)
+
+
+def hash_bits(thumbs: "np.ndarray") -> "np.ndarray":
+    """Turn a stack of thumbnails into their hashes, as unsigned 64-bit ints."""
+    bits = thumbs[:, :, 1:] > thumbs[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(thumbs), -1), axis=1)
+    return packed.view(">u8").ravel()
+
+
+def dhash(content: bytes) -> int:
+    """Get the difference hash of a JPEG."""
+    return int(hash_bits(grey_thumbnail(content)[np.newaxis])[0])
+
+
+def dhashes(contents: Iterable[bytes]) -> "np.ndarray":
+    """Get the difference hashes of many JPEGs, hashing them all at once."""
+    thumbs = [grey_thumbnail(content) for content in contents]
+    if not thumbs:
+        return np.empty(0, dtype=">u8")
+    return hash_bits(np.stack(thumbs))
+
+
+def hash_distance(a: int, b: int) -> int:
+    """Count the bits that differ between two hashes."""
+    return (a ^ b).bit_count()
+
+
+def hash_distances(hashes: "np.ndarray") -> "np.ndarray":
+    """Count the bits that differ between each hash and the one before it."""
+    diff = (hashes[1:] ^ hashes[:-1]).astype(">u8")
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def near_duplicate_threshold(code: str) -> int:
+    """Get the most bits a webcam's image can differ by and still be rejected."""
+    return NEAR_DUPLICATE_THRESHOLDS.get(code, NEAR_DUPLICATE_THRESHOLD)
@@ -0,0 +1,448 @@
+"""A binary index from capture time to frame, and fast frame extraction.
+
+Each daily video gets an index at `VIDEOS_DIR/<day>/index/<code>.idx`. The
+index is a header followed by one fixed size record per frame, sorted by
+capture time, so the frame nearest any time is found with a binary search
+instead of reading the timestamps file and decoding from the start.
+"""
+
+import mmap
+import struct
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from sfu_webcams_recorder.config.settings import FPS, VIDEOS_DIR
+from sfu_webcams_recorder.utils import TZ, day_folder_name
+
+INDEX_MAGIC = b"SFUIDX1\0"
+# Magic, frames per second, number of records.
+INDEX_HEADER = struct.Struct("<8sII")
+# Capture time (Unix seconds), frame number, keyframe at or before the frame,
+# and that keyframe's byte offset in the video.
+INDEX_RECORD = struct.Struct("<qIIQ")
+
+# MP4 boxes that hold the boxes needed to find a video's samples.
+MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+# Bytes of a visual sample entry before its child boxes, after its header.
+VISUAL_SAMPLE_ENTRY_SIZE = 78
+
+
+class TimeIndexError(Exception):
+    """Raised when a video can't be indexed or an index can't be read."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+@dataclass(slots=True, frozen=True)
+class IndexEntry:
+    """Where one capture is in a daily video."""
+
+    timestamp: int
+    frame: int
+    keyframe: int
+    keyframe_offset: int
+
+
+def index_path(code: str, day: str) -> Path:
+    """Get the path of a daily video's time index."""
+    return VIDEOS_DIR / day / "index" / f"{code}.idx"
+
+
+def video_path(code: str, day: str) -> Path:
+    """Get the path of a daily video."""
+    return VIDEOS_DIR / day / "videos" / f"{code}.mp4"
+
+
+def proxy_path(code: str, day: str) -> Path:
+    """Get the path of a daily video's proxy rendition."""
+    return VIDEOS_DIR / day / "proxies" / f"{code}.mp4"
+
+
+def proxy_index_path(code: str, day: str) -> Path:
+    """Get the path of a proxy rendition's time index."""
+    return VIDEOS_DIR / day / "index" / f"{code}.proxy.idx"
+
+
+def thumbnails_path(code: str, day: str) -> Path:
+    """Get the folder of a daily video's thumbnails rendition."""
+    return VIDEOS_DIR / day / "thumbnails" / code
+
+
+def timestamp_seconds(timestamp: str) -> int:
+    """Convert an image file name timestamp to Unix seconds."""
+    local = TZ.localize(datetime.strptime(timestamp, "%Y%m%dT%H%M%S"))
+    return int(local.timestamp())
+
+
+def mp4_boxes(data: bytes, start: int = 0, end: int | None = None):
+    """Yield the type, body start and body end of each MP4 box in a range."""
+
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, pos + 8)
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise TimeIndexError(f"Bad MP4 box size at byte {pos}")
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def read_moov(path: Path) -> bytes:
+    """Read the `moov` box of an MP4 file, wherever it is in the file."""
+
+    with path.open("rb") as f:
+        while header := f.read(8):
+            if len(header) < 8:
+                break
+            size, box_type = struct.unpack(">I4s", header)
+            header_size = 8
+            if size == 1:
+                (size,) = struct.unpack(">Q", f.read(8))
+                header_size = 16
+            if box_type == b"moov":
+                return header + f.read(size - 8)
+            if size == 0:
+                break
+            f.seek(size - header_size, 1)
+
+    raise TimeIndexError(f"No moov box in {path}")
+
+
+def descriptor(data: bytes, pos: int) -> tuple[int, int, int]:
+    """Read an MPEG-4 descriptor's header.
+
+    Returns its tag, and the start and end of its body.
+    """
+
+    tag = data[pos]
+    size = 0
+    pos += 1
+    # The size takes up to four bytes, seven bits each.
+    for _ in range(4):
+        byte = data[pos]
+        pos += 1
+        size = size << 7 | byte & 0x7F
+        if not byte & 0x80:
+            break
+    return tag, pos, pos + size
+
+
+def esds_object_type(data: bytes, start: int, end: int) -> int | None:
+    """Get the object type in the `esds` box of an `mp4v` sample entry.
+
+    The type tells apart MPEG-4 video (0x20) and MJPEG (0x6C), which ffmpeg
+    both store as `mp4v`.
+    """
+
+    for box_type, body, box_end in mp4_boxes(data, start, end):
+        if box_type != b"esds":
+            continue
+
+        # The ES descriptor, after the box's version and flags.
+        tag, pos, _ = descriptor(data, body + 4)
+        if tag != 0x03:
+            return None
+        flags = data[pos + 2]
+        pos += 3
+        if flags & 0x80:
+            pos += 2
+        if flags & 0x40:
+            pos += 1 + data[pos]
+        if flags & 0x20:
+            pos += 2
+
+        # The decoder config descriptor starts with the object type.
+        tag, pos, _ = descriptor(data, pos)
+        return data[pos] if tag == 0x04 and pos < box_end else None
+
+    return None
+
+
+def sample_tables(data: bytes, start: int, end: int, tables: dict):
+    """Collect the sample tables of the video track inside a box range."""
+
+    for box_type, body, box_end in mp4_boxes(data, start, end):
+        if box_type == b"trak":
+            track = {}
+            sample_tables(data, body, box_end, track)
+            if track.get(b"hdlr") == b"vide" and b"stsz" in track:
+                tables.update(track)
+        elif box_type in MP4_CONTAINERS:
+            sample_tables(data, body, box_end, tables)
+        elif box_type == b"hdlr":
+            tables[b"hdlr"] = data[body + 8 : body + 12]
+        elif box_type == b"stsd":
+            # The type of the first sample entry names the codec.
+            entry = body + 8
+            (entry_size,) = struct.unpack_from(">I", data, entry)
+            tables[b"stsd"] = data[entry + 4 : entry + 8]
+            if tables[b"stsd"] == b"mp4v":
+                tables[b"esds"] = esds_object_type(
+                    data,
+                    entry + 8 + VISUAL_SAMPLE_ENTRY_SIZE,
+                    min(entry + entry_size, box_end),
+                )
+        elif box_type in (b"stss", b"stsz", b"stsc", b"stco", b"co64"):
+            tables[box_type] = (body, box_end)
+
+
+def video_codec(path: Path) -> str:
+    """Get the sample entry type of a video's track, such as "avc1".
+
+    For "mp4v", the object type is added in hex, as in "mp4v.6c" for MJPEG.
+    """
+
+    data = read_moov(path)
+    tables = {}
+    try:
+        sample_tables(data, 0, len(data), tables)
+    except (struct.error, IndexError) as e:
+        raise TimeIndexError(f"Malformed MP4 {path}") from e
+    if b"stsd" not in tables:
+        raise TimeIndexError(f"No video track in {path}")
+    codec = tables[b"stsd"].decode("latin-1")
+    if tables.get(b"esds") is not None:
+        codec += f".{tables[b'esds']:02x}"
+    return codec
+
+
+def keyframe_offsets(path: Path) -> tuple[int, list[int], list[int]]:
+    """Get a video's frame count and its keyframes' numbers and byte offsets."""
+
+    data = read_moov(path)
+    tables = {}
+    sample_tables(data, 0, len(data), tables)
+    if b"stsz" not in tables or b"stsc" not in tables:
+        raise TimeIndexError(f"No video track in {path}")
+
+    # Sample sizes.
+    body, _ = tables[b"stsz"]
+    sample_size, count = struct.unpack_from(">II", data, body + 4)
+    if sample_size:
+        sizes = [sample_size] * count
+    else:
+        sizes = list(struct.unpack_from(f">{count}I", data, body + 12))
+
+    # Chunk offsets.
+    if b"co64" in tables:
+        body, _ = tables[b"co64"]
+        (chunks,) = struct.unpack_from(">I", data, body + 4)
+        chunk_offsets = struct.unpack_from(f">{chunks}Q", data, body + 8)
+    else:
+        body, _ = tables[b"stco"]
+        (chunks,) = struct.unpack_from(">I", data, body + 4)
+        chunk_offsets = struct.unpack_from(f">{chunks}I", data, body + 8)
+
+    # Samples per chunk, as runs starting at a chunk number.
+    body, _ = tables[b"stsc"]
+    (runs,) = struct.unpack_from(">I", data, body + 4)
+    stsc = [struct.unpack_from(">III", data, body + 8 + 12 * i) for i in range(runs)]
+
+    offsets = []
+    for run, (first_chunk, per_chunk, _) in enumerate(stsc):
+        last_chunk = stsc[run + 1][0] if run + 1 < runs else chunks + 1
+        for chunk in range(first_chunk, last_chunk):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if len(offsets) == count:
+                    break
+                offsets.append(offset)
+                offset += sizes[len(offsets) - 1]
+
+    # Without a sync sample table, every frame is a keyframe.
+    if b"stss" in tables:
+        body, _ = tables[b"stss"]
+        (syncs,) = struct.unpack_from(">I", data, body + 4)
+        keyframes = [n - 1 for n in struct.unpack_from(f">{syncs}I", data, body + 8)]
+    else:
+        keyframes = list(range(count))
+
+    return count, keyframes, [offsets[frame] for frame in keyframes]
+
+
+def write_time_index(video: Path, timestamps: list[str], outfile: Path):
+    """Write the time index of a video from its frames' timestamps."""
+
+    try:
+        frames, keyframes, offsets = keyframe_offsets(video)
+    except struct.error as e:
+        raise TimeIndexError(f"Malformed MP4 {video}") from e
+    if frames != len(timestamps):
+        raise TimeIndexError(
+            f"{video} has {frames} frames but {len(timestamps)} timestamps"
+        )
+    if not keyframes:
+        raise TimeIndexError(f"No keyframes in {video}")
+
+    records = []
+    key = 0
+    for frame, timestamp in enumerate(timestamps):
+        while key + 1 < len(keyframes) and keyframes[key + 1] <= frame:
+            key += 1
+        records.append(
+            (timestamp_seconds(timestamp), frame, keyframes[key], offsets[key])
+        )
+
+    # Frames are in capture order, but a clock change could break that.
+    records.sort()
+
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+    tmp_out = outfile.with_suffix(".tmp")
+    with tmp_out.open("wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, FPS, len(records)))
+        f.writelines(INDEX_RECORD.pack(*record) for record in records)
+    tmp_out.rename(outfile)
+
+
+def build_time_index(code: str, day: str) -> int:
+    """Write the time index of an existing daily video from its timestamps file.
+
+    Returns the number of frames indexed.
+    """
+
+    timestamps_file = VIDEOS_DIR / day / "timestamps" / f"{code}.txt"
+    timestamps = timestamps_file.read_text().splitlines()
+    write_time_index(video_path(code, day), timestamps, index_path(code, day))
+    return len(timestamps)
+
+
+class TimeIndex:
+    """A read-only view of a time index file."""
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < INDEX_HEADER.size:
+            raise TimeIndexError(f"Truncated time index {path}")
+        magic, self.fps, self.count = INDEX_HEADER.unpack_from(self.data)
+        if magic != INDEX_MAGIC:
+            raise TimeIndexError(f"Not a time index {path}")
+        if len(self.data) < INDEX_HEADER.size + self.count * INDEX_RECORD.size:
+            raise TimeIndexError(f"Truncated time index {path}")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> IndexEntry:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        offset = INDEX_HEADER.size + i * INDEX_RECORD.size
+        return IndexEntry(*INDEX_RECORD.unpack_from(self.data, offset))
+
+    def close(self):
+        """Unmap the index file."""
+        self.data.close()
+
+    def __enter__(self) -> "TimeIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def nearest(self, timestamp: float) -> IndexEntry:
+        """Get the capture nearest a Unix time."""
+
+        if not self.count:
+            raise TimeIndexError("Empty time index")
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle].timestamp < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self.count:
+            return self[low - 1]
+        if (
+            low
+            and timestamp - self[low - 1].timestamp <= self[low].timestamp - timestamp
+        ):
+            return self[low - 1]
+        return self[low]
+
+
+def local_time(when: datetime) -> datetime:
+    """Convert a time to webcam time. Naive times are taken as webcam time."""
+    return TZ.localize(when) if when.tzinfo is None else when.astimezone(TZ)
+
+
+def open_index(code: str, day: str) -> TimeIndex:
+    """Open the time index of a webcam's daily video."""
+
+    path = index_path(code, day)
+    if not path.exists():
+        raise TimeIndexError(f"No time index at {path}")
+    return TimeIndex(path)
+
+
+def frame_at(code: str, when: datetime) -> IndexEntry:
+    """Find the frame of a webcam's daily video captured nearest a time."""
+
+    when = local_time(when)
+    with open_index(code, day_folder_name(when)) as index:
+        return index.nearest(when.timestamp())
+
+
+def frame_cmd(code: str, when: datetime) -> tuple[IndexEntry, list[str]]:
+    """Build an ffmpeg command, without its output, for the frame nearest a time.
+
+    ffmpeg seeks to the keyframe before the frame and decodes from there, so
+    this takes about the same time anywhere in the video.
+    """
+
+    when = local_time(when)
+    day = day_folder_name(when)
+    with open_index(code, day) as index:
+        entry = index.nearest(when.timestamp())
+        fps = index.fps
+
+    # Seek half a frame early, since ffmpeg starts at the first frame at or
+    # after the seek time.
+    seek = max(0, (entry.frame - 0.5) / fps)
+
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-ss",
+        f"{seek:.6f}",
+        "-i",
+        str(video_path(code, day)),
+        "-frames:v",
+        "1",
+        "-q:v",
+        "2",
+    ]
+    return entry, cmd
+
+
+def extract_frame(code: str, when: datetime, outfile: Path) -> IndexEntry:
+    """Save the frame of a webcam's daily video captured nearest a time."""
+
+    entry, cmd = frame_cmd(code, when)
+    subprocess.run([*cmd, str(outfile)], check=True)
+    return entry
+
+
+def read_frame(code: str, when: datetime) -> tuple[IndexEntry, bytes]:
+    """Get the frame of a webcam's daily video captured nearest a time as a JPEG."""
+
+    entry, cmd = frame_cmd(code, when)
+    cmd += ["-f", "image2pipe", "-c:v", "mjpeg", "-"]
+    jpeg = subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout
+    return entry, jpeg
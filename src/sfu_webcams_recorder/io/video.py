@@ -1,10 +1,18 @@
 """Create a daily video of all the webcam images."""
 
+import logging
+import os
 import shutil
 import subprocess
 import tempfile
 import time
+from collections.abc import Collection, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import StrEnum, auto
+from itertools import groupby
 from pathlib import Path
+from threading import Lock
 
 from sfu_webcams_recorder.config.settings import (
     DEBUG_VIDEO_CREATE_SLEEP,
@@ -12,8 +20,78 @@ from sfu_webcams_recorder.config.settings import (
     FFMPEG_CODEC_ARGS,
     FPS,
     PICTURES_DIR,
+    PROXY_CODEC_ARGS,
+    PROXY_HEIGHT,
+    RENDITIONS,
+    SEGMENT_ENCODING,
+    THUMBNAIL_HEIGHT,
+    THUMBNAIL_INTERVAL_MINUTES,
+    VIDEO_FORMAT,
+    VIDEO_FRAME_FEED,
     VIDEOS_DIR,
 )
+from sfu_webcams_recorder.io.framepack import (
+    PackedFrame,
+    packed_frames,
+    read_frames,
+)
+from sfu_webcams_recorder.io.timeindex import (
+    TimeIndexError,
+    build_time_index,
+    index_path,
+    proxy_index_path,
+    proxy_path,
+    thumbnails_path,
+    video_codec,
+    video_path,
+    write_time_index,
+)
+
+logger = logging.getLogger(__name__)
+
+# Hourly segments are kept in this folder inside a webcam's day folder, and
+# their proxy renditions in this folder inside that.
+SEGMENTS_DIRNAME = "segments"
+PROXIES_DIRNAME = "proxies"
+
+# Codecs ffmpeg gives MJPEG video in MP4, as `video_codec` names them. Plain
+# "mp4v" is MPEG-4 video, which a transcode may have made.
+MJPEG_CODECS = {"mp4v.6c", "jpeg"}
+
+# Held while encoding for a webcam, so segments and daily videos don't overlap.
+encode_locks: dict[str, Lock] = {}
+
+
+class FrameFeed(StrEnum):
+    """The ways images can be given to ffmpeg."""
+
+    PIPE = auto()
+    SYMLINK = auto()
+    COPY = auto()
+
+
+class VideoFormat(StrEnum):
+    """The ways daily videos can be made."""
+
+    H264 = auto()
+    MJPEG = auto()
+
+
+class Rendition(StrEnum):
+    """Smaller versions of a daily video, made in the same ffmpeg run."""
+
+    PROXY = auto()
+    THUMBNAILS = auto()
+
+
+@dataclass(slots=True)
+class RenditionOutputs:
+    """Where an encode writes its renditions."""
+
+    proxy: Path | None = None
+    thumbnails_dir: Path | None = None
+    # Frames of the encode to save as thumbnails.
+    thumbnail_frames: list[int] = field(default_factory=list)
 
 
 class VideoCreationError(Exception):
@@ -23,61 +101,606 @@ class VideoCreationError(Exception):
         super().__init__(message)
 
 
-def create_daily_video(code: str, day: str):
-    """Create a daily video using all downloaded webcam images for a day."""
+def day_images(camdir: Path) -> list[Path | PackedFrame]:
+    """List a webcam's images for a day, as files or in its pack, oldest first."""
+    imgs = [*camdir.glob("*.jpg"), *packed_frames(camdir)]
+    return sorted(imgs, key=image_timestamp)
 
-    if DEBUG_VIDEO_CREATE_SLEEP:
-        time.sleep(DEBUG_VIDEO_CREATE_SLEEP_SECONDS)
+
+def image_contents(imgs: Iterable[Path | PackedFrame]) -> Iterator[Path | bytes]:
+    """Turn packed images into their bytes, reading each pack in one pass."""
+    for packed, group in groupby(imgs, key=lambda src: isinstance(src, PackedFrame)):
+        if packed:
+            yield from read_frames(group)
+        else:
+            yield from group
+
+
+@contextmanager
+def frame_sequence(imgs: list[Path | PackedFrame], feed: FrameFeed) -> Iterator[Path]:
+    """Lay out images as a temporary numbered sequence and yield its pattern.
+
+    Packed images are always written out, since there is no file to link to.
+    """
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+
+        for i, src in enumerate(imgs, start=1):
+            dst = tmpdir / f"{i:06d}.jpg"
+            if isinstance(src, PackedFrame):
+                dst.write_bytes(src.read())
+            elif feed == FrameFeed.SYMLINK:
+                dst.symlink_to(src.resolve())
+            else:
+                shutil.copy2(src, dst)
+
+        yield tmpdir / "%06d.jpg"
+
+
+def encode_lock(code: str) -> Lock:
+    """Get the lock held while encoding a webcam's images."""
+    return encode_locks.setdefault(code, Lock())
+
+
+def set_nice(proc: subprocess.Popen, nice: int):
+    """Lower the priority of a running process, where the OS supports it."""
+    if nice and hasattr(os, "setpriority"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, proc.pid, nice)
+        except OSError:
+            pass
+
+
+def run_ffmpeg(cmd: list[str], nice: int = 0):
+    """Run an ffmpeg command, raising CalledProcessError if it fails."""
+
+    with subprocess.Popen(cmd) as proc:
+        set_nice(proc, nice)
+
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+def pipe_frames(cmd: list[str], imgs: Iterable[Path | bytes], nice: int = 0):
+    """Run an ffmpeg command, streaming images into its stdin.
+
+    Images are paths or the bytes of a JPEG.
+    """
+
+    with subprocess.Popen(cmd, stdin=subprocess.PIPE) as proc:
+        set_nice(proc, nice)
+        try:
+            for src in imgs:
+                if isinstance(src, bytes):
+                    proc.stdin.write(src)
+                    continue
+                with src.open("rb") as f:
+                    shutil.copyfileobj(f, proc.stdin)
+        except BrokenPipeError:
+            # ffmpeg exited early. Its return code says why.
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+def ffmpeg_base_cmd() -> list[str]:
+    """Get the start of every ffmpeg command."""
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+
+
+def image_timestamp(src: Path | PackedFrame) -> str:
+    """Get the timestamp section of a webcam image's file name."""
+    if isinstance(src, PackedFrame):
+        return src.timestamp
+    return src.stem.split("_", 1)[1]
+
+
+def image_hour(src: Path | PackedFrame) -> int:
+    """Get the hour of the day a webcam image was downloaded in."""
+    return int(image_timestamp(src)[9:11])
+
+
+def codec_args(preset: str | None = None) -> list[str]:
+    """Get the ffmpeg codec arguments, with a different preset if given."""
+    args = list(FFMPEG_CODEC_ARGS)
+    if preset is not None and "-preset" in args:
+        args[args.index("-preset") + 1] = preset
+    return args
+
+
+def output_args(video_format: VideoFormat, preset: str | None = None) -> list[str]:
+    """Get the ffmpeg arguments for a video format's output."""
+    if video_format == VideoFormat.MJPEG:
+        return ["-c:v", "copy", "-movflags", "+faststart"]
+    return codec_args(preset)
+
+
+def thumbnail_slot(timestamp: str) -> int:
+    """Get which `THUMBNAIL_INTERVAL_MINUTES` of the day a timestamp is in."""
+    minute = int(timestamp[9:11]) * 60 + int(timestamp[11:13])
+    return minute // THUMBNAIL_INTERVAL_MINUTES
+
+
+def thumbnail_frames(
+    imgs: list[Path | PackedFrame], taken: Collection[int] = ()
+) -> list[int]:
+    """Pick the first image in every `THUMBNAIL_INTERVAL_MINUTES` of the day.
+
+    Slots in `taken` already have a thumbnail, such as from an earlier segment
+    of the same hour, and are skipped.
+    """
+
+    frames = []
+    last_slot = None
+    for i, src in enumerate(imgs):
+        slot = thumbnail_slot(image_timestamp(src))
+        if slot != last_slot and slot not in taken:
+            frames.append(i)
+        last_slot = slot
+    return frames
+
+
+@contextmanager
+def rendition_outputs(
+    code: str,
+    imgs: list[Path | PackedFrame],
+    renditions: list[str],
+    proxy: Path,
+    thumbnails_dir: Path,
+) -> Iterator[RenditionOutputs | None]:
+    """Set up where an encode of `imgs` writes its renditions.
+
+    Thumbnails are written to a temporary folder, then named after their
+    capture times once the encode succeeds. Yields None without renditions.
+    """
+
+    if not renditions:
+        yield None
+        return
+
+    outputs = RenditionOutputs()
+    if Rendition.PROXY in renditions:
+        proxy.parent.mkdir(parents=True, exist_ok=True)
+        outputs.proxy = proxy
+    if Rendition.THUMBNAILS not in renditions:
+        yield outputs
+        return
+
+    thumbnails_dir.mkdir(parents=True, exist_ok=True)
+    taken = {
+        thumbnail_slot(image_timestamp(thumbnail))
+        for thumbnail in thumbnails_dir.glob("*.jpg")
+    }
+    with tempfile.TemporaryDirectory(dir=thumbnails_dir) as tmpdir:
+        outputs.thumbnails_dir = Path(tmpdir)
+        outputs.thumbnail_frames = thumbnail_frames(imgs, taken)
+        yield outputs
+
+        thumbnails = sorted(outputs.thumbnails_dir.glob("*.jpg"))
+        for thumbnail, frame in zip(thumbnails, outputs.thumbnail_frames):
+            timestamp = image_timestamp(imgs[frame])
+            thumbnail.replace(thumbnails_dir / f"{code}_{timestamp}.jpg")
+
+
+def split_outputs(
+    outfile: Path,
+    out_args: list[str],
+    thread_args: list[str],
+    video_format: VideoFormat,
+    renditions: RenditionOutputs | None = None,
+) -> list[str]:
+    """Get the ffmpeg output arguments for a video and its renditions.
+
+    A filter graph splits the decoded images between the outputs, so they're
+    decoded once for all of them. An "mjpeg" video copies the input as it is,
+    so only the renditions use the decoded images.
+    """
+
+    branches = []
+    if renditions is not None and renditions.proxy is not None:
+        branches.append(
+            (
+                "proxy",
+                f"scale=-2:{PROXY_HEIGHT}",
+                [*PROXY_CODEC_ARGS, *thread_args],
+                renditions.proxy,
+            )
+        )
+    if renditions is not None and renditions.thumbnail_frames:
+        select = "+".join(f"eq(n,{n})" for n in renditions.thumbnail_frames)
+        branches.append(
+            (
+                "thumbnails",
+                f"select='{select}',scale=-2:{THUMBNAIL_HEIGHT}",
+                ["-fps_mode", "passthrough", "-q:v", "3"],
+                renditions.thumbnails_dir / "%06d.jpg",
+            )
+        )
+
+    if not branches:
+        return [*out_args, *thread_args, str(outfile)]
+
+    if video_format == VideoFormat.MJPEG:
+        first = 0
+        args = ["-map", "0:v", *out_args, *thread_args, str(outfile)]
+    else:
+        first = 1
+        args = ["-map", "[s0]", *out_args, *thread_args, str(outfile)]
+
+    split = first + len(branches)
+    graph = f"[0:v]split={split}" + "".join(f"[s{i}]" for i in range(split))
+    for i, (label, chain, branch_args, path) in enumerate(branches, start=first):
+        graph += f";[s{i}]{chain}[{label}]"
+        args += ["-map", f"[{label}]", *branch_args, str(path)]
+
+    return ["-filter_complex", graph, *args]
+
+
+def encode_images(
+    imgs: list[Path | PackedFrame],
+    outfile: Path,
+    feed: FrameFeed,
+    threads: int | None = None,
+    nice: int = 0,
+    preset: str | None = None,
+    video_format: str = VIDEO_FORMAT,
+    renditions: RenditionOutputs | None = None,
+):
+    """Encode images into a video at `outfile`, and any renditions of it.
+
+    In the "mjpeg" format, the images are copied into the video as they are.
+    """
+
+    thread_args = ["-threads", str(threads)] if threads else []
+    video_format = VideoFormat(video_format)
+    outputs = split_outputs(
+        outfile,
+        output_args(video_format, preset),
+        thread_args,
+        video_format,
+        renditions,
+    )
+    cmd = [*ffmpeg_base_cmd(), "-framerate", str(FPS)]
+
+    if feed == FrameFeed.PIPE:
+        cmd += [
+            "-f",
+            "image2pipe",
+            "-c:v",
+            "mjpeg",
+            "-i",
+            "-",
+            *outputs,
+        ]
+        pipe_frames(cmd, image_contents(imgs), nice)
+    else:
+        with frame_sequence(imgs, feed) as pattern:
+            cmd += [
+                "-start_number",
+                "1",
+                "-i",
+                str(pattern),
+                *outputs,
+            ]
+            run_ffmpeg(cmd, nice)
+
+
+def segment_videos(segments_dir: Path, hour: int | None = None) -> list[Path]:
+    """Get the finished segment videos in a folder, optionally for one hour.
+
+    They are sorted by hour, then in the order each hour's parts were made.
+    """
+    prefix = "[0-9][0-9]" if hour is None else f"{hour:02d}"
+    return sorted(
+        (
+            path
+            for path in segments_dir.glob(f"{prefix}*.mp4")
+            if not path.name.endswith(".tmp.mp4")
+        ),
+        key=lambda path: (path.name[:2], len(path.stem), path.stem),
+    )
+
+
+def encode_segment(
+    code: str,
+    day: str,
+    hour: int,
+    imgs: list[Path | PackedFrame],
+    feed: str = VIDEO_FRAME_FEED,
+    threads: int | None = None,
+    nice: int = 0,
+    preset: str | None = None,
+    renditions: list[str] = RENDITIONS,
+) -> bool:
+    """Encode one hour of a webcam's images into a segment, then delete them.
+
+    A segment is its video, a timestamps file, and its renditions: a proxy in
+    the proxies folder, and thumbnails saved straight to the day's thumbnails.
+    The video is renamed into place last, so a segment only exists once all
+    are complete. Images already in a segment, left behind by a crash, are
+    deleted without encoding them again. Images that arrive after an hour's
+    segment become another segment for that hour. Packed images stay in their
+    pack until the daily video is made. Returns whether a segment was encoded.
+    """
+
+    segments_dir = PICTURES_DIR / day / code / SEGMENTS_DIRNAME
+    segments_dir.mkdir(exist_ok=True)
+
+    existing = segment_videos(segments_dir, hour)
+    encoded = set()
+    for video in existing:
+        encoded.update(video.with_suffix(".txt").read_text().splitlines())
+
+    new_imgs = [src for src in imgs if image_timestamp(src) not in encoded]
+    if new_imgs:
+        # Later segments for an hour are numbered: 07, 07_1, 07_2, ...
+        part = f"_{len(existing)}" if existing else ""
+        outfile = segments_dir / f"{hour:02d}{part}.mp4"
+        tmp_out = outfile.with_suffix(".tmp.mp4")
+        proxy_out = segments_dir / PROXIES_DIRNAME / outfile.name
+
+        with rendition_outputs(
+            code,
+            new_imgs,
+            renditions,
+            proxy_out.with_suffix(".tmp.mp4"),
+            thumbnails_path(code, day),
+        ) as outputs:
+            encode_images(
+                new_imgs,
+                tmp_out,
+                FrameFeed(feed),
+                threads,
+                nice,
+                preset,
+                renditions=outputs,
+            )
+        if outputs is not None and outputs.proxy is not None:
+            outputs.proxy.rename(proxy_out)
+        outfile.with_suffix(".txt").write_text(
+            "\n".join(image_timestamp(src) for src in new_imgs)
+        )
+        tmp_out.rename(outfile)
+
+    for src in imgs:
+        if isinstance(src, Path):
+            src.unlink(missing_ok=True)
+
+    return bool(new_imgs)
+
+
+def encode_segments(
+    code: str,
+    day: str,
+    before_hour: int = 24,
+    feed: str = VIDEO_FRAME_FEED,
+    threads: int | None = None,
+    nice: int = 0,
+    preset: str | None = None,
+    renditions: list[str] = RENDITIONS,
+) -> int:
+    """Encode every hour of a webcam's images before `before_hour` into segments.
+
+    Returns the number of segments encoded.
+    """
 
     camdir = PICTURES_DIR / day / code
-    imgs = sorted(camdir.glob("*.jpg"))
+    imgs = day_images(camdir)
+    encoded = 0
+
+    for hour, hour_imgs in groupby(imgs, key=image_hour):
+        if hour >= before_hour:
+            break
+        encoded += encode_segment(
+            code, day, hour, list(hour_imgs), feed, threads, nice, preset, renditions
+        )
+
+    return encoded
+
+
+def concat_videos(videos: list[Path], outfile: Path, nice: int = 0):
+    """Join videos in one folder into one video without re-encoding."""
 
-    if not imgs:
+    list_file = videos[0].parent / "concat.txt"
+    list_file.write_text("".join(f"file '{video.name}'\n" for video in videos))
+
+    cmd = [
+        *ffmpeg_base_cmd(),
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_file),
+        "-c",
+        "copy",
+        "-movflags",
+        "+faststart",
+        str(outfile),
+    ]
+    run_ffmpeg(cmd, nice)
+
+
+def concat_segments(segments_dir: Path, outfile: Path, nice: int = 0) -> list[str]:
+    """Join a day's segments into one video without re-encoding.
+
+    Returns the timestamps of the video's frames.
+    """
+
+    segments = segment_videos(segments_dir)
+    if not segments:
         raise VideoCreationError("No webcam images to process")
 
+    timestamps = []
+    for segment in segments:
+        timestamps += segment.with_suffix(".txt").read_text().splitlines()
+
+    concat_videos(segments, outfile, nice)
+    return timestamps
+
+
+def concat_proxies(segments_dir: Path, outfile: Path, nice: int = 0) -> bool:
+    """Join the proxies of a day's segments into one proxy.
+
+    Returns False, joining nothing, if some segments have no proxy, such as
+    ones encoded before the proxy rendition was turned on.
+    """
+
+    proxies = [
+        segments_dir / PROXIES_DIRNAME / segment.name
+        for segment in segment_videos(segments_dir)
+    ]
+    if not proxies or not all(proxy.exists() for proxy in proxies):
+        return False
+
+    outfile.parent.mkdir(parents=True, exist_ok=True)
+    concat_videos(proxies, outfile, nice)
+    return True
+
+
+def create_daily_video(
+    code: str,
+    day: str,
+    feed: str = VIDEO_FRAME_FEED,
+    threads: int | None = None,
+    nice: int = 0,
+    preset: str | None = None,
+    renditions: list[str] = RENDITIONS,
+):
+    """Create a daily video using all downloaded webcam images for a day.
+
+    If `threads` is given, ffmpeg is limited to that many threads, `nice`
+    lowers its priority, and `preset` replaces the preset in
+    `FFMPEG_CODEC_ARGS`. With `SEGMENT_ENCODING`, or if segments were already
+    encoded for the day, any images left are encoded into segments and the
+    segments are joined. `renditions` are made in the same ffmpeg runs. Writes
+    the video's timestamps and time index, the proxy's time index, and the
+    thumbnails' timestamps. Returns the number of frames in the video.
+    """
+
+    if DEBUG_VIDEO_CREATE_SLEEP:
+        time.sleep(DEBUG_VIDEO_CREATE_SLEEP_SECONDS)
+
+    feed = FrameFeed(feed)
+
+    camdir = PICTURES_DIR / day / code
+    segments_dir = camdir / SEGMENTS_DIRNAME
+
     video_dir = VIDEOS_DIR / day / "videos"
     timestamps_dir = VIDEOS_DIR / day / "timestamps"
 
-    video_dir.mkdir(parents=True, exist_ok=True)
-    timestamps_dir.mkdir(parents=True, exist_ok=True)
-
     outfile = video_dir / f"{code}.mp4"
     tmp_out = outfile.with_suffix(".tmp.mp4")
     timestamps_file = timestamps_dir / f"{code}.txt"
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmpdir = Path(tmpdir)
-        timestamps = []
+    proxy_out = proxy_path(code, day)
+    proxy_tmp = proxy_out.with_suffix(".tmp.mp4")
+    thumbnails_dir = thumbnails_path(code, day)
 
-        for i, src in enumerate(imgs, start=1):
-            dst = tmpdir / f"{i:06d}.jpg"
-            shutil.copy2(src, dst)
-
-            name = src.stem.split("_", 1)[1]
-            timestamps.append(name)
-
-        cmd = [
-            "ffmpeg",
-            "-hide_banner",
-            "-loglevel",
-            "error",
-            "-y",
-            "-framerate",
-            str(FPS),
-            "-start_number",
-            "1",
-            "-i",
-            str(tmpdir / "%06d.jpg"),
-            *FFMPEG_CODEC_ARGS,
-            str(tmp_out),
-        ]
+    with encode_lock(code):
+        if SEGMENT_ENCODING or segments_dir.exists():
+            encode_segments(
+                code,
+                day,
+                feed=feed,
+                threads=threads,
+                nice=nice,
+                preset=preset,
+                renditions=renditions,
+            )
+
+            video_dir.mkdir(parents=True, exist_ok=True)
+            timestamps_dir.mkdir(parents=True, exist_ok=True)
+
+            timestamps = concat_segments(segments_dir, tmp_out, nice)
+            if Rendition.PROXY in renditions and not concat_proxies(
+                segments_dir, proxy_tmp, nice
+            ):
+                logger.warning("Some segments of %s %s have no proxy", day, code)
+        else:
+            imgs = day_images(camdir)
+
+            if not imgs:
+                raise VideoCreationError("No webcam images to process")
 
-        subprocess.run(cmd, check=True)
+            video_dir.mkdir(parents=True, exist_ok=True)
+            timestamps_dir.mkdir(parents=True, exist_ok=True)
+
+            with rendition_outputs(
+                code, imgs, renditions, proxy_tmp, thumbnails_dir
+            ) as outputs:
+                encode_images(
+                    imgs, tmp_out, feed, threads, nice, preset, renditions=outputs
+                )
+            timestamps = [image_timestamp(src) for src in imgs]
 
         if tmp_out.exists():
+            if proxy_tmp.exists():
+                proxy_tmp.rename(proxy_out)
             tmp_out.rename(outfile)
             shutil.rmtree(camdir)
         else:
             raise VideoCreationError("Output video not found")
 
-        timestamps_file.write_text("\n".join(timestamps))
+    timestamps_file.write_text("\n".join(timestamps))
+
+    # The video is fine without an index, which can be rebuilt later.
+    try:
+        write_time_index(outfile, timestamps, index_path(code, day))
+        if Rendition.PROXY in renditions and proxy_out.exists():
+            write_time_index(proxy_out, timestamps, proxy_index_path(code, day))
+    except (TimeIndexError, OSError) as e:
+        logger.exception("Time index failed: %s", e)
+
+    if Rendition.THUMBNAILS in renditions:
+        thumbnails = sorted(thumbnails_dir.glob("*.jpg"))
+        (timestamps_dir / f"{code}.thumbnails.txt").write_text(
+            "\n".join(image_timestamp(thumbnail) for thumbnail in thumbnails)
+        )
+
+    return len(timestamps)
+
+
+def is_mjpeg_video(path: Path) -> bool:
+    """Check whether a video was made in the "mjpeg" format."""
+    return video_codec(path) in MJPEG_CODECS
+
+
+def transcode_video(
+    code: str,
+    day: str,
+    threads: int | None = None,
+    nice: int = 0,
+    preset: str | None = None,
+):
+    """Re-encode a daily video with `FFMPEG_CODEC_ARGS`, replacing it.
+
+    The time index is rebuilt, since the keyframes change.
+    """
+
+    outfile = video_path(code, day)
+    tmp_out = outfile.with_suffix(".tmp.mp4")
+    thread_args = ["-threads", str(threads)] if threads else []
+
+    cmd = [
+        *ffmpeg_base_cmd(),
+        "-i",
+        str(outfile),
+        *codec_args(preset),
+        *thread_args,
+        str(tmp_out),
+    ]
+    run_ffmpeg(cmd, nice)
+    tmp_out.replace(outfile)
+
+    try:
+        build_time_index(code, day)
+    except (TimeIndexError, OSError) as e:
+        logger.exception("Time index failed: %s", e)
@@ -1,20 +1,52 @@
-"""Download webcam images."""
+"""Download webcam images.
+
+Each image is streamed: checked and hashed as it arrives, and written to a
+partial file that is renamed into place once the image is known to be whole.
+"""
 
 import hashlib
+import os
 import random
 import time
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
 from pathlib import Path
+from threading import Lock
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 from sfu_webcams_recorder.config.settings import (
     DEBUG_DOWNLOAD_DELAY,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_POOL_SIZE,
     DOWNLOAD_TIMEOUT_SECONDS,
+    FRAME_STORAGE,
+    MAX_IMAGE_BYTES,
+    NEAR_DUPLICATE_FILTER,
     PICTURES_DIR,
 )
+from sfu_webcams_recorder.io.framepack import append_frame, last_packed_frame
+from sfu_webcams_recorder.io.perceptual import (
+    dhash,
+    hash_distance,
+    near_duplicate_threshold,
+)
+from sfu_webcams_recorder.io.writer import Submission, WriteJob, disk_writer
 from sfu_webcams_recorder.ui.state import program_state
+from sfu_webcams_recorder.ui.trace import current_trace, span
 from sfu_webcams_recorder.utils import day_folder_name, now
 
+# The bytes every JPEG starts with, and the marker it ends with.
+JPEG_START = b"\xff\xd8\xff"
+JPEG_END = b"\xff\xd9"
+# Bytes kept from the end of a download, to find the end marker behind any
+# padding the camera adds.
+JPEG_TAIL_BYTES = 32
+
 
 class DuplicateWebcamImageError(Exception):
     """Raised when a downloaded webcam image is identical to the previous one."""
@@ -26,6 +58,183 @@ class DuplicateWebcamImageError(Exception):
         super().__init__("Downloaded image is identical to previous")
 
 
+class NearDuplicateWebcamImageError(Exception):
+    """Raised when a downloaded webcam image looks the same as the previous one."""
+
+    def __init__(self, new_file: Path, old_file: Path, distance: int):
+        self.new_file = new_file
+        self.old_file = old_file
+        self.distance = distance
+
+        super().__init__(
+            f"Downloaded image looks the same as previous ({distance} bits differ)"
+        )
+
+
+class UnchangedWebcamImageError(Exception):
+    """Raised when the webcam host reports the image has not changed."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+        super().__init__("Image not modified since previous")
+
+
+class InvalidWebcamImageError(Exception):
+    """Raised when a download is stopped because it isn't a whole JPEG."""
+
+    def __init__(self, url: str, reason: str):
+        self.url = url
+        self.reason = reason
+
+        super().__init__(f"Download stopped: {reason}")
+
+
+class DroppedWebcamImageError(Exception):
+    """Raised when a downloaded webcam image is dropped by the full write queue."""
+
+    def __init__(self, new_file: Path):
+        self.new_file = new_file
+
+        super().__init__("Write queue full, image dropped")
+
+
+@dataclass(slots=True)
+class StreamedImage:
+    """A downloaded image, checked and hashed as it arrived."""
+
+    digest: str
+    size: int
+    # The image, when it was kept in memory instead of written to `part_file`.
+    content: bytes | None = None
+    part_file: Path | None = None
+
+    def read(self) -> bytes:
+        """Get the image's bytes."""
+        if self.content is not None:
+            return self.content
+        return self.part_file.read_bytes()
+
+    def discard(self):
+        """Remove the partial file, if there is one."""
+        if self.part_file is not None:
+            self.part_file.unlink(missing_ok=True)
+
+
+@dataclass(slots=True)
+class LastImage:
+    """The most recently saved image of a webcam."""
+
+    day: str
+    path: Path
+    digest: str
+    # Perceptual hash, with NEAR_DUPLICATE_FILTER.
+    phash: int | None = None
+
+
+# The last saved image for each webcam code. Each entry is only touched by the
+# thread downloading that webcam.
+last_images: dict[str, LastImage] = {}
+
+
+@dataclass(slots=True)
+class CacheValidators:
+    """What the host said about the last image downloaded from a webcam."""
+
+    etag: str | None
+    last_modified: str | None
+    size: int
+
+
+# The cache validators for each webcam code. Each entry is only touched by the
+# thread downloading that webcam.
+validators: dict[str, CacheValidators] = {}
+
+
+class TracedHTTPConnection(HTTPConnection):
+    """An HTTP connection that adds its connect time to the trace."""
+
+    def _new_conn(self):
+        with span("connect"):
+            return super()._new_conn()
+
+
+class TracedHTTPSConnection(HTTPSConnection):
+    """An HTTPS connection that adds its connect and TLS times to the trace."""
+
+    def _new_conn(self):
+        with span("connect"):
+            return super()._new_conn()
+
+    def connect(self):
+        trace = current_trace()
+        if trace is None:
+            super().connect()
+            return
+
+        # A failed handshake is timed too.
+        connect = trace.phases.get("connect", 0)
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            connect = trace.phases.get("connect", 0) - connect
+            trace.add("tls", time.perf_counter() - start - connect)
+
+
+class TracedHTTPConnectionPool(HTTPConnectionPool):
+    """A pool of traced HTTP connections."""
+
+    ConnectionCls = TracedHTTPConnection
+
+
+class TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    """A pool of traced HTTPS connections."""
+
+    ConnectionCls = TracedHTTPSConnection
+
+
+# A pooled keep-alive session for each webcam host.
+sessions: dict[str, requests.Session] = {}
+sessions_lock = Lock()
+
+
+def host_session(url: str) -> requests.Session:
+    """Get the shared session for the host of a URL."""
+
+    host = urlsplit(url).netloc
+
+    with sessions_lock:
+        session = sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=DOWNLOAD_POOL_SIZE)
+            adapter.poolmanager.pool_classes_by_scheme = {
+                "http": TracedHTTPConnectionPool,
+                "https": TracedHTTPSConnectionPool,
+            }
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[host] = session
+
+    return session
+
+
+def conditional_headers(code: str) -> dict[str, str]:
+    """Get the headers asking for a webcam image only if it has changed."""
+
+    cached = validators.get(code)
+    if cached is None:
+        return {}
+
+    headers = {}
+    if cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+    return headers
+
+
 def iso_filename_section():
     """Used to add the timestamp to a downloaded webcam image."""
     return now().strftime("%Y%m%dT%H%M%S")
@@ -38,35 +247,292 @@ def md5sum(path: Path) -> str:
         return hashlib.file_digest(f, "md5").hexdigest()
 
 
-def download_webcam_image(code: str, url: str) -> Path:
-    """Download a webcam image."""
+def perceptual_hash(content: bytes) -> int | None:
+    """Get an image's perceptual hash, or None if the filter is off or it failed.
+
+    An image that can't be decoded is still saved, just never compared.
+    """
+
+    if not NEAR_DUPLICATE_FILTER:
+        return None
+    try:
+        return dhash(content)
+    except (OSError, ValueError):
+        return None
+
+
+def seed_last_image(code: str, day: str) -> LastImage | None:
+    """Find and hash the newest image already saved for a webcam's day.
+
+    Only needed once per day, such as after a restart, since every saved image
+    updates `last_images` afterwards.
+    """
 
-    day = day_folder_name()
     camdir = PICTURES_DIR / day / code
     camdir.mkdir(parents=True, exist_ok=True)
 
-    outfile = camdir / f"{code}_{iso_filename_section()}.jpg"
+    files = list(camdir.glob("*.jpg"))
+    newest = max(files, key=lambda p: p.stat().st_mtime) if files else None
+    packed = last_packed_frame(camdir)
+
+    if packed is not None and (
+        newest is None or packed.timestamp >= newest.stem.split("_", 1)[1]
+    ):
+        path = camdir / f"{code}_{packed.timestamp}.jpg"
+        content = packed.read()
+        digest = hashlib.md5(content).hexdigest()
+        return LastImage(day, path, digest, perceptual_hash(content))
+
+    if newest is None:
+        return None
+
+    if NEAR_DUPLICATE_FILTER:
+        content = newest.read_bytes()
+        digest = hashlib.md5(content).hexdigest()
+        return LastImage(day, newest, digest, perceptual_hash(content))
+
+    return LastImage(day, newest, md5sum(newest))
+
+
+def write_image(outfile: Path, timestamp: str, content: bytes):
+    """Write an image to its own file, or its webcam's pack with FRAME_STORAGE."""
+
+    if FRAME_STORAGE == "pack":
+        append_frame(outfile.parent, timestamp, content)
+        return
 
     try:
-        r = requests.get(url, timeout=DOWNLOAD_TIMEOUT_SECONDS)
-        if DEBUG_DOWNLOAD_DELAY:
-            time.sleep(random.uniform(1, 30))
-        r.raise_for_status()
-        outfile.write_bytes(r.content)
-        with program_state.lock:
-            program_state.total_downloaded_bytes += len(r.content)
-            program_state.total_downloaded_images += 1
-    except (requests.RequestException, OSError):
+        outfile.write_bytes(content)
+    except OSError:
         if outfile.exists():
             outfile.unlink()
         raise
 
-    files = sorted(camdir.glob("*.jpg"), key=lambda p: p.stat().st_mtime, reverse=True)
 
-    if len(files) > 1:
-        last_file = files[1]
-        if md5sum(last_file) == md5sum(outfile):
-            outfile.unlink()
-            raise DuplicateWebcamImageError(outfile, last_file)
+def part_file_path(code: str) -> Path | None:
+    """Get the file a webcam's download is streamed to before it is saved.
+
+    Returns None when images are kept in memory instead, since pack storage and
+    write-behind take the image's bytes.
+    """
+
+    if FRAME_STORAGE == "pack" or disk_writer.running:
+        return None
+    # Not a .jpg, so a video never picks up a partial image.
+    return PICTURES_DIR / day_folder_name() / code / f".{code}.part"
+
+
+def stream_image(
+    url: str, r: requests.Response, part_file: Path | None
+) -> StreamedImage:
+    """Read an image response in chunks, checking and hashing it as it arrives.
+
+    The image is written to `part_file`, or kept in memory if None. The
+    download is stopped, and the partial file removed, if the image is bigger
+    than `MAX_IMAGE_BYTES`, doesn't start like a JPEG, or ends early.
+    """
+
+    length = r.headers.get("Content-Length", "")
+    # With a content encoding, the length isn't the image's size.
+    expected = (
+        int(length)
+        if length.isdigit() and not r.headers.get("Content-Encoding")
+        else None
+    )
+    if expected is not None and expected > MAX_IMAGE_BYTES:
+        raise InvalidWebcamImageError(url, f"image is {expected} bytes, too big")
+
+    md5 = hashlib.md5()
+    size = 0
+    tail = b""
+    chunks: list[bytes] = []
+
+    if part_file is not None:
+        part_file.parent.mkdir(parents=True, exist_ok=True)
+        f = part_file.open("wb")
+    try:
+        for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+            if not size and not chunk.startswith(JPEG_START):
+                raise InvalidWebcamImageError(url, "not a JPEG")
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise InvalidWebcamImageError(
+                    url, f"image is over {MAX_IMAGE_BYTES} bytes, too big"
+                )
+
+            md5.update(chunk)
+            tail = (tail + chunk)[-JPEG_TAIL_BYTES:]
+            if part_file is not None:
+                f.write(chunk)
+            else:
+                chunks.append(chunk)
+
+        if expected is not None and size < expected:
+            raise InvalidWebcamImageError(
+                url, f"truncated at {size} of {expected} bytes"
+            )
+        if not tail.rstrip(b"\x00\r\n ").endswith(JPEG_END):
+            raise InvalidWebcamImageError(url, "truncated, no JPEG end marker")
+    except BaseException:
+        if part_file is not None:
+            f.close()
+            part_file.unlink(missing_ok=True)
+        raise
+
+    if part_file is not None:
+        f.close()
+        return StreamedImage(md5.hexdigest(), size, part_file=part_file)
+    return StreamedImage(md5.hexdigest(), size, content=b"".join(chunks))
+
+
+def commit_part_file(part_file: Path, outfile: Path):
+    """Rename a fully downloaded image into place."""
+
+    try:
+        os.replace(part_file, outfile)
+    except FileNotFoundError:
+        if not part_file.exists():
+            raise
+        # The folder was removed after being seeded, such as by a video being
+        # made for it.
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(part_file, outfile)
+
+
+def save_webcam_image(code: str, content: bytes) -> Path:
+    """Save a downloaded webcam image, unless it is identical to the last one.
+
+    With `NEAR_DUPLICATE_FILTER`, images that look the same as the last saved
+    one are also rejected. Returns the image's path, which with packed images
+    is the path it would be unpacked to. An image dropped by a full write
+    queue isn't remembered as the last one, so it's saved next time.
+    """
+
+    image = StreamedImage(hashlib.md5(content).hexdigest(), len(content), content)
+    return save_streamed_image(code, image)
+
+
+def save_streamed_image(code: str, image: StreamedImage) -> Path:
+    """Save a streamed webcam image, like `save_webcam_image`.
+
+    A partial file is renamed into place, or removed if the image is rejected.
+    """
+
+    day = day_folder_name()
+    timestamp = iso_filename_section()
+    outfile = PICTURES_DIR / day / code / f"{code}_{timestamp}.jpg"
+    try:
+        with span("dedup"):
+            last = last_images.get(code)
+            if last is None or last.day != day:
+                last = seed_last_image(code, day)
+
+            if last is not None and last.digest == image.digest:
+                raise DuplicateWebcamImageError(outfile, last.path)
+
+            phash = perceptual_hash(image.read()) if NEAR_DUPLICATE_FILTER else None
+            if phash is not None and last is not None and last.phash is not None:
+                distance = hash_distance(phash, last.phash)
+                if distance <= near_duplicate_threshold(code):
+                    raise NearDuplicateWebcamImageError(outfile, last.path, distance)
+
+        with span("write"):
+            if image.part_file is not None:
+                commit_part_file(image.part_file, outfile)
+            else:
+                # With write-behind, the writer thread saves the image later.
+                submission = Submission.REFUSED
+                if disk_writer.running:
+                    job = WriteJob(outfile, timestamp, image.content)
+                    submission = disk_writer.submit(job)
+                if submission == Submission.DROPPED:
+                    raise DroppedWebcamImageError(outfile)
+                if submission == Submission.REFUSED:
+                    try:
+                        write_image(outfile, timestamp, image.content)
+                    except FileNotFoundError:
+                        # The folder was removed after being seeded, such as
+                        # by a video being made for it.
+                        outfile.parent.mkdir(parents=True, exist_ok=True)
+                        write_image(outfile, timestamp, image.content)
+    except BaseException:
+        image.discard()
+        raise
+
+    last_images[code] = LastImage(day, outfile, image.digest, phash)
+
+    return outfile
+
+
+def fetch_webcam_image(code: str, url: str) -> tuple[StreamedImage, CacheValidators]:
+    """Transfer a webcam image, if it changed since the last download.
+
+    Returns the image, and the validators to remember once it is saved.
+    """
+
+    with host_session(url).get(
+        url,
+        headers=conditional_headers(code),
+        timeout=DOWNLOAD_TIMEOUT_SECONDS,
+        stream=True,
+    ) as r:
+        # `r.elapsed` runs until the headers are read, including any new
+        # connection.
+        trace = current_trace()
+        if trace is not None:
+            headers = r.elapsed.total_seconds()
+            connect = trace.phases.get("connect", 0) + trace.phases.get("tls", 0)
+            trace.add("ttfb", max(0, headers - connect))
+
+        if DEBUG_DOWNLOAD_DELAY:
+            time.sleep(random.uniform(1, 30))
+
+        # Read the short body of anything but an image, so the connection is
+        # kept open instead of closed with the body unread.
+        if r.status_code != requests.codes.ok:
+            r.content
+
+        if r.status_code == requests.codes.not_modified:
+            cached = validators.get(code)
+            program_state.total_unchanged_images.add()
+            program_state.total_saved_bytes.add(cached.size if cached else 0)
+            raise UnchangedWebcamImageError(url)
+
+        r.raise_for_status()
+
+        with span("body"):
+            image = stream_image(url, r, part_file_path(code))
+
+    program_state.total_downloaded_bytes.add(image.size)
+    program_state.total_downloaded_images.add()
+
+    new_validators = CacheValidators(
+        r.headers.get("ETag"), r.headers.get("Last-Modified"), image.size
+    )
+    return image, new_validators
+
+
+def download_webcam_image(
+    code: str, url: str, transfer: AbstractContextManager = nullcontext()
+) -> Path:
+    """Download a webcam image.
+
+    The image is only transferred if it changed since the last download, and
+    is streamed to disk, so only a whole JPEG is ever saved. `transfer` is
+    entered around the request and the body, such as a host's gate, but not
+    around checking and saving the image.
+    """
+
+    with transfer:
+        image, new_validators = fetch_webcam_image(code, url)
+
+    # Only remember the validators once the image is known to be saved, or to
+    # be the same as the saved one, so a failed save is downloaded again.
+    try:
+        outfile = save_streamed_image(code, image)
+    except (DuplicateWebcamImageError, NearDuplicateWebcamImageError):
+        validators[code] = new_validators
+        raise
+    validators[code] = new_validators
 
     return outfile
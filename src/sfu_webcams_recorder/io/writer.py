@@ -0,0 +1,283 @@
+"""Write downloaded images on a background thread.
+
+With `WRITE_BEHIND`, downloaders hand images to a bounded queue and go back to
+their schedule. The writer takes images off the queue in batches, writes each
+to a temporary file, fsyncs the batch, then renames the files into place, so
+an image only appears under its name once it's on disk.
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+from enum import StrEnum, auto
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Condition, Thread
+
+from sfu_webcams_recorder.config.settings import (
+    FRAME_STORAGE,
+    WRITE_BATCH_SECONDS,
+    WRITE_BATCH_SIZE,
+    WRITE_QUEUE_FULL_POLICY,
+    WRITE_QUEUE_SIZE,
+)
+from sfu_webcams_recorder.io.framepack import INDEX_NAME, PACK_NAME, append_frame
+from sfu_webcams_recorder.ui.state import program_state
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullPolicy(StrEnum):
+    """What a download does when the write queue is full."""
+
+    BLOCK = auto()
+    DROP = auto()
+    SYNC = auto()
+
+
+class Submission(StrEnum):
+    """What became of an image handed to the writer."""
+
+    QUEUED = auto()
+    # The queue was full and the image was lost.
+    DROPPED = auto()
+    # The queue was full and the caller must write the image itself.
+    REFUSED = auto()
+
+
+@dataclass(slots=True)
+class WriteJob:
+    """An image waiting to be written."""
+
+    outfile: Path
+    timestamp: str
+    content: bytes
+    # Where the job is in the order of all submitted jobs.
+    seq: int = 0
+
+
+def fsync_path(path: Path):
+    """Flush a file or folder to disk, where the OS allows it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class DiskWriter:
+    """A bounded queue of images and the thread that writes them."""
+
+    def __init__(
+        self,
+        size: int = WRITE_QUEUE_SIZE,
+        policy: str = WRITE_QUEUE_FULL_POLICY,
+        batch_size: int = WRITE_BATCH_SIZE,
+        batch_seconds: float = WRITE_BATCH_SECONDS,
+    ):
+        self.queue: Queue[WriteJob] = Queue(size)
+        self.policy = QueueFullPolicy(policy)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.thread: Thread | None = None
+
+        # The sequence number of the last job submitted for each folder, and
+        # of the last one done. Each folder's jobs come from one downloader,
+        # so they are done in order. A folder is forgotten once it catches up.
+        self.seq = 0
+        self.submitted: dict[Path, int] = {}
+        self.done: dict[Path, int] = {}
+        self.progress = Condition()
+
+    @property
+    def running(self) -> bool:
+        """Whether the writer thread was started."""
+        return self.thread is not None
+
+    def start(self):
+        """Start the writer thread."""
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, job: WriteJob) -> Submission:
+        """Queue an image to be written.
+
+        If the queue is full, the image is dropped, or refused so the caller
+        writes it, depending on the policy.
+        """
+
+        folder = job.outfile.parent
+        with self.progress:
+            self.seq += 1
+            job.seq = self.seq
+            previous = self.submitted.get(folder)
+            if previous is None:
+                # Everything the folder was sent before is done.
+                self.done[folder] = job.seq - 1
+            self.submitted[folder] = job.seq
+
+        try:
+            self.queue.put_nowait(job)
+        except Full:
+            if self.policy != QueueFullPolicy.BLOCK:
+                self.withdraw(folder, previous)
+            if self.policy == QueueFullPolicy.SYNC:
+                return Submission.REFUSED
+            if self.policy == QueueFullPolicy.DROP:
+                logger.warning("Write queue full, dropping %s", job.outfile.name)
+                program_state.total_dropped_writes.add()
+                return Submission.DROPPED
+
+            start = time.perf_counter()
+            self.queue.put(job)
+            waited = time.perf_counter() - start
+            program_state.total_write_wait_ms.add(round(waited * 1000))
+
+        program_state.total_queued_writes.add()
+        program_state.mark_changed()
+        return Submission.QUEUED
+
+    def withdraw(self, folder: Path, previous: int | None):
+        """Forget a job that wasn't queued, the last one submitted for its folder."""
+
+        with self.progress:
+            if previous is None or self.done.get(folder) == previous:
+                del self.submitted[folder]
+                del self.done[folder]
+            else:
+                self.submitted[folder] = previous
+            self.progress.notify_all()
+
+    def finish(self, jobs: list[WriteJob]):
+        """Mark jobs as done, and wake anyone flushing their folders."""
+
+        with self.progress:
+            for job in jobs:
+                folder = job.outfile.parent
+                if self.submitted.get(folder) == job.seq:
+                    del self.submitted[folder]
+                    del self.done[folder]
+                elif folder in self.submitted:
+                    self.done[folder] = job.seq
+            self.progress.notify_all()
+
+    def flush(self, folder: Path | None = None):
+        """Wait until the images queued so far for a folder, or any, are written.
+
+        Images queued while waiting aren't waited for, so other downloads
+        can't keep the wait going.
+        """
+
+        if not self.running:
+            return
+
+        with self.progress:
+            if folder is None:
+                targets = dict(self.submitted)
+            elif folder in self.submitted:
+                targets = {folder: self.submitted[folder]}
+            else:
+                return
+
+            # A forgotten folder has caught up with everything it was sent.
+            self.progress.wait_for(
+                lambda: all(
+                    self.done.get(path, seq) >= seq for path, seq in targets.items()
+                )
+            )
+
+    def next_batch(self) -> list[WriteJob]:
+        """Wait for an image, then collect more for up to `batch_seconds`."""
+
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
+
+    def run(self):
+        """Write batches of images, forever."""
+        while True:
+            batch = self.next_batch()
+            try:
+                self.commit(batch)
+            except Exception as e:
+                logger.exception("Write batch failed: %s", e)
+                program_state.total_failed_writes.add(len(batch))
+            finally:
+                self.finish(batch)
+                for _ in batch:
+                    self.queue.task_done()
+                program_state.total_finished_writes.add(len(batch))
+                program_state.mark_changed()
+
+    def commit(self, batch: list[WriteJob]):
+        """Write a batch of images, fsync them, then move them into place.
+
+        Every image is written before any is fsynced, so the disk flushes the
+        batch together.
+        """
+
+        written = []
+        folders = set()
+
+        for job in batch:
+            folder = job.outfile.parent
+            try:
+                try:
+                    written.append((job, self.write(job)))
+                except FileNotFoundError:
+                    # The folder was removed, such as by a video being made.
+                    folder.mkdir(parents=True, exist_ok=True)
+                    written.append((job, self.write(job)))
+                folders.add(folder)
+            except OSError as e:
+                logger.exception("Write failed for %s: %s", job.outfile, e)
+                program_state.total_failed_writes.add()
+
+        for job, tmp_path in written:
+            if tmp_path is None:
+                continue
+            try:
+                fsync_path(tmp_path)
+                os.replace(tmp_path, job.outfile)
+            except OSError as e:
+                logger.exception("Write failed for %s: %s", job.outfile, e)
+                program_state.total_failed_writes.add()
+
+        # Make the new names, or the appended packs, last through a crash.
+        for folder in folders:
+            if FRAME_STORAGE == "pack":
+                fsync_path(folder / PACK_NAME)
+                fsync_path(folder / INDEX_NAME)
+            fsync_path(folder)
+
+    def write(self, job: WriteJob) -> Path | None:
+        """Write an image to a temporary file next to it, or to its pack.
+
+        Returns the temporary path. Packed images have none.
+        """
+
+        if FRAME_STORAGE == "pack":
+            append_frame(job.outfile.parent, job.timestamp, job.content)
+            return None
+
+        tmp_path = job.outfile.with_name(f".{job.outfile.name}.tmp")
+        tmp_path.write_bytes(job.content)
+        return tmp_path
+
+
+# Singleton instance of the disk writer.
+disk_writer = DiskWriter()
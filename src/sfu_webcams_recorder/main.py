@@ -1,11 +1,310 @@
 """Program entry point."""
 
-from sfu_webcams_recorder.scheduler.loop import run_loop
+import argparse
+import subprocess
+import sys
+from datetime import date, datetime, time
+from pathlib import Path
+
+from rich.console import Console
+
+from sfu_webcams_recorder.config.settings import (
+    NEAR_DUPLICATE_FILTER,
+    PICTURES_DIR,
+    STATUS_SOCKET,
+    VIDEOS_DIR,
+)
+from sfu_webcams_recorder.config.webcams import WEBCAM_URLS, webcams_error
+from sfu_webcams_recorder.io.extract import extract_captures
+from sfu_webcams_recorder.io.framepack import unpack_frames
+from sfu_webcams_recorder.io.perceptual import perceptual_available
+from sfu_webcams_recorder.io.timeindex import (
+    TimeIndexError,
+    build_time_index,
+    extract_frame,
+)
+from sfu_webcams_recorder.io.video import transcode_video
+from sfu_webcams_recorder.scheduler.loop import run_loop, run_shards
+from sfu_webcams_recorder.scheduler.shards import (
+    ShardSpecError,
+    merged_status,
+    parse_shards,
+)
+from sfu_webcams_recorder.scheduler.transcode import find_mjpeg_videos
+from sfu_webcams_recorder.ui.dashboard import render_table, ui_loop
+from sfu_webcams_recorder.ui.status_server import read_status
+from sfu_webcams_recorder.ui.trace import (
+    PERCENTILES,
+    phase_percentiles,
+    read_traces,
+    trace_files,
+)
+from sfu_webcams_recorder.utils import TZ
+
+
+def frame_at_command(args: argparse.Namespace):
+    """Save the frame of a daily video captured nearest a time."""
+    outfile = Path(args.output or f"{args.webcam}_{args.time:%Y%m%dT%H%M%S}.jpg")
+    try:
+        entry = extract_frame(args.webcam, args.time, outfile)
+    except (TimeIndexError, subprocess.CalledProcessError, OSError) as e:
+        sys.exit(str(e))
+    captured = datetime.fromtimestamp(entry.timestamp, TZ)
+    print(
+        f"Saved frame {entry.frame} captured {captured:%Y-%m-%d %H:%M:%S} to {outfile}"
+    )
+
+
+def index_command(args: argparse.Namespace):
+    """Rebuild the time indexes of a day's videos."""
+    videos = sorted((VIDEOS_DIR / args.day / "videos").glob("*.mp4"))
+    codes = args.webcams or [video.stem for video in videos]
+    for code in codes:
+        try:
+            frames = build_time_index(code, args.day)
+            print(f"{code}: indexed {frames} frames")
+        except (TimeIndexError, OSError) as e:
+            print(f"{code}: {e}")
+
+
+def unpack_command(args: argparse.Namespace):
+    """Turn a day's image packs back into image files."""
+    day_path = PICTURES_DIR / args.day
+    if not day_path.is_dir():
+        sys.exit(f"No pictures for {args.day} in {PICTURES_DIR}")
+    codes = args.webcams or sorted(p.name for p in day_path.iterdir() if p.is_dir())
+    for code in codes:
+        try:
+            frames = unpack_frames(day_path / code, code)
+            print(f"{code}: unpacked {frames} images")
+        except OSError as e:
+            print(f"{code}: {e}")
+
+
+def extract_command(args: argparse.Namespace):
+    """Extract the capture nearest a time of day from every day in a range."""
+    codes = args.webcams or [cam_id.name.lower() for cam_id in WEBCAM_URLS]
+    summary = extract_captures(
+        codes,
+        args.time,
+        args.start,
+        args.end,
+        Path(args.output),
+        timelapse=args.timelapse,
+        fps=args.fps,
+        workers=args.workers,
+    )
+    print(
+        f"Saved {summary.saved} captures, {summary.missing} days without a video, "
+        f"{summary.failed} failed"
+    )
+
+
+def transcode_command(args: argparse.Namespace):
+    """Transcode "mjpeg" daily videos now, whether or not the machine is idle."""
+    videos = [
+        (day, code)
+        for day, code in find_mjpeg_videos()
+        if (not args.days or day in args.days)
+        and (not args.webcams or code in args.webcams)
+    ]
+    for day, code in videos:
+        try:
+            transcode_video(code, day, args.threads)
+            print(f"{day} {code}: transcoded")
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"{day} {code}: {e}")
+
+
+def trace_report_command(args: argparse.Namespace):
+    """Summarize the download phase times of each webcam over a time window."""
+
+    since = datetime.now().timestamp() - args.minutes * 60
+    traces = read_traces(trace_files(), since)
+    if args.webcams:
+        traces = [trace for trace in traces if trace["cam"] in args.webcams]
+    if not traces:
+        sys.exit(f"No download traces in the last {args.minutes:g} minutes")
+
+    outcomes = {}
+    for trace in traces:
+        outcomes[trace["out"]] = outcomes.get(trace["out"], 0) + 1
+    print(
+        f"{len(traces)} downloads in the last {args.minutes:g} minutes: "
+        + ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items())
+    )
+
+    header = "".join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES)
+    for code, phases in phase_percentiles(traces).items():
+        print()
+        print(f"{code:<10}{'Count':>8}{header}")
+        for phase, (count, values) in phases.items():
+            cells = "".join(f"{value:>10.1f}" for value in values)
+            print(f"  {phase:<8}{count:>8}{cells}")
+
+
+def record_command(args: argparse.Namespace):
+    """Record the webcams, or some shards of them."""
+
+    if NEAR_DUPLICATE_FILTER and not perceptual_available():
+        sys.exit("NEAR_DUPLICATE_FILTER needs the perceptual extra")
+
+    if args.shards is None:
+        run_loop(headless=args.headless)
+        return
+
+    try:
+        shards = parse_shards(args.shards)
+    except ShardSpecError as e:
+        sys.exit(str(e))
+    if len(shards) == 1:
+        run_loop(shards[0], headless=args.headless)
+    else:
+        run_shards(shards, headless=args.headless)
+
+
+def status_command(args: argparse.Namespace):
+    """Show the dashboard of a running recorder, from its status socket."""
+
+    path = Path(args.socket) if args.socket else STATUS_SOCKET
+
+    def read_snapshot():
+        try:
+            return read_status(path)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Can't read the status at {path}: {e}")
+
+    if args.command == "status":
+        Console().print(render_table(read_snapshot()))
+        return
+    try:
+        ui_loop(read_snapshot)
+    except KeyboardInterrupt:
+        pass
+
+
+def shards_command(args: argparse.Namespace):
+    """Show the merged dashboard of the running shards."""
+    if args.once:
+        Console().print(render_table(merged_status()))
+        return
+    try:
+        ui_loop(merged_status)
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
     """The program entry point."""
-    run_loop()
+    parser = argparse.ArgumentParser(prog="sfu-webcams-recorder")
+    commands = parser.add_subparsers(dest="command")
+
+    record = commands.add_parser("record", help="Record the webcams (the default)")
+    record.add_argument(
+        "--shards",
+        help="Record only these shards of the webcams, each in its own process, "
+        "for example 0-3/8 on one machine and 4-7/8 on another",
+    )
+    record.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run without the dashboard, such as under systemd; "
+        "see it with the status and top commands",
+    )
+    record.set_defaults(func=record_command)
+
+    trace_report = commands.add_parser(
+        "trace-report",
+        help="Summarize download phase times per webcam, with TRACE_DOWNLOADS",
+    )
+    trace_report.add_argument(
+        "--minutes", type=float, default=60, help="Time window (default: 60)"
+    )
+    trace_report.add_argument("-w", "--webcams", nargs="+", help="Webcam codes")
+    trace_report.set_defaults(func=trace_report_command)
+
+    for name, help_text in (
+        ("status", "Print the dashboard of a running recorder"),
+        ("top", "Show the live dashboard of a running recorder"),
+    ):
+        status = commands.add_parser(name, help=help_text)
+        status.add_argument(
+            "--socket", help="Status socket, for example log/status-2-of-8.sock"
+        )
+        status.set_defaults(func=status_command)
+
+    shards = commands.add_parser(
+        "shards", help="Show the merged dashboard of the running shards"
+    )
+    shards.add_argument("--once", action="store_true", help="Print it once and exit")
+    shards.set_defaults(func=shards_command)
+
+    frame_at = commands.add_parser(
+        "frame-at", help="Save the frame of a daily video captured nearest a time"
+    )
+    frame_at.add_argument("webcam", help="Webcam code, for example aqn")
+    frame_at.add_argument(
+        "time",
+        type=datetime.fromisoformat,
+        help="Webcam local time, for example '2025-01-01 12:00'",
+    )
+    frame_at.add_argument("-o", "--output", help="Image path to save to")
+    frame_at.set_defaults(func=frame_at_command)
+
+    index = commands.add_parser("index", help="Rebuild the time indexes of a day")
+    index.add_argument("day", help="Day folder name, for example 2025-1-1-wed")
+    index.add_argument("webcams", nargs="*", help="Webcam codes (default: all)")
+    index.set_defaults(func=index_command)
+
+    unpack = commands.add_parser(
+        "unpack",
+        help="Turn a day's image packs back into image files (not while recording it)",
+    )
+    unpack.add_argument("day", help="Day folder name, for example 2025-1-1-wed")
+    unpack.add_argument("webcams", nargs="*", help="Webcam codes (default: all)")
+    unpack.set_defaults(func=unpack_command)
+
+    extract = commands.add_parser(
+        "extract",
+        help="Extract the capture nearest a time of day from every day in a range",
+    )
+    extract.add_argument(
+        "time",
+        type=time.fromisoformat,
+        help="Webcam local time of day, for example 12:00",
+    )
+    extract.add_argument(
+        "start", type=date.fromisoformat, help="First day, for example 2025-01-01"
+    )
+    extract.add_argument(
+        "end", type=date.fromisoformat, help="Last day, for example 2025-12-31"
+    )
+    extract.add_argument("-w", "--webcams", nargs="+", help="Webcam codes")
+    extract.add_argument("-o", "--output", default="extract", help="Output folder")
+    extract.add_argument(
+        "--timelapse", action="store_true", help="Write a video for each webcam"
+    )
+    extract.add_argument("--fps", type=int, default=30, help="Timelapse frame rate")
+    extract.add_argument("--workers", type=int, help="Default: CPU cores")
+    extract.set_defaults(func=extract_command)
+
+    transcode = commands.add_parser(
+        "transcode", help='Transcode "mjpeg" daily videos with FFMPEG_CODEC_ARGS'
+    )
+    transcode.add_argument(
+        "days", nargs="*", help="Day folder names, for example 2025-1-1-wed"
+    )
+    transcode.add_argument("-w", "--webcams", nargs="+", help="Webcam codes")
+    transcode.add_argument("--threads", type=int, help="ffmpeg threads")
+    transcode.set_defaults(func=transcode_command)
+
+    # Record when no command is given.
+    parser.set_defaults(func=record_command, shards=None, headless=False)
+
+    args = parser.parse_args()
+    if webcams_error is not None:
+        sys.exit(str(webcams_error))
+    args.func(args)
 
 
 if __name__ == "__main__":
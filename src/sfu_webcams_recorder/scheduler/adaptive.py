@@ -0,0 +1,144 @@
+"""Learn when each webcam refreshes, to download just after it does."""
+
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from itertools import pairwise
+
+from sfu_webcams_recorder.config.settings import (
+    ADAPTIVE_MARGIN_SECONDS,
+    ADAPTIVE_MAX_STALENESS_SECONDS,
+    ADAPTIVE_MIN_INTERVAL,
+    ADAPTIVE_RETRY_SECONDS,
+    INTERVAL,
+)
+
+# Refreshes needed before the period is trusted.
+MIN_REFRESHES = 3
+
+# Downloads in a row that all found a new image before checking once between
+# refreshes. If every download is new, the webcam may refresh faster than it
+# is polled.
+FAST_STREAK = 8
+
+
+def parse_http_date(value: str | None) -> float | None:
+    """Parse an HTTP date header into a Unix time."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(slots=True)
+class RefreshEstimator:
+    """Estimate a webcam's refresh period and phase from its downloads."""
+
+    # Estimated times the webcam refreshed.
+    refreshes: deque[float] = field(default_factory=lambda: deque(maxlen=16))
+    period: float | None = None
+    last_fetch: float | None = None
+    streak: int = 0
+    probing: bool = False
+    late_retries: int = 0
+
+    def observe(self, fetched_at: float, changed: bool, modified: str | None = None):
+        """Record whether a download found a new image.
+
+        `modified` is the image's Last-Modified header, which pins down the
+        refresh time exactly. Without it, the refresh time is estimated from
+        this download and the one before.
+        """
+
+        probing = self.probing
+        self.probing = False
+
+        if not changed:
+            self.streak = 0
+            self.last_fetch = fetched_at
+            return
+
+        if probing and self.last_fetch is not None:
+            # A new image between refreshes means the webcam refreshes at least
+            # this often, so start learning again from the shorter period.
+            self.period = max(ADAPTIVE_MIN_INTERVAL, fetched_at - self.last_fetch)
+            self.refreshes.clear()
+
+        refreshed_at = parse_http_date(modified)
+        if refreshed_at is None or refreshed_at > fetched_at:
+            refreshed_at = self.estimate_refresh(fetched_at)
+            self.streak += 1
+        else:
+            self.streak = 0
+
+        self.refreshes.append(refreshed_at)
+        self.last_fetch = fetched_at
+        self.late_retries = 0
+        self.update_period()
+
+    def estimate_refresh(self, fetched_at: float) -> float:
+        """Estimate when a refresh found at `fetched_at` happened."""
+
+        if self.last_fetch is None:
+            return fetched_at
+
+        # The refresh happened somewhere since the last download. If it was
+        # expected in that window, trust the estimate. A window as short as a
+        # late retry pins the refresh down better.
+        window = fetched_at - self.last_fetch
+        if (
+            self.period is not None
+            and self.refreshes
+            and window > ADAPTIVE_MARGIN_SECONDS + ADAPTIVE_RETRY_SECONDS
+        ):
+            expected = self.refreshes[-1] + self.period
+            if self.last_fetch <= expected <= fetched_at:
+                return expected
+
+        return (self.last_fetch + fetched_at) / 2
+
+    def update_period(self):
+        """Re-estimate the refresh period from the recent refreshes."""
+
+        gaps = [b - a for a, b in pairwise(self.refreshes) if b > a]
+        if len(gaps) < MIN_REFRESHES - 1:
+            return
+
+        # The median ignores refreshes missed during download errors.
+        self.period = max(ADAPTIVE_MIN_INTERVAL, statistics.median(gaps))
+
+    def next_run(self, now: float | None = None) -> float | None:
+        """Get when to download next, or None to poll every INTERVAL.
+
+        Fixed polling is used while still learning, and for a webcam that
+        refreshes at least every INTERVAL, since timing each refresh and
+        checking between them would only add requests and delay.
+        """
+
+        if self.period is None or self.period <= INTERVAL:
+            return None
+
+        now = time.time() if now is None else now
+        expected = self.refreshes[-1] + self.period
+
+        if self.streak >= FAST_STREAK:
+            # Check between refreshes in case the webcam refreshes faster.
+            self.streak = 0
+            self.probing = True
+            target = now + self.period / 2
+        elif expected + ADAPTIVE_MARGIN_SECONDS > now:
+            # Just after the next refresh.
+            target = expected + ADAPTIVE_MARGIN_SECONDS
+        else:
+            # The refresh is late, so check again soon.
+            target = now + ADAPTIVE_RETRY_SECONDS * 2**self.late_retries
+            self.late_retries = min(self.late_retries + 1, 8)
+
+        return min(
+            max(target, now + ADAPTIVE_MIN_INTERVAL),
+            now + ADAPTIVE_MAX_STALENESS_SECONDS,
+        )
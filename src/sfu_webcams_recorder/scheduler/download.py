@@ -0,0 +1,141 @@
+"""Steps shared by the download schedulers."""
+
+import time
+
+import requests
+
+from sfu_webcams_recorder.config.settings import INTERVAL
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.io.webcam import (
+    DroppedWebcamImageError,
+    DuplicateWebcamImageError,
+    InvalidWebcamImageError,
+    NearDuplicateWebcamImageError,
+    UnchangedWebcamImageError,
+    download_webcam_image,
+    validators,
+)
+from sfu_webcams_recorder.scheduler.adaptive import RefreshEstimator
+from sfu_webcams_recorder.scheduler.hosts import HostCircuitOpenError, host_gate
+from sfu_webcams_recorder.scheduler.journal import JobEvent, job_journal
+from sfu_webcams_recorder.ui.metrics import record_download
+from sfu_webcams_recorder.ui.state import DownloadState, program_state
+from sfu_webcams_recorder.ui.trace import tracer
+
+
+def download_once(
+    cam_id: WebcamID,
+    url: str,
+    interval: float = INTERVAL,
+    estimator: RefreshEstimator | None = None,
+) -> float:
+    """Download one image for a webcam and update its state.
+
+    If given, `estimator` learns whether the download found a new image.
+    Returns the time the download took.
+    """
+
+    start = time.time()
+    program_state.update_webcam(
+        cam_id,
+        download_state=DownloadState.DOWNLOADING,
+        download_start_time=start,
+        next_run_time=start + interval,
+    )
+
+    code = cam_id.name.lower()
+    changed = None
+    error = None
+    trace = tracer.begin(code)
+    gate = host_gate(url)
+
+    try:
+        download_webcam_image(code, url, gate.download())
+        changed = True
+        program_state.update_webcam(cam_id, error=None)
+    except (
+        requests.RequestException,
+        OSError,
+        DuplicateWebcamImageError,
+        NearDuplicateWebcamImageError,
+        UnchangedWebcamImageError,
+        InvalidWebcamImageError,
+        DroppedWebcamImageError,
+        HostCircuitOpenError,
+    ) as e:
+        if isinstance(e, (DuplicateWebcamImageError, UnchangedWebcamImageError)):
+            changed = False
+        elif isinstance(e, NearDuplicateWebcamImageError):
+            # The camera did refresh, even if the new image looks the same.
+            changed = True
+
+        # Only this webcam's downloader changes its counts.
+        state = program_state.webcam_state[cam_id]
+        if isinstance(e, DuplicateWebcamImageError):
+            program_state.update_webcam(
+                cam_id, exact_duplicates=state.exact_duplicates + 1
+            )
+        elif isinstance(e, NearDuplicateWebcamImageError):
+            program_state.update_webcam(
+                cam_id, near_duplicates=state.near_duplicates + 1
+            )
+        error = type(e).__name__
+
+        error_text = str(e) if str(e) != "None" else "(No Description)"
+        program_state.update_webcam(cam_id, error=f"{type(e).__name__}: {error_text}")
+    finally:
+        tracer.end(trace, error)
+        program_state.update_webcam(
+            cam_id, host_circuit=gate.state, host_retry_time=gate.retry_time
+        )
+
+    if estimator is not None and changed is not None:
+        cached = validators.get(code)
+        modified = cached.last_modified if changed and cached else None
+        estimator.observe(start, changed, modified)
+
+    elapsed = time.time() - start
+    changes = {"last_download_elapsed_time": elapsed, "download_start_time": None}
+    if estimator is not None:
+        changes["refresh_period"] = estimator.period
+    program_state.update_webcam(cam_id, **changes)
+    program_state.total_requests.add()
+    record_download(cam_id, elapsed, error)
+
+    return elapsed
+
+
+def queue_video(day: str, cam_id: WebcamID):
+    """Add a video job to the journal and the queue, and notify a worker."""
+    job_journal.record(JobEvent.QUEUED, day, cam_id)
+    program_state.put_video_job(day, cam_id)
+
+
+def next_run_after(
+    next_run: float, elapsed: float, interval: float = INTERVAL
+) -> float:
+    """Schedule the next download after one that took `elapsed` seconds."""
+    if elapsed > interval:
+        return time.time()
+    return next_run + interval
+
+
+def schedule_next_run(
+    cam_id: WebcamID,
+    next_run: float,
+    elapsed: float,
+    interval: float = INTERVAL,
+    estimator: RefreshEstimator | None = None,
+) -> float:
+    """Schedule a webcam's next download.
+
+    Uses the learned refresh time when `estimator` has one, and otherwise the
+    fixed interval.
+    """
+
+    adaptive = estimator.next_run() if estimator is not None else None
+    if adaptive is None:
+        return next_run_after(next_run, elapsed, interval)
+
+    program_state.update_webcam(cam_id, next_run_time=adaptive)
+    return adaptive
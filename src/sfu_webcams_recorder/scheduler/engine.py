@@ -0,0 +1,147 @@
+"""An asyncio download scheduler for many webcams on one event loop."""
+
+import asyncio
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sfu_webcams_recorder.config.settings import (
+    ADAPTIVE_POLLING,
+    DEBUG_VIDEO_CREATE,
+    DOWNLOAD_CONCURRENCY,
+    INTERVAL,
+    STAGGER_DOWNLOADS,
+)
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.scheduler.adaptive import RefreshEstimator
+from sfu_webcams_recorder.scheduler.download import (
+    download_once,
+    queue_video,
+    schedule_next_run,
+)
+from sfu_webcams_recorder.scheduler.hosts import stagger_offsets
+from sfu_webcams_recorder.ui.state import DownloadState, program_state
+from sfu_webcams_recorder.utils import day_folder_name
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadEngine:
+    """Schedule every webcam's downloads from a heap of next run times.
+
+    Blocking downloads run on a pool of `concurrency` threads, so at most that
+    many are in flight no matter how many webcams there are.
+    """
+
+    def __init__(
+        self,
+        cameras: dict[WebcamID, str],
+        interval: float = INTERVAL,
+        concurrency: int = DOWNLOAD_CONCURRENCY,
+    ):
+        self.cameras = cameras
+        self.interval = interval
+        self.concurrency = concurrency
+
+        now = time.time()
+        offsets = stagger_offsets(cameras, interval) if STAGGER_DOWNLOADS else {}
+        # Entries are (next run, order, webcam). The order breaks ties.
+        self.deadlines = [
+            (now + offsets.get(cam_id, 0), i, cam_id)
+            for i, cam_id in enumerate(cameras)
+        ]
+        heapq.heapify(self.deadlines)
+        self.current_days = {cam_id: day_folder_name() for cam_id in cameras}
+        self.debug_video_create_triggered = set()
+        self.estimators = {
+            cam_id: RefreshEstimator() if ADAPTIVE_POLLING else None
+            for cam_id in cameras
+        }
+
+    async def run(self):
+        """Run downloads forever."""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        wakeup = asyncio.Event()
+        tasks = set()
+
+        with ThreadPoolExecutor(self.concurrency) as executor:
+
+            async def download(next_run: float, order: int, cam_id: WebcamID):
+                try:
+                    try:
+                        elapsed = await loop.run_in_executor(
+                            executor,
+                            download_once,
+                            cam_id,
+                            self.cameras[cam_id],
+                            self.interval,
+                            self.estimators[cam_id],
+                        )
+                    finally:
+                        slots.release()
+
+                    self.detect_new_day(cam_id)
+
+                    next_run = schedule_next_run(
+                        cam_id,
+                        next_run,
+                        elapsed,
+                        self.interval,
+                        self.estimators[cam_id],
+                    )
+                except Exception as e:
+                    # Keep the webcam on the schedule, whatever went wrong.
+                    logger.exception("Download of %s failed: %s", cam_id, e)
+                    next_run = time.time() + self.interval
+
+                if time.time() < next_run:
+                    program_state.update_webcam(
+                        cam_id, download_state=DownloadState.SLEEPING
+                    )
+
+                heapq.heappush(self.deadlines, (next_run, order, cam_id))
+                wakeup.set()
+
+            while True:
+                if not self.deadlines:
+                    await wakeup.wait()
+                    wakeup.clear()
+                    continue
+
+                # Sleeping phase, until the earliest deadline or until a
+                # finished download schedules an earlier one.
+                delay = self.deadlines[0][0] - time.time()
+                if delay > 0:
+                    wakeup.clear()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), delay)
+                    except TimeoutError:
+                        pass
+                    continue
+
+                # Downloading phase.
+                await slots.acquire()
+                task = asyncio.create_task(download(*heapq.heappop(self.deadlines)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    def detect_new_day(self, cam_id: WebcamID):
+        """Queue a video for a webcam if its day has finished."""
+        current_day = self.current_days[cam_id]
+        updated_day = day_folder_name()
+
+        if updated_day != current_day or (
+            cam_id not in self.debug_video_create_triggered and DEBUG_VIDEO_CREATE
+        ):
+            queue_video(current_day, cam_id)
+
+            self.current_days[cam_id] = updated_day
+
+            self.debug_video_create_triggered.add(cam_id)
+
+
+def engine_loop(cameras: dict[WebcamID, str]):
+    """Run the asyncio download engine. Blocking."""
+    asyncio.run(DownloadEngine(cameras).run())
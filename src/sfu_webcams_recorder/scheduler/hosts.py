@@ -0,0 +1,202 @@
+"""Be gentle with webcam hosts: stagger, cap and circuit-break their downloads.
+
+Each host's webcams start their downloads spread evenly over `INTERVAL`, and at
+most `HOST_MAX_CONCURRENCY` downloads from a host run at once. After
+`CIRCUIT_FAILURE_THRESHOLD` failures in a row the host's circuit opens, and its
+downloads fail straight away for a jittered, exponentially growing backoff.
+Then the circuit is half open: one download tests the host, and the circuit
+closes if it works or opens again for longer if it doesn't.
+"""
+
+import logging
+import random
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlsplit
+
+import requests
+
+from sfu_webcams_recorder.config.settings import (
+    CIRCUIT_BACKOFF_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_MAX_BACKOFF_SECONDS,
+    HOST_MAX_CONCURRENCY,
+    INTERVAL,
+)
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.ui.state import CircuitState
+from sfu_webcams_recorder.ui.trace import span
+
+logger = logging.getLogger(__name__)
+
+
+class HostCircuitOpenError(Exception):
+    """Raised instead of downloading from a host whose circuit is open."""
+
+    def __init__(self, host: str, retry_time: float):
+        self.host = host
+        self.retry_time = retry_time
+
+        super().__init__(f"{host} is failing, download skipped")
+
+
+def is_host_failure(e: Exception) -> bool:
+    """Check whether a download error says the host itself is in trouble."""
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return (
+        isinstance(e, requests.HTTPError)
+        and e.response is not None
+        and e.response.status_code >= 500
+    )
+
+
+class HostGate:
+    """Limit and circuit-break the downloads from one host."""
+
+    def __init__(
+        self,
+        host: str,
+        max_concurrency: int | None = HOST_MAX_CONCURRENCY,
+        failure_threshold: int | None = CIRCUIT_FAILURE_THRESHOLD,
+    ):
+        self.host = host
+        self.slots = BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.failure_threshold = failure_threshold
+
+        self.state = CircuitState.CLOSED
+        # Failures in a row, and times the circuit opened in a row.
+        self.failures = 0
+        self.opens = 0
+        self.retry_time = 0.0
+        # Whether the download testing a half open circuit is running.
+        self.probing = False
+        self.lock = Lock()
+
+    def backoff(self) -> float:
+        """Get how long the circuit stays open this time."""
+        backoff = min(
+            CIRCUIT_MAX_BACKOFF_SECONDS, CIRCUIT_BACKOFF_SECONDS * 2 ** (self.opens - 1)
+        )
+        return backoff * random.uniform(0.5, 1)
+
+    def check(self) -> bool:
+        """Let a download through, or raise if the circuit is open.
+
+        Returns whether the download is the one testing a half open circuit.
+        """
+
+        with self.lock:
+            if self.state == CircuitState.CLOSED:
+                return False
+            if self.state == CircuitState.OPEN and time.time() >= self.retry_time:
+                self.state = CircuitState.HALF_OPEN
+            if self.state == CircuitState.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            raise HostCircuitOpenError(self.host, self.retry_time)
+
+    def end_probe(self):
+        """Let another download test the half open circuit."""
+        with self.lock:
+            self.probing = False
+
+    def record(self, ok: bool, probe: bool = False):
+        """Record how a download went."""
+
+        with self.lock:
+            if probe:
+                self.probing = False
+            if ok:
+                if self.state != CircuitState.CLOSED:
+                    logger.info("Host %s recovered, circuit closed", self.host)
+                self.state = CircuitState.CLOSED
+                self.failures = 0
+                self.opens = 0
+                return
+
+            self.failures += 1
+            if self.failure_threshold is None:
+                return
+            if self.state == CircuitState.CLOSED:
+                if self.failures < self.failure_threshold:
+                    return
+            elif not probe:
+                # Started before the circuit opened, so it says nothing new.
+                return
+
+            self.opens += 1
+            backoff = self.backoff()
+            self.state = CircuitState.OPEN
+            self.retry_time = time.time() + backoff
+            logger.warning(
+                "Host %s failed %d times in a row, circuit open for %.0fs",
+                self.host,
+                self.failures,
+                backoff,
+            )
+
+    @contextmanager
+    def download(self) -> Iterator[None]:
+        """Run a download from the host, within its limit and circuit."""
+
+        probe = self.check()
+        ok = None
+        try:
+            if self.slots is not None:
+                with span("wait"):
+                    self.slots.acquire()
+            try:
+                yield
+            finally:
+                if self.slots is not None:
+                    self.slots.release()
+            ok = True
+        except Exception as e:
+            ok = not is_host_failure(e)
+            raise
+        finally:
+            # An interrupted download, such as by Ctrl+C, says nothing about
+            # the host, but still ends its test of a half open circuit.
+            if ok is not None:
+                self.record(ok, probe)
+            elif probe:
+                self.end_probe()
+
+
+# The gate of each webcam host.
+gates: dict[str, HostGate] = {}
+gates_lock = Lock()
+
+
+def host_gate(url: str) -> HostGate:
+    """Get the gate for the host of a URL."""
+
+    host = urlsplit(url).netloc
+    with gates_lock:
+        gate = gates.get(host)
+        if gate is None:
+            gate = HostGate(host)
+            gates[host] = gate
+    return gate
+
+
+def stagger_offsets(
+    webcams: dict[WebcamID, str], interval: float = INTERVAL
+) -> dict[WebcamID, float]:
+    """Spread each host's webcams evenly over an interval.
+
+    Returns the seconds each webcam's first download waits.
+    """
+
+    by_host: dict[str, list[WebcamID]] = {}
+    for cam_id, url in webcams.items():
+        by_host.setdefault(urlsplit(url).netloc, []).append(cam_id)
+
+    return {
+        cam_id: interval * i / len(cam_ids)
+        for cam_ids in by_host.values()
+        for i, cam_id in enumerate(cam_ids)
+    }
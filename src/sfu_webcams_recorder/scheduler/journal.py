@@ -0,0 +1,167 @@
+"""A journal of video jobs that survives crashes, and finding unencoded days.
+
+Every video job is recorded in `JOB_JOURNAL_FILE` as JSON lines when it's
+queued, started, done or failed. At startup the picture folders say which days
+still need a video, and the journal says how many times each was tried.
+"""
+
+import json
+import logging
+import os
+import time
+from collections.abc import Collection
+from enum import StrEnum, auto
+from pathlib import Path
+from threading import Lock
+
+from sfu_webcams_recorder.config.settings import (
+    JOB_JOURNAL_FILE,
+    JOB_MAX_ATTEMPTS,
+    PICTURES_DIR,
+)
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.utils import parse_day_folder_name
+
+logger = logging.getLogger(__name__)
+
+
+class JobEvent(StrEnum):
+    """What happened to a video job."""
+
+    QUEUED = auto()
+    STARTED = auto()
+    DONE = auto()
+    FAILED = auto()
+
+
+class JobJournal:
+    """An append-only log of video job events."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = Lock()
+
+    def record(self, event: JobEvent, day: str, cam_id: WebcamID):
+        """Append an event, and make sure it's on disk before returning."""
+
+        line = json.dumps(
+            {"time": time.time(), "event": event, "day": day, "webcam": cam_id}
+        )
+        with self.lock:
+            try:
+                with self.path.open("a") as f:
+                    f.write(line + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logger.exception("Job journal write failed: %s", e)
+
+    def read(self) -> list[dict]:
+        """Read every event. A line torn by a crash is skipped."""
+
+        events = []
+        try:
+            lines = self.path.read_text().splitlines()
+        except FileNotFoundError:
+            return events
+
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("Skipping torn job journal line: %r", line)
+
+        return events
+
+    def attempts(self) -> dict[tuple[str, str], int]:
+        """Count the times each unfinished job was started."""
+
+        attempts = {}
+        for event in self.read():
+            job = (event["day"], event["webcam"])
+            if event["event"] == JobEvent.STARTED:
+                attempts[job] = attempts.get(job, 0) + 1
+            elif event["event"] == JobEvent.DONE:
+                attempts.pop(job, None)
+        return attempts
+
+    def compact(self):
+        """Rewrite the journal without the events of finished jobs."""
+
+        with self.lock:
+            events = self.read()
+            finished = {
+                (event["day"], event["webcam"])
+                for event in events
+                if event["event"] == JobEvent.DONE
+            }
+            tmp_path = self.path.with_suffix(".tmp")
+            with tmp_path.open("w") as f:
+                f.writelines(
+                    json.dumps(event) + "\n"
+                    for event in events
+                    if (event["day"], event["webcam"]) not in finished
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            tmp_path.replace(self.path)
+
+
+def find_backlog(
+    today: str, webcams: Collection[WebcamID] = WebcamID
+) -> list[tuple[str, WebcamID]]:
+    """Find the video jobs of `webcams` left undone before today, oldest first.
+
+    Only the day and webcam folders are listed, not the images in them. Jobs
+    started `JOB_MAX_ATTEMPTS` times without finishing are left out.
+    """
+
+    attempts = job_journal.attempts()
+    backlog = []
+
+    if not PICTURES_DIR.exists():
+        return backlog
+
+    days = []
+    for day_path in PICTURES_DIR.iterdir():
+        date = parse_day_folder_name(day_path.name)
+        if day_path.is_dir() and date is not None and day_path.name != today:
+            days.append((date, day_path))
+
+    for _, day_path in sorted(days):
+        for cam_path in sorted(day_path.iterdir()):
+            if not cam_path.is_dir():
+                continue
+
+            try:
+                cam_id = WebcamID(cam_path.name)
+            except ValueError:
+                logger.warning("Skipping unknown webcam folder %s", cam_path)
+                continue
+
+            # Other shards' webcams are theirs to encode.
+            if cam_id not in webcams:
+                continue
+
+            # An empty folder is left over from a finished or broken job.
+            if next(cam_path.iterdir(), None) is None:
+                cam_path.rmdir()
+                continue
+
+            tries = attempts.get((day_path.name, cam_id), 0)
+            if tries >= JOB_MAX_ATTEMPTS:
+                logger.warning(
+                    "Skipping %s %s after %d failed attempts",
+                    day_path.name,
+                    cam_id,
+                    tries,
+                )
+                continue
+
+            backlog.append((day_path.name, cam_id))
+
+    return backlog
+
+
+# Singleton instance of the job journal.
+job_journal = JobJournal(JOB_JOURNAL_FILE)
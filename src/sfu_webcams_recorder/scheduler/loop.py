@@ -1,70 +1,159 @@
 """The main program loops."""
 
 import logging
+import multiprocessing
+import os
+import signal
 import subprocess
 import time
+from collections.abc import Callable
 from datetime import datetime, timedelta
-from threading import Thread
-
-import requests
+from pathlib import Path
+from queue import SimpleQueue
+from threading import Event, Thread
 
 from sfu_webcams_recorder.config.settings import (
+    ADAPTIVE_POLLING,
+    BACKLOG_NICE,
+    BACKLOG_WORKERS,
     DEBUG_SNAPSHOT_LOG,
     DEBUG_SNAPSHOT_LOG_SECONDS,
     DEBUG_VIDEO_CREATE,
-    INTERVAL,
+    DEFERRED_TRANSCODE,
+    DOWNLOAD_ENGINE,
+    ENCODE_DEADLINE,
+    FFMPEG_THREADS_PER_JOB,
     LOG_DIR,
+    METRICS_PORT,
     PICTURES_DIR,
+    SEGMENT_DELAY_SECONDS,
+    SEGMENT_ENCODING,
+    SEGMENT_NICE,
+    SHARD_RESTART_SECONDS,
     SNAPSHOT_DIR,
+    STAGGER_DOWNLOADS,
+    STATUS_SOCKET,
+    TRACE_DOWNLOADS,
+    VIDEO_FORMAT,
+    VIDEO_WORKERS,
     VIDEOS_DIR,
+    WRITE_BEHIND,
 )
 from sfu_webcams_recorder.config.webcams import WEBCAM_URLS, WebcamID
-from sfu_webcams_recorder.io.video import VideoCreationError, create_daily_video
-from sfu_webcams_recorder.io.webcam import (
-    DuplicateWebcamImageError,
-    download_webcam_image,
+from sfu_webcams_recorder.io.video import (
+    VideoCreationError,
+    VideoFormat,
+    create_daily_video,
+    encode_lock,
+    encode_segments,
+)
+from sfu_webcams_recorder.io.writer import disk_writer
+from sfu_webcams_recorder.scheduler.adaptive import RefreshEstimator
+from sfu_webcams_recorder.scheduler.download import (
+    download_once,
+    queue_video,
+    schedule_next_run,
+)
+from sfu_webcams_recorder.scheduler.engine import engine_loop
+from sfu_webcams_recorder.scheduler.hosts import stagger_offsets
+from sfu_webcams_recorder.scheduler.journal import JobEvent, find_backlog, job_journal
+from sfu_webcams_recorder.scheduler.planner import EncodePlanner
+from sfu_webcams_recorder.scheduler.shards import (
+    Shard,
+    merged_status,
+    shard_webcams,
+    status_loop,
 )
+from sfu_webcams_recorder.scheduler.transcode import start_transcoder, transcode_queue
 from sfu_webcams_recorder.ui.dashboard import save_dashboard_snapshot, ui_loop
+from sfu_webcams_recorder.ui.metrics import record_encode, start_metrics_server
 from sfu_webcams_recorder.ui.state import (
     DownloadState,
+    ProgramSnapshot,
     VideoState,
     WebcamState,
     program_state,
 )
-from sfu_webcams_recorder.utils import day_folder_name
+from sfu_webcams_recorder.ui.status_server import (
+    StatusServer,
+    start_status_server,
+    stop_status_server,
+)
+from sfu_webcams_recorder.ui.trace import tracer
+from sfu_webcams_recorder.utils import day_folder_name, now
 
 logger = logging.getLogger(__name__)
 
 
-def combine_day(day: str, cam_id: WebcamID):
-    """Create daily videos and update UI state."""
+def video_worker_count() -> int:
+    """Get the number of video workers to run."""
+    if VIDEO_WORKERS:
+        return VIDEO_WORKERS
+    return max(1, (os.process_cpu_count() or 1) // 2)
+
+
+def ffmpeg_threads_per_job(workers: int) -> int | None:
+    """Get the ffmpeg thread limit for each encode."""
+    if FFMPEG_THREADS_PER_JOB is None:
+        return None
+    if FFMPEG_THREADS_PER_JOB:
+        return FFMPEG_THREADS_PER_JOB
+    return max(1, (os.process_cpu_count() or 1) // workers)
+
+
+def combine_day(
+    day: str,
+    cam_id: WebcamID,
+    threads: int | None = None,
+    nice: int = 0,
+    planner: EncodePlanner | None = None,
+):
+    """Create daily videos and update UI state and the job journal.
+
+    With a planner, the encoder preset is picked to meet `ENCODE_DEADLINE`.
+    """
+
+    program_state.update_webcam(
+        cam_id, video_create_start_time=time.time(), video_state=VideoState.ENCODING
+    )
+    job_journal.record(JobEvent.STARTED, day, cam_id)
 
-    with program_state.lock:
-        program_state.webcam_state[cam_id].video_create_start_time = time.time()
-        program_state.webcam_state[cam_id].video_state = VideoState.ENCODING
+    # Images still waiting to be written belong in the video.
+    disk_writer.flush(PICTURES_DIR / day / cam_id.name.lower())
 
+    start = time.time()
     try:
-        create_daily_video(cam_id.name.lower(), day)
+        preset = planner.choose_preset(day, cam_id) if planner else None
+        frames = create_daily_video(
+            cam_id.name.lower(), day, threads=threads, nice=nice, preset=preset
+        )
+        record_encode(cam_id, time.time() - start, frames)
+        job_journal.record(JobEvent.DONE, day, cam_id)
+        if VIDEO_FORMAT == VideoFormat.MJPEG and DEFERRED_TRANSCODE:
+            transcode_queue.put((day, cam_id.name.lower()))
     except (VideoCreationError, subprocess.CalledProcessError, OSError) as e:
         logger.exception("Video creation failed: %s", e)
+        job_journal.record(JobEvent.FAILED, day, cam_id)
     finally:
-        with program_state.lock:
-            program_state.webcam_state[cam_id].video_create_start_time = None
-            program_state.webcam_state[cam_id].video_state = VideoState.IDLE
+        program_state.end_video_state(
+            cam_id, VideoState.ENCODING, video_create_start_time=None
+        )
 
     # Cleanup empty day folder.
     day_path = PICTURES_DIR / day
     try:
         if day_path.exists() and not any(day_path.iterdir()):
             day_path.rmdir()
-    except FileNotFoundError:
+    except OSError:
+        # Another shard removed the folder, or just added a webcam to it.
         pass
 
 
-def webcam_loop(cam_id: WebcamID, url: str):
-    """The main loop for each webcam."""
-    next_run = time.time()
+def webcam_loop(cam_id: WebcamID, url: str, offset: float = 0):
+    """The main loop for each webcam, starting `offset` seconds from now."""
+    next_run = time.time() + offset
     current_day = day_folder_name()
+    estimator = RefreshEstimator() if ADAPTIVE_POLLING else None
 
     debug_video_create_triggered = False
 
@@ -73,74 +162,103 @@ def webcam_loop(cam_id: WebcamID, url: str):
 
         # Sleeping phase.
         if now < next_run:
-            with program_state.lock:
-                program_state.webcam_state[
-                    cam_id
-                ].download_state = DownloadState.SLEEPING
+            program_state.update_webcam(cam_id, download_state=DownloadState.SLEEPING)
             time.sleep(next_run - now)
 
         # Downloading phase.
-        start = time.time()
-        with program_state.lock:
-            program_state.webcam_state[
-                cam_id
-            ].download_state = DownloadState.DOWNLOADING
-            program_state.webcam_state[cam_id].download_start_time = start
-            program_state.webcam_state[cam_id].next_run_time = start + INTERVAL
-
-        try:
-            download_webcam_image(cam_id.name.lower(), url)
-            with program_state.lock:
-                program_state.webcam_state[cam_id].error = None
-        except (requests.RequestException, OSError, DuplicateWebcamImageError) as e:
-            with program_state.lock:
-                error_text = str(e) if str(e) != "None" else "(No Description)"
-                program_state.webcam_state[
-                    cam_id
-                ].error = f"{type(e).__name__}: {error_text}"
-
-        elapsed = time.time() - start
-        with program_state.lock:
-            program_state.webcam_state[cam_id].last_download_elapsed_time = elapsed
-            program_state.webcam_state[cam_id].download_start_time = None
+        elapsed = download_once(cam_id, url, estimator=estimator)
 
         # Detect new day.
         updated_day = day_folder_name()
         if updated_day != current_day or (
             not debug_video_create_triggered and DEBUG_VIDEO_CREATE
         ):
-            # Add job to queue and notify worker
-            with program_state.video_condition:
-                program_state.video_queue.put((current_day, cam_id))
-                program_state.video_condition.notify()
+            queue_video(current_day, cam_id)
 
             current_day = updated_day
 
             debug_video_create_triggered = True
 
         # Schedule next run.
-        now = time.time()
-        if elapsed > INTERVAL:
-            next_run = now
-        else:
-            next_run += INTERVAL
+        next_run = schedule_next_run(cam_id, next_run, elapsed, estimator=estimator)
 
 
-def video_worker_loop():
-    """Worker that processes video creation jobs one at a time."""
-    while True:
-        with program_state.video_condition:
-            while program_state.video_queue.empty():
-                # Wait until a job is added.
-                program_state.video_condition.wait()
+def video_worker_loop(threads: int | None = None, planner: EncodePlanner | None = None):
+    """Worker that processes video creation jobs one at a time.
 
-            day, cam_id = program_state.video_queue.get()
+    Several workers can run at once, each taking the next job from the queue.
+    """
+    while True:
+        day, cam_id = program_state.take_video_job()
 
         # Update UI and run encode.
-        combine_day(day, cam_id)
+        combine_day(day, cam_id, threads, planner=planner)
         program_state.video_queue.task_done()
 
 
+def segment_day(day: str, cam_id: WebcamID, before_hour: int, threads: int | None):
+    """Encode a webcam's finished hours into segments and update UI state."""
+
+    code = cam_id.name.lower()
+    lock = encode_lock(code)
+
+    # Images still waiting to be written belong in the segments. Flushed
+    # before taking the lock, so a daily video isn't kept waiting on the disk.
+    disk_writer.flush(PICTURES_DIR / day / code)
+
+    # A daily video being created for the webcam takes priority.
+    if not lock.acquire(blocking=False):
+        return
+
+    program_state.update_webcam(cam_id, video_state=VideoState.SEGMENTING)
+    try:
+        encode_segments(code, day, before_hour, threads=threads, nice=SEGMENT_NICE)
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.exception("Segment encoding failed: %s", e)
+    finally:
+        lock.release()
+        program_state.end_video_state(cam_id, VideoState.SEGMENTING)
+
+
+def segment_loop(webcams: dict[WebcamID, str], threads: int | None = None):
+    """Encode the previous hour of images into segments, shortly after each hour."""
+    while True:
+        current = now()
+        next_hour = (current + timedelta(hours=1)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        time.sleep((next_hour - current).total_seconds() + SEGMENT_DELAY_SECONDS)
+
+        current = now()
+        day = day_folder_name(current)
+        for cam_id in webcams:
+            segment_day(day, cam_id, current.hour, threads)
+
+
+def backlog_worker_loop(backlog: SimpleQueue, threads: int | None = None):
+    """Worker that creates the videos of days left unencoded, at low priority."""
+    while True:
+        day, cam_id = backlog.get()
+        logger.info("Encoding backlog video %s %s", day, cam_id)
+        combine_day(day, cam_id, threads, BACKLOG_NICE)
+
+
+def start_backlog(webcams: dict[WebcamID, str], threads: int | None = None):
+    """Find days left unencoded by a crash or restart and start encoding them."""
+
+    backlog = find_backlog(day_folder_name(), webcams)
+    job_journal.compact()
+    if not backlog:
+        return
+
+    logger.info("Found %d backlog videos", len(backlog))
+    queue = SimpleQueue()
+    for job in backlog:
+        queue.put(job)
+    for _ in range(BACKLOG_WORKERS):
+        Thread(target=backlog_worker_loop, args=(queue, threads), daemon=True).start()
+
+
 def seconds_until_midnight():
     """Get the number of seconds until midnight."""
     now = datetime.now()
@@ -150,7 +268,7 @@ def seconds_until_midnight():
     return (next_midnight - now).total_seconds()
 
 
-def snapshot_loop():
+def snapshot_loop(read_snapshot: Callable[[], ProgramSnapshot] | None = None):
     """Save dashboard snapshot every hour on the hour."""
     while True:
         sleep_time = (
@@ -162,12 +280,12 @@ def snapshot_loop():
         time.sleep(sleep_time)
 
         try:
-            save_dashboard_snapshot()
+            save_dashboard_snapshot(read_snapshot() if read_snapshot else None)
         except OSError as e:
             logger.exception("Snapshot failed: %s", e)
 
 
-def init_loop():
+def init_loop(log_file: Path = LOG_DIR / "log.log"):
     """Set up logging and needed directories."""
     # For media.
     PICTURES_DIR.mkdir(parents=True, exist_ok=True)
@@ -179,35 +297,209 @@ def init_loop():
 
     # Set up logging.
     logging.basicConfig(
-        filename=LOG_DIR / "log.log",
+        filename=log_file,
         level=logging.INFO,
         format="%(asctime)s [%(levelname)s] %(message)s",
     )
 
 
-def run_loop():
-    """Start webcam threads and run UI loop. The UI loop is blocking."""
+def wait_until_stopped():
+    """Block without a UI until Ctrl+C or a stop from systemd (SIGTERM)."""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    Event().wait()
 
-    init_loop()
 
-    logger.info("Program starting")
+def run_loop(
+    shard: Shard | None = None, headless: bool = False, status_socket: bool = True
+):
+    """Start webcam threads and run UI loop. The UI loop is blocking.
+
+    With a shard, only its webcams are recorded, with its own job journal, log
+    and metrics port, and its status is written for the merged dashboard.
+    Headless, the program runs without a UI until it's stopped. Either way the
+    status is served on a Unix socket, unless `status_socket` is off.
+    """
 
-    # Start video worker.
-    Thread(target=video_worker_loop, daemon=True).start()
+    webcams = WEBCAM_URLS
+    if shard is None:
+        init_loop()
+    else:
+        webcams = shard_webcams(shard)
+        job_journal.path = shard.journal_file
+        tracer.path = shard.trace_file
+        init_loop(shard.log_file)
+
+    logger.info("Program starting")
+    if shard is not None:
+        logger.info("Shard %s has %d webcams", shard.name, len(webcams))
+
+    # Initialize state.
+    for cam_id in webcams:
+        program_state.webcam_state[cam_id] = WebcamState()
+
+    # Start writing images in the background.
+    if WRITE_BEHIND:
+        disk_writer.start()
+    # Start writing download traces.
+    if TRACE_DOWNLOADS:
+        tracer.start()
+    # Start video workers.
+    workers = video_worker_count()
+    threads = ffmpeg_threads_per_job(workers)
+    logger.info("Starting %d video workers with %s ffmpeg threads", workers, threads)
+    planner = None
+    if ENCODE_DEADLINE and VIDEO_FORMAT == VideoFormat.H264:
+        try:
+            planner = EncodePlanner(workers, threads)
+        except ValueError:
+            logger.error(
+                "ENCODE_DEADLINE %r isn't a time like 06:00, ignoring it",
+                ENCODE_DEADLINE,
+            )
+    for _ in range(workers):
+        Thread(target=video_worker_loop, args=(threads, planner), daemon=True).start()
+    # Start encoding days left unencoded.
+    try:
+        start_backlog(webcams, threads)
+    except OSError as e:
+        logger.exception("Backlog recovery failed: %s", e)
+    # Start transcoding "mjpeg" videos while idle.
+    if DEFERRED_TRANSCODE:
+        try:
+            start_transcoder(webcams, threads)
+        except OSError as e:
+            logger.exception("Transcoder startup failed: %s", e)
+    # Start encoding segments.
+    if SEGMENT_ENCODING:
+        Thread(target=segment_loop, args=(webcams, threads), daemon=True).start()
     # Start logging snapshots.
     Thread(target=snapshot_loop, daemon=True).start()
+    # Start serving metrics, on a port per shard.
+    if METRICS_PORT is not None:
+        try:
+            start_metrics_server(port=METRICS_PORT + (shard.index if shard else 0))
+        except OSError as e:
+            logger.exception("Metrics server failed: %s", e)
+    # Start sharing status with the merged dashboard.
+    if shard is not None:
+        Thread(target=status_loop, args=(shard,), daemon=True).start()
+    # Start serving status to the `status` and `top` commands.
+    status_server = None
+    if status_socket:
+        status_server = serve_status(shard_socket(shard))
+
+    # Start downloading.
+    if DOWNLOAD_ENGINE == "asyncio":
+        Thread(target=engine_loop, args=(webcams,), daemon=True).start()
+    else:
+        offsets = stagger_offsets(webcams) if STAGGER_DOWNLOADS else {}
+        for cam_id, url in webcams.items():
+            Thread(
+                target=webcam_loop,
+                args=(cam_id, url, offsets.get(cam_id, 0)),
+                daemon=True,
+            ).start()
+
+    # UI loop (blocking).
+    try:
+        if headless:
+            wait_until_stopped()
+        else:
+            ui_loop()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Program shutting down")
+        stop_status_server(status_server)
+        if TRACE_DOWNLOADS:
+            try:
+                tracer.write()
+            except OSError as e:
+                logger.exception("Trace write failed: %s", e)
 
-    # Initialize state and start threads.
-    for cam_id, url in WEBCAM_URLS.items():
-        with program_state.lock:
-            program_state.webcam_state[cam_id] = WebcamState()
 
-        Thread(target=webcam_loop, args=(cam_id, url), daemon=True).start()
+def run_shard(shard: Shard):
+    """Record one shard without a UI, in a process of its own.
+
+    Its status is served merged with the other shards' by the parent process.
+    """
+    run_loop(shard, headless=True, status_socket=False)
+
+
+def shard_socket(shard: Shard | None) -> Path:
+    """Get the path of the status socket, one per shard run on its own."""
+    if shard is None:
+        return STATUS_SOCKET
+    return STATUS_SOCKET.with_name(f"status-{shard.name}.sock")
+
+
+def serve_status(
+    path: Path, read_snapshot: Callable[[], ProgramSnapshot] = program_state.snapshot
+) -> StatusServer | None:
+    """Start the status server, logging instead of stopping if it fails."""
+    try:
+        return start_status_server(path, read_snapshot)
+    except OSError as e:
+        logger.exception("Status server failed: %s", e)
+        return None
+
+
+def start_shard(shard: Shard) -> multiprocessing.Process:
+    """Start a process recording a shard.
+
+    The process is spawned rather than forked, so no threads or held locks are
+    carried over into it.
+    """
+
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_shard, args=(shard,), name=f"shard-{shard.name}", daemon=True
+    )
+    process.start()
+    return process
+
+
+def shard_monitor_loop(processes: dict[Shard, multiprocessing.Process]):
+    """Restart shard processes that stop."""
+    while True:
+        time.sleep(SHARD_RESTART_SECONDS)
+        for shard, process in processes.items():
+            if process.is_alive():
+                continue
+            logger.warning(
+                "Shard %s stopped with code %s, restarting",
+                shard.name,
+                process.exitcode,
+            )
+            processes[shard] = start_shard(shard)
+
+
+def run_shards(shards: list[Shard], headless: bool = False):
+    """Record several shards, each in its own process, and show them merged.
+
+    Each process downloads and encodes its own webcams, so shards don't share a
+    GIL or a video queue. Processes that stop are restarted. The merged status
+    is served on the status socket.
+    """
+
+    init_loop()
+    logger.info("Starting shards %s", ", ".join(shard.name for shard in shards))
+
+    processes = {shard: start_shard(shard) for shard in shards}
+
+    Thread(target=shard_monitor_loop, args=(processes,), daemon=True).start()
+    Thread(target=snapshot_loop, args=(merged_status,), daemon=True).start()
+    status_server = serve_status(STATUS_SOCKET, merged_status)
 
     # UI loop (blocking).
     try:
-        ui_loop()
+        if headless:
+            wait_until_stopped()
+        else:
+            ui_loop(merged_status)
     except KeyboardInterrupt:
         pass
     finally:
         logger.info("Program shutting down")
+        stop_status_server(status_server)
+        for process in processes.values():
+            process.terminate()
@@ -0,0 +1,259 @@
+"""Pick the encoder preset that finishes the night's videos by a deadline.
+
+Each preset's speed is measured on this machine by encoding a few real images,
+and saved in `CALIBRATION_FILE`. Before each video, the planner counts the
+images waiting to be encoded and picks the slowest preset, which gives the
+smallest files, that still finishes them by `ENCODE_DEADLINE`.
+"""
+
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock
+
+from sfu_webcams_recorder.config.settings import (
+    CALIBRATION_FILE,
+    CALIBRATION_FRAMES,
+    CALIBRATION_MAX_AGE_DAYS,
+    ENCODE_DEADLINE,
+    ENCODE_PRESETS,
+    ENCODE_SAFETY_FACTOR,
+    FFMPEG_CODEC_ARGS,
+    FPS,
+    PICTURES_DIR,
+)
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.io.framepack import PackedFrame
+from sfu_webcams_recorder.io.video import (
+    codec_args,
+    day_images,
+    ffmpeg_base_cmd,
+    image_contents,
+    pipe_frames,
+)
+from sfu_webcams_recorder.ui.state import program_state
+from sfu_webcams_recorder.utils import now
+
+logger = logging.getLogger(__name__)
+
+# Fewer images than this make for a meaningless measurement.
+MIN_CALIBRATION_FRAMES = 10
+
+
+@dataclass(slots=True)
+class Calibration:
+    """How fast each preset encodes on this machine."""
+
+    key: str
+    measured_at: float
+    fps: dict[str, float]
+
+
+def calibration_key(threads: int | None) -> str:
+    """Describe what a calibration depends on, so a change measures again."""
+    return json.dumps(
+        [platform.node(), os.process_cpu_count(), threads, FFMPEG_CODEC_ARGS]
+    )
+
+
+def load_calibration(path: Path, key: str) -> Calibration | None:
+    """Load a saved calibration, if it's for the same setup and recent."""
+
+    try:
+        calibration = Calibration(**json.loads(path.read_text()))
+    except (OSError, ValueError, TypeError):
+        return None
+
+    age_days = (time.time() - calibration.measured_at) / 86400
+    if calibration.key != key or age_days > CALIBRATION_MAX_AGE_DAYS:
+        return None
+    if any(preset not in calibration.fps for preset in ENCODE_PRESETS):
+        return None
+    return calibration
+
+
+def measure_fps(
+    imgs: list[Path | PackedFrame], preset: str, threads: int | None
+) -> float:
+    """Encode images with a preset, discarding the video, and get the speed."""
+
+    thread_args = ["-threads", str(threads)] if threads else []
+    cmd = [
+        *ffmpeg_base_cmd(),
+        "-framerate",
+        str(FPS),
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "mjpeg",
+        "-i",
+        "-",
+        *codec_args(preset),
+        *thread_args,
+        "-f",
+        "null",
+        "-",
+    ]
+
+    start = time.perf_counter()
+    pipe_frames(cmd, image_contents(imgs))
+    return len(imgs) / (time.perf_counter() - start)
+
+
+def calibrate(
+    imgs: list[Path | PackedFrame], threads: int | None, key: str
+) -> Calibration:
+    """Measure every preset's speed on some images."""
+
+    fps = {}
+    for preset in ENCODE_PRESETS:
+        fps[preset] = measure_fps(imgs, preset, threads)
+        logger.info("Calibrated preset %s at %.1f fps", preset, fps[preset])
+    return Calibration(key, time.time(), fps)
+
+
+def parse_deadline(deadline: str) -> tuple[int, int]:
+    """Get the hour and minute of a time of day such as "06:00".
+
+    Raises ValueError if it isn't one.
+    """
+
+    parsed = datetime.strptime(deadline, "%H:%M")
+    return parsed.hour, parsed.minute
+
+
+def seconds_until_deadline(hour: int, minute: int) -> float:
+    """Get the seconds until the next time a time of day comes around."""
+
+    current = now()
+    target = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= current:
+        target += timedelta(days=1)
+    return (target - current).total_seconds()
+
+
+def pick_preset(
+    calibration: Calibration, needed_fps: float, parallel: int = 1
+) -> tuple[str, float]:
+    """Pick the slowest preset whose planned speed reaches `needed_fps`.
+
+    The planned speed is the measured speed times the encodes running at once,
+    scaled by `ENCODE_SAFETY_FACTOR`. If no preset is fast enough, the fastest
+    is picked. Returns the preset and its planned speed.
+    """
+
+    for preset in ENCODE_PRESETS:
+        planned_fps = calibration.fps[preset] * parallel * ENCODE_SAFETY_FACTOR
+        if planned_fps >= needed_fps:
+            return preset, planned_fps
+    return preset, planned_fps
+
+
+class EncodePlanner:
+    """Picks a preset for each video, shared by the video workers.
+
+    Raises ValueError if `deadline` isn't a time of day.
+    """
+
+    def __init__(
+        self, workers: int, threads: int | None, deadline: str = ENCODE_DEADLINE
+    ):
+        self.workers = workers
+        self.threads = threads
+        self.deadline = parse_deadline(deadline)
+        self.calibration: Calibration | None = None
+        # Whether a worker is measuring the calibration.
+        self.calibrating = False
+        self.lock = Lock()
+
+    def get_calibration(self, imgs: list[Path | PackedFrame]) -> Calibration | None:
+        """Get the calibration, measuring it on `imgs` if none is saved.
+
+        While another worker measures it, there is none.
+        """
+
+        with self.lock:
+            key = calibration_key(self.threads)
+            if self.calibration is None or self.calibration.key != key:
+                self.calibration = load_calibration(CALIBRATION_FILE, key)
+            if self.calibration is not None or self.calibrating:
+                return self.calibration
+
+            sample = imgs[:CALIBRATION_FRAMES]
+            if len(sample) < MIN_CALIBRATION_FRAMES:
+                return None
+            self.calibrating = True
+
+        # Measured without the lock, so the other workers encode with the
+        # configured preset meanwhile instead of waiting.
+        calibration = None
+        try:
+            calibration = calibrate(sample, self.threads, key)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.exception("Calibration failed: %s", e)
+        finally:
+            with self.lock:
+                self.calibrating = False
+                if calibration is not None:
+                    self.calibration = calibration
+
+        if calibration is not None:
+            try:
+                CALIBRATION_FILE.write_text(json.dumps(asdict(calibration)))
+            except OSError as e:
+                logger.exception("Saving calibration failed: %s", e)
+        return calibration
+
+    def choose_preset(self, day: str, cam_id: WebcamID) -> str | None:
+        """Pick the preset for a video, or None for the configured one."""
+
+        imgs = day_images(PICTURES_DIR / day / cam_id.name.lower())
+        calibration = self.get_calibration(imgs)
+        if calibration is None:
+            logger.info("No calibration, using the configured preset")
+            return None
+
+        # This video and every one waiting behind it.
+        jobs = program_state.queued_video_jobs()
+        frames = len(imgs) + sum(
+            len(day_images(PICTURES_DIR / job_day / job_cam.name.lower()))
+            for job_day, job_cam in jobs
+        )
+        seconds = seconds_until_deadline(*self.deadline)
+        needed_fps = frames / seconds
+        parallel = min(self.workers, len(jobs) + 1)
+
+        preset, planned_fps = pick_preset(calibration, needed_fps, parallel)
+        if planned_fps < needed_fps:
+            logger.warning(
+                "Encoding %s %s with preset %s, but %d images in %.0fs needs "
+                "%.1f fps and it plans for %.1f fps: the deadline will be missed",
+                day,
+                cam_id,
+                preset,
+                frames,
+                seconds,
+                needed_fps,
+                planned_fps,
+            )
+        else:
+            logger.info(
+                "Encoding %s %s with preset %s: %d images for %d videos in %.0fs "
+                "needs %.1f fps, and it plans for %.1f fps on %d workers",
+                day,
+                cam_id,
+                preset,
+                frames,
+                len(jobs) + 1,
+                seconds,
+                needed_fps,
+                planned_fps,
+                parallel,
+            )
+        return preset
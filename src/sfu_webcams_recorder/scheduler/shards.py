@@ -0,0 +1,156 @@
+"""Split the webcams between shards, and share each shard's status.
+
+Each webcam belongs to one of N shards, picked by rendezvous hashing: every
+shard scores the webcam and the highest score wins. Going from N to N + 1
+shards only moves the webcams the new shard wins, about 1 in N + 1. A shard is
+a process with its own downloads, video workers, job journal and log, so
+shards can run on several cores of one machine or on several machines.
+
+Each shard writes its status to `STATUS_DIR`, and the dashboard of a sharded
+run merges the status files it finds there.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from sfu_webcams_recorder.config.settings import (
+    LOG_DIR,
+    STATUS_DIR,
+    STATUS_STALE_SECONDS,
+    STATUS_WRITE_SECONDS,
+)
+from sfu_webcams_recorder.config.webcams import WEBCAM_URLS, WebcamID
+from sfu_webcams_recorder.ui.state import (
+    ProgramSnapshot,
+    merge_snapshots,
+    program_state,
+)
+
+logger = logging.getLogger(__name__)
+
+# Shards like "2/8", "0-3/8" or "0,4,5/8".
+SHARD_SPEC = re.compile(r"^(\d+(?:-\d+)?(?:,\d+(?:-\d+)?)*)/(\d+)$")
+
+
+class ShardSpecError(Exception):
+    """Raised when a shard spec can't be parsed."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+@dataclass(slots=True, frozen=True)
+class Shard:
+    """One of `count` shards."""
+
+    index: int
+    count: int
+
+    @property
+    def name(self) -> str:
+        """Get a name for the shard's files, like "2-of-8"."""
+        return f"{self.index}-of-{self.count}"
+
+    @property
+    def journal_file(self) -> Path:
+        """Get the path of the shard's job journal."""
+        return LOG_DIR / f"jobs-{self.name}.jsonl"
+
+    @property
+    def log_file(self) -> Path:
+        """Get the path of the shard's log."""
+        return LOG_DIR / f"log-{self.name}.log"
+
+    @property
+    def trace_file(self) -> Path:
+        """Get the path of the shard's download traces."""
+        return LOG_DIR / f"trace-{self.name}.jsonl"
+
+    @property
+    def status_file(self) -> Path:
+        """Get the path of the shard's status file."""
+        return STATUS_DIR / f"shard-{self.name}.json"
+
+
+def parse_shards(spec: str) -> list[Shard]:
+    """Parse shards like "2/8", "0-3/8" or "0,4,5/8"."""
+
+    match = SHARD_SPEC.match(spec)
+    if match is None:
+        raise ShardSpecError(f"Invalid shards {spec!r}, expected like 0-3/8")
+
+    count = int(match[2])
+    if not count:
+        raise ShardSpecError(f"Shard count in {spec!r} must be at least 1")
+    indexes = set()
+    for part in match[1].split(","):
+        first, _, last = part.partition("-")
+        indexes.update(range(int(first), int(last or first) + 1))
+
+    if max(indexes) >= count:
+        raise ShardSpecError(f"Shards in {spec!r} must be below {count}")
+    return [Shard(index, count) for index in sorted(indexes)]
+
+
+def shard_score(code: str, index: int) -> bytes:
+    """Score how strongly a shard claims a webcam."""
+    return hashlib.blake2b(f"{index}:{code}".encode(), digest_size=8).digest()
+
+
+def shard_of(code: str, count: int) -> int:
+    """Get the shard of `count` that a webcam belongs to."""
+    return max(range(count), key=lambda index: shard_score(code, index))
+
+
+def shard_webcams(shard: Shard) -> dict[WebcamID, str]:
+    """Get the webcams and URLs that belong to a shard."""
+    return {
+        cam_id: url
+        for cam_id, url in WEBCAM_URLS.items()
+        if shard_of(cam_id.value, shard.count) == shard.index
+    }
+
+
+def write_status(path: Path):
+    """Write this program's state to a status file, replacing it whole."""
+
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(program_state.snapshot().to_dict()))
+    tmp_path.replace(path)
+
+
+def status_loop(shard: Shard):
+    """Keep a shard's status file up to date."""
+
+    STATUS_DIR.mkdir(parents=True, exist_ok=True)
+    while True:
+        try:
+            write_status(shard.status_file)
+        except OSError as e:
+            logger.exception("Status write failed: %s", e)
+        time.sleep(STATUS_WRITE_SECONDS)
+
+
+def read_statuses(directory: Path = STATUS_DIR) -> list[ProgramSnapshot]:
+    """Read the status files of the shards that are still running."""
+
+    snapshots = []
+    now = time.time()
+    for path in sorted(directory.glob("shard-*.json")):
+        try:
+            if now - path.stat().st_mtime > STATUS_STALE_SECONDS:
+                continue
+            snapshots.append(ProgramSnapshot.from_dict(json.loads(path.read_text())))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Skipping status file %s: %s", path, e)
+    return snapshots
+
+
+def merged_status() -> ProgramSnapshot:
+    """Get the merged state of every running shard."""
+    return merge_snapshots(read_statuses())
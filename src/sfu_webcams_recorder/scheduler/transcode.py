@@ -0,0 +1,113 @@
+"""Transcode "mjpeg" daily videos to `FFMPEG_CODEC_ARGS` while the machine is idle.
+
+With `VIDEO_FORMAT = "mjpeg"` and `DEFERRED_TRANSCODE`, each new daily video is
+queued here, as are the "mjpeg" videos found at startup. One video is
+transcoded at a time, at `TRANSCODE_NICE`, once nothing else is being encoded
+and the load is low.
+"""
+
+import logging
+import os
+import subprocess
+import time
+from collections.abc import Collection
+from queue import SimpleQueue
+from threading import Thread
+
+from sfu_webcams_recorder.config.settings import (
+    TRANSCODE_IDLE_CHECK_SECONDS,
+    TRANSCODE_IDLE_LOAD,
+    TRANSCODE_NICE,
+    VIDEOS_DIR,
+)
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.io.timeindex import TimeIndexError
+from sfu_webcams_recorder.io.video import is_mjpeg_video, transcode_video
+from sfu_webcams_recorder.ui.state import VideoState, program_state
+from sfu_webcams_recorder.utils import parse_day_folder_name
+
+logger = logging.getLogger(__name__)
+
+# Daily videos waiting to be transcoded, as (day, webcam code).
+transcode_queue: SimpleQueue[tuple[str, str]] = SimpleQueue()
+
+
+def find_mjpeg_videos() -> list[tuple[str, str]]:
+    """Find the daily videos still in the "mjpeg" format, oldest first."""
+
+    if not VIDEOS_DIR.exists():
+        return []
+
+    days = []
+    for day_path in VIDEOS_DIR.iterdir():
+        date = parse_day_folder_name(day_path.name)
+        if day_path.is_dir() and date is not None:
+            days.append((date, day_path))
+
+    videos = []
+    for _, day_path in sorted(days):
+        for video in sorted((day_path / "videos").glob("*.mp4")):
+            if video.name.endswith(".tmp.mp4"):
+                continue
+            try:
+                if is_mjpeg_video(video):
+                    videos.append((day_path.name, video.stem))
+            except (TimeIndexError, OSError) as e:
+                logger.warning("Skipping unreadable video %s: %s", video, e)
+
+    return videos
+
+
+def machine_idle() -> bool:
+    """Check that no videos are being made and the load is low."""
+
+    if program_state.video_queue.unfinished_tasks:
+        return False
+    if any(
+        state.video_state != VideoState.IDLE
+        for state in program_state.webcam_state.values()
+    ):
+        return False
+    if not hasattr(os, "getloadavg"):
+        return True
+    return os.getloadavg()[0] / (os.process_cpu_count() or 1) < TRANSCODE_IDLE_LOAD
+
+
+def transcode_loop(threads: int | None = None):
+    """Worker that transcodes queued videos one at a time, when idle."""
+    while True:
+        day, code = transcode_queue.get()
+        while not machine_idle():
+            time.sleep(TRANSCODE_IDLE_CHECK_SECONDS)
+
+        try:
+            cam_id = WebcamID(code)
+        except ValueError:
+            cam_id = None
+
+        logger.info("Transcoding %s %s", day, code)
+        if cam_id in program_state.webcam_state:
+            program_state.update_webcam(cam_id, video_state=VideoState.TRANSCODING)
+        start = time.time()
+        try:
+            transcode_video(code, day, threads, TRANSCODE_NICE)
+            logger.info("Transcoded %s %s in %.1fs", day, code, time.time() - start)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.exception("Transcode failed: %s", e)
+        finally:
+            if cam_id in program_state.webcam_state:
+                program_state.end_video_state(cam_id, VideoState.TRANSCODING)
+
+
+def start_transcoder(
+    webcams: Collection[WebcamID] = WebcamID, threads: int | None = None
+):
+    """Queue the "mjpeg" videos of `webcams` already made and start transcoding."""
+
+    codes = {cam_id.value for cam_id in webcams}
+    videos = [(day, code) for day, code in find_mjpeg_videos() if code in codes]
+    if videos:
+        logger.info("Found %d videos to transcode", len(videos))
+    for video in videos:
+        transcode_queue.put(video)
+    Thread(target=transcode_loop, args=(threads,), daemon=True).start()
@@ -2,18 +2,31 @@
 
 import logging
 import time
+from collections.abc import Callable
+from itertools import islice
 
 from rich import box
 from rich.align import Align
+from rich.cells import cell_len
 from rich.console import Console, Group
 from rich.live import Live
 from rich.panel import Panel
 from rich.table import Table
 from rich.text import Text
 
-from sfu_webcams_recorder.config.settings import SNAPSHOT_DIR, USE_24H_CLOCK
+from sfu_webcams_recorder.config.settings import (
+    ADAPTIVE_POLLING,
+    INTERVAL,
+    NEAR_DUPLICATE_FILTER,
+    SNAPSHOT_DIR,
+    USE_24H_CLOCK,
+    WRITE_BEHIND,
+    WRITE_QUEUE_SIZE,
+)
 from sfu_webcams_recorder.ui.state import (
+    CircuitState,
     DownloadState,
+    ProgramSnapshot,
     VideoState,
     program_state,
 )
@@ -21,6 +34,22 @@ from sfu_webcams_recorder.utils import debug_enabled
 
 logger = logging.getLogger(__name__)
 
+# Redraw at least this often, so timers keep counting.
+TIMER_REDRAW_SECONDS = 1
+
+# Shortest time between redraws, so a burst of changes is drawn once.
+MIN_REDRAW_SECONDS = 0.1
+
+# Most of a CPU core spent redrawing. A slow draw waits longer for the next.
+MAX_DRAW_SHARE = 0.1
+
+# Lines the table takes besides its rows: its header, the line under it, and
+# a blank line above and below.
+TABLE_EXTRA_LINES = 4
+
+# Used to get the terminal width.
+console = Console()
+
 
 def fmt_filename_timestamp(dt):
     """Replace characters so the time can be used as a filename."""
@@ -28,10 +57,10 @@ def fmt_filename_timestamp(dt):
     return formatted.replace(":", "-").replace(" ", "_")
 
 
-def save_dashboard_snapshot():
+def save_dashboard_snapshot(snapshot: ProgramSnapshot | None = None):
     """Save an exact snapshot of the current dashboard."""
     console = Console(record=True, width=80)
-    console.print(render_table())
+    console.print(render_table(snapshot))
     text = console.export_text()
 
     ts = fmt_filename_timestamp(time.localtime())
@@ -45,18 +74,26 @@ def format_bytes(size_bytes: int) -> str:
     return f"{size_bytes / (1024**3):.2f} GB"
 
 
-def gb_per_day() -> str:
+def gb_per_day(snapshot: ProgramSnapshot) -> str:
     """Calculate GB per day downloaded."""
     now = time.time()
-    with program_state.lock:
-        total_bytes = program_state.total_downloaded_bytes
-        elapsed_seconds = max(
-            1, now - program_state.start_time
-        )  # Avoid divide by zero.
+    total_bytes = snapshot.total_downloaded_bytes
+    elapsed_seconds = max(1, now - snapshot.start_time)  # Avoid divide by zero.
     days = elapsed_seconds / 86400
     return f"{format_bytes(total_bytes / days)}/day"
 
 
+def requests_saved_per_day(snapshot: ProgramSnapshot) -> str:
+    """Calculate requests saved per day compared to downloading every INTERVAL."""
+    now = time.time()
+    requests = snapshot.total_requests
+    cameras = len(snapshot.webcam_state)
+    elapsed_seconds = max(1, now - snapshot.start_time)  # Avoid divide by zero.
+    fixed_requests = cameras * elapsed_seconds / INTERVAL
+    days = elapsed_seconds / 86400
+    return f"{(fixed_requests - requests) / days:.0f}/day"
+
+
 def fmt_seconds(value: float):
     """Format seconds as 1 decimal place, or '-' if None or 0."""
     return f"{value:.1f}s"
@@ -92,39 +129,104 @@ def fmt_duration(seconds: float) -> str:
     return " ".join(parts)
 
 
-def render_table():
-    """Render the UI table."""
+def table_width(headers: list[str], rows: list[list[str]]) -> int:
+    """Calculate the width of a table of plain text cells.
+
+    Much cheaper than measuring the Rich table, which renders every cell.
+    """
+    widths = [cell_len(header) for header in headers]
+    for row in rows:
+        widths = [max(width, cell_len(cell)) for width, cell in zip(widths, row)]
+
+    # Each cell is padded by one on both sides, and every column is bordered.
+    return min(console.width, sum(widths) + 3 * len(widths) + 1)
+
+
+def render_table(snapshot: ProgramSnapshot | None = None, height: int | None = None):
+    """Render the UI table, of this program's state unless given a snapshot.
+
+    With `height`, only the webcams that fit in that many lines are shown.
+    """
     table = Table(box=box.SIMPLE)
 
-    table.add_column("Webcam")
-    table.add_column("Downloader")
-    table.add_column("Last Download Elapsed")
-    table.add_column("Next Download Start")
-    table.add_column("Video Encoding")
-    table.add_column("Error")
+    headers = [
+        "Webcam",
+        "Downloader",
+        "Last Download Elapsed",
+        "Next Download Start",
+    ]
+    if ADAPTIVE_POLLING:
+        headers.append("Refresh Period")
+    if NEAR_DUPLICATE_FILTER:
+        headers.append("Duplicates")
+    headers += ["Video Encoding", "Error"]
+    for header in headers:
+        table.add_column(header)
+    rows = []
 
     now = time.time()
 
-    with program_state.lock:
-        for cam_id, state in program_state.webcam_state.items():
-            # Downloader column: show elapsed time if downloading, else state name.
-            if (
-                state.download_state == DownloadState.DOWNLOADING
-                and state.download_start_time
-            ):
-                downloader = fmt_seconds(now - state.download_start_time)
-            else:
-                downloader = state.download_state.name.title()
-
-            # Last download column.
-            last_download = (
-                fmt_seconds(state.last_download_elapsed_time)
-                if state.last_download_elapsed_time is not None
-                else "-"
-            )
+    if snapshot is None:
+        snapshot = program_state.snapshot()
+
+    # Calculate values for the header panel.
+    uptime = time.time() - snapshot.start_time
+
+    total_images = snapshot.total_downloaded_images
+    total_gb = format_bytes(snapshot.total_downloaded_bytes)
+    unchanged_images = snapshot.total_unchanged_images
+    saved_gb = format_bytes(snapshot.total_saved_bytes)
+    download_rate = gb_per_day(snapshot)
 
-            # Next download column.
-            next_download = "-"
+    # Create the header panel.
+    header_text = Text(
+        f"Started: {fmt_timestamp(time.localtime(snapshot.start_time))}\n"
+        f"Uptime: {fmt_duration(uptime)}\n"
+        f"Debug Enabled: {debug_enabled()}\n"
+        f"Total Downloaded: {total_gb} ({total_images} Images)\n"
+        f"Saved By Unchanged Checks: {saved_gb} ({unchanged_images} Images)\n"
+        f"Download Rate: {download_rate}"
+    )
+    if ADAPTIVE_POLLING:
+        header_text.append(
+            f"\nRequests Saved By Adaptive Polling: {requests_saved_per_day(snapshot)}"
+        )
+    if WRITE_BEHIND:
+        header_text.append(
+            f"\nWrite Queue: {snapshot.write_queue_depth}/{WRITE_QUEUE_SIZE}, "
+            f"Waited {fmt_duration(snapshot.total_write_wait_ms / 1000)}, "
+            f"Dropped {snapshot.total_dropped_writes}, "
+            f"Failed {snapshot.total_failed_writes}"
+        )
+    # Leave out the webcams that don't fit, with a row saying how many.
+    webcams = snapshot.webcam_state.items()
+    shown = len(webcams)
+    if height is not None:
+        header_lines = header_text.plain.count("\n") + 3
+        fit = max(1, height - header_lines - TABLE_EXTRA_LINES)
+        if shown > fit:
+            shown = fit - 1
+
+    for cam_id, state in islice(webcams, shown):
+        # Downloader column: show elapsed time if downloading, else state name.
+        if (
+            state.download_state == DownloadState.DOWNLOADING
+            and state.download_start_time
+        ):
+            downloader = fmt_seconds(now - state.download_start_time)
+        else:
+            downloader = state.download_state.name.title()
+
+        # Last download column.
+        last_download = (
+            fmt_seconds(state.last_download_elapsed_time)
+            if state.last_download_elapsed_time is not None
+            else "-"
+        )
+
+        # Next download column.
+        next_download = "-"
+        if state.next_run_time is not None:
             remaining_interval_time = max(0, state.next_run_time - now)
             next_download = (
                 "After Current"
@@ -133,68 +235,76 @@ def render_table():
                 else fmt_seconds(remaining_interval_time)
             )
 
-            # Video encoding column.
-            queue_list = list(program_state.video_queue.queue)
-            total_in_queue = len(queue_list)
-            if (
-                state.video_state == VideoState.ENCODING
-                and state.video_create_start_time
-            ):
-                # Currently processing.
-                encode_time = fmt_duration(now - state.video_create_start_time)
-            elif cam_id in [job[1] for job in queue_list]:
-                # Waiting in queue.
-                position = [job[1] for job in queue_list].index(cam_id) + 1
-                encode_time = f"In Queue ({position}/{total_in_queue})"
-            else:
-                # Nothing happening
-                encode_time = state.video_state.name.title()
-
-            # Error column.
-            error = state.error if state.error is not None else "-"
-
-            table.add_row(
-                cam_id.name.lower(),
-                downloader,
-                last_download,
-                next_download,
-                encode_time,
-                error,
-            )
+        row = [cam_id.name.lower(), downloader, last_download, next_download]
 
-    # Calculate values for the header panel.
-    uptime = time.time() - program_state.start_time
+        # Refresh period column.
+        if ADAPTIVE_POLLING:
+            row.append(
+                fmt_seconds(state.refresh_period)
+                if state.refresh_period is not None
+                else "-"
+            )
 
-    with program_state.lock:
-        total_images = program_state.total_downloaded_images
-        total_gb = format_bytes(program_state.total_downloaded_bytes)
-    download_rate = gb_per_day()
+        # Duplicates column.
+        if NEAR_DUPLICATE_FILTER:
+            row.append(f"{state.exact_duplicates} + {state.near_duplicates} Near")
+
+        # Video encoding column.
+        queue_position = snapshot.video_queue_positions.get(cam_id)
+        if state.video_state == VideoState.ENCODING and state.video_create_start_time:
+            # Currently processing.
+            encode_time = fmt_duration(now - state.video_create_start_time)
+        elif queue_position is not None:
+            # Waiting in queue.
+            position, total_in_queue = queue_position
+            encode_time = f"In Queue ({position}/{total_in_queue})"
+        else:
+            # Nothing happening
+            encode_time = state.video_state.name.title()
+
+        # Error column, led by the host's circuit when it isn't closed.
+        error = state.error if state.error is not None else "-"
+        if state.host_circuit == CircuitState.OPEN and state.host_retry_time:
+            retry = fmt_duration(max(0, state.host_retry_time - now))
+            error = f"Host Circuit Open (Retry In {retry}) {error}"
+        elif state.host_circuit == CircuitState.HALF_OPEN:
+            error = f"Host Circuit Half Open {error}"
+
+        rows.append(row + [encode_time, error])
+        table.add_row(*rows[-1])
+
+    if shown < len(webcams):
+        rows.append([f"+{len(webcams) - shown} More"] + [""] * (len(headers) - 1))
+        table.add_row(*rows[-1], style="dim")
 
     # Calculate table width.
-    console = Console()
-    table_width = console.measure(table).maximum
+    width = table_width(headers, rows)
 
-    # Create the header panel.
-    header_text = Text(
-        f"Started: {fmt_timestamp(time.localtime(program_state.start_time))}\n"
-        f"Uptime: {fmt_duration(uptime)}\n"
-        f"Debug Enabled: {debug_enabled()}\n"
-        f"Total Downloaded: {total_gb} ({total_images} Images)\n"
-        f"Download Rate: {download_rate}"
-    )
     header = Panel(
         header_text,
         title="SFU Webcams Recorder",
-        width=table_width,
+        width=width,
     )
 
     return Align.center(Group(header, table))
 
 
-def ui_loop():
-    """Continuously update the live Rich table."""
+def ui_loop(read_snapshot: Callable[[], ProgramSnapshot] | None = None):
+    """Update the live Rich table when the state changes, or for timers.
+
+    With `read_snapshot`, such as for the merged state of shards, the table
+    shows its snapshots and is redrawn for timers only.
+    """
+
+    def render():
+        snapshot = read_snapshot() if read_snapshot else None
+        return render_table(snapshot, height=console.height)
 
-    with Live(render_table(), refresh_per_second=10, screen=True) as live:
+    with Live(render(), auto_refresh=False, screen=True) as live:
         while True:
-            time.sleep(0.1)
-            live.update(render_table())
+            program_state.changed.wait(TIMER_REDRAW_SECONDS)
+            program_state.changed.clear()
+            start = time.perf_counter()
+            live.update(render(), refresh=True)
+            cost = time.perf_counter() - start
+            time.sleep(max(MIN_REDRAW_SECONDS, cost / MAX_DRAW_SHARE - cost))
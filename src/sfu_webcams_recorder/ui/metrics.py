@@ -0,0 +1,257 @@
+"""Prometheus metrics for downloads, duplicates and video encoding."""
+
+import bisect
+import logging
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from sfu_webcams_recorder.config.settings import METRICS_HOST, METRICS_PORT
+from sfu_webcams_recorder.config.webcams import WebcamID
+from sfu_webcams_recorder.ui.state import program_state
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the download time histogram buckets, in seconds.
+DOWNLOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """A Prometheus histogram with a single writer.
+
+    Observing takes no lock. A scrape can see an observation half recorded,
+    which is off by one at most and fixed by the next scrape.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Record a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        """Write the histogram in the Prometheus text format."""
+        counts = list(self.counts)
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        total += counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {total}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {total}")
+        return lines
+
+
+@dataclass(slots=True)
+class WebcamMetrics:
+    """Metrics for one webcam.
+
+    Download fields are only written by the webcam's downloader, and encode
+    fields by the video worker encoding it.
+    """
+
+    download_seconds: Histogram = field(
+        default_factory=lambda: Histogram(DOWNLOAD_BUCKETS)
+    )
+    # Failed downloads, including duplicates, by exception type.
+    errors: dict[str, int] = field(default_factory=dict)
+    encodes: int = 0
+    encode_seconds: float = 0.0
+    encoded_frames: int = 0
+    last_encode_seconds: float | None = None
+    last_encode_frames: int | None = None
+
+
+# The metrics of each webcam.
+webcam_metrics: dict[WebcamID, WebcamMetrics] = {}
+
+
+def metrics_for(cam_id: WebcamID) -> WebcamMetrics:
+    """Get a webcam's metrics."""
+    metrics = webcam_metrics.get(cam_id)
+    if metrics is None:
+        metrics = webcam_metrics.setdefault(cam_id, WebcamMetrics())
+    return metrics
+
+
+def record_download(cam_id: WebcamID, elapsed: float, error: str | None):
+    """Record a download and the exception type it failed with, if any."""
+    metrics = metrics_for(cam_id)
+    metrics.download_seconds.observe(elapsed)
+    if error is not None:
+        metrics.errors[error] = metrics.errors.get(error, 0) + 1
+
+
+def record_encode(cam_id: WebcamID, elapsed: float, frames: int):
+    """Record a finished video encode."""
+    metrics = metrics_for(cam_id)
+    metrics.encodes += 1
+    metrics.encode_seconds += elapsed
+    metrics.encoded_frames += frames
+    metrics.last_encode_seconds = elapsed
+    metrics.last_encode_frames = frames
+
+
+def render_metrics() -> str:
+    """Write every metric in the Prometheus text format."""
+
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    totals = (
+        ("downloaded_bytes", program_state.total_downloaded_bytes, "Bytes downloaded."),
+        (
+            "downloaded_images",
+            program_state.total_downloaded_images,
+            "Images downloaded.",
+        ),
+        ("requests", program_state.total_requests, "Download requests made."),
+        (
+            "unchanged_images",
+            program_state.total_unchanged_images,
+            "Downloads skipped because the image had not changed.",
+        ),
+        (
+            "saved_bytes",
+            program_state.total_saved_bytes,
+            "Bytes not downloaded because the image had not changed.",
+        ),
+        (
+            "write_wait_ms",
+            program_state.total_write_wait_ms,
+            "Milliseconds downloads waited for space in the write queue.",
+        ),
+        (
+            "dropped_writes",
+            program_state.total_dropped_writes,
+            "Images dropped because the write queue was full.",
+        ),
+        (
+            "failed_writes",
+            program_state.total_failed_writes,
+            "Images that could not be written.",
+        ),
+    )
+    for name, counter, help_text in totals:
+        metric(f"sfu_webcams_{name}_total", "counter", help_text)
+        lines.append(f"sfu_webcams_{name}_total {counter.value()}")
+
+    metric("sfu_webcams_video_queue_depth", "gauge", "Video jobs waiting.")
+    lines.append(
+        "sfu_webcams_video_queue_depth "
+        f"{program_state.video_jobs_added - program_state.video_jobs_taken}"
+    )
+
+    write_queue_depth = (
+        program_state.total_queued_writes.value()
+        - program_state.total_finished_writes.value()
+    )
+    metric("sfu_webcams_write_queue_depth", "gauge", "Images waiting to be written.")
+    lines.append(f"sfu_webcams_write_queue_depth {write_queue_depth}")
+
+    webcams = sorted(
+        (cam_id.name.lower(), metrics)
+        for cam_id, metrics in list(webcam_metrics.items())
+    )
+
+    metric(
+        "sfu_webcams_download_seconds",
+        "histogram",
+        "Time taken by each download.",
+    )
+    for code, metrics in webcams:
+        lines += metrics.download_seconds.lines(
+            "sfu_webcams_download_seconds", f'webcam="{code}"'
+        )
+
+    metric(
+        "sfu_webcams_download_errors_total",
+        "counter",
+        "Failed downloads, including duplicates, by exception type.",
+    )
+    for code, metrics in webcams:
+        for error, count in sorted(list(metrics.errors.items())):
+            lines.append(
+                "sfu_webcams_download_errors_total"
+                f'{{webcam="{code}",type="{error}"}} {count}'
+            )
+
+    per_webcam = (
+        ("encodes_total", "counter", "Videos encoded.", "encodes"),
+        (
+            "encode_seconds_total",
+            "counter",
+            "Time spent encoding videos.",
+            "encode_seconds",
+        ),
+        ("encoded_frames_total", "counter", "Frames encoded.", "encoded_frames"),
+        (
+            "last_encode_seconds",
+            "gauge",
+            "Time taken by the last video encode.",
+            "last_encode_seconds",
+        ),
+        (
+            "last_encode_frames",
+            "gauge",
+            "Frames in the last video encoded.",
+            "last_encode_frames",
+        ),
+    )
+    for name, kind, help_text, attribute in per_webcam:
+        metric(f"sfu_webcams_{name}", kind, help_text)
+        for code, metrics in webcams:
+            value = getattr(metrics, attribute)
+            if value is not None:
+                lines.append(f'sfu_webcams_{name}{{webcam="{code}"}} {value}')
+
+    metric(
+        "sfu_webcams_last_encode_fps",
+        "gauge",
+        "Frames per second of the last video encode.",
+    )
+    for code, metrics in webcams:
+        if metrics.last_encode_seconds:
+            fps = metrics.last_encode_frames / metrics.last_encode_seconds
+            lines.append(f'sfu_webcams_last_encode_fps{{webcam="{code}"}} {fps}')
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the metrics at /metrics."""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(
+    host: str = METRICS_HOST, port: int = METRICS_PORT
+) -> ThreadingHTTPServer:
+    """Serve the metrics on a background thread."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving metrics at http://%s:%d/metrics", host, port)
+    return server
@@ -1,10 +1,12 @@
 """The program state."""
 
+import copy
 import time
-from dataclasses import dataclass, field
+from collections import deque
+from dataclasses import dataclass, field, fields
 from enum import StrEnum, auto
 from queue import Queue
-from threading import Condition, Lock
+from threading import Condition, Event, Lock, local
 
 from sfu_webcams_recorder.config.webcams import WebcamID
 
@@ -21,12 +23,53 @@ class VideoState(StrEnum):
     """The webcam video creation states."""
 
     IDLE = auto()
+    SEGMENTING = auto()
     ENCODING = auto()
+    TRANSCODING = auto()
+
+
+class CircuitState(StrEnum):
+    """The circuit breaker states of a webcam host."""
+
+    CLOSED = auto()
+    OPEN = auto()
+    HALF_OPEN = auto()
+
+
+class Counter:
+    """A total that many threads add to without sharing a lock.
+
+    Each thread adds to its own cell, and reading the total sums the cells.
+    """
+
+    def __init__(self):
+        self.local = local()
+        self.cells: list[list[int]] = []
+        self.cells_lock = Lock()
+
+    def add(self, amount: int = 1):
+        """Add to the total."""
+        cell = getattr(self.local, "cell", None)
+        if cell is None:
+            cell = [0]
+            self.local.cell = cell
+            with self.cells_lock:
+                self.cells.append(cell)
+        cell[0] += amount
+
+    def value(self) -> int:
+        """Get the total."""
+        with self.cells_lock:
+            cells = list(self.cells)
+        return sum(cell[0] for cell in cells)
 
 
 @dataclass(slots=True)
 class WebcamState:
-    """State for a webcam thread."""
+    """State for a webcam thread.
+
+    Only change it through `ProgramState.update_webcam`, which holds `lock`.
+    """
 
     download_state: DownloadState = DownloadState.SLEEPING
     video_state: VideoState = VideoState.IDLE
@@ -34,7 +77,106 @@ class WebcamState:
     last_download_elapsed_time: float | None = None
     next_run_time: float | None = None
     video_create_start_time: float | None = None
+    refresh_period: float | None = None
     error: str | None = None
+    # The webcam host's circuit, and when an open circuit lets a download
+    # through again.
+    host_circuit: CircuitState = CircuitState.CLOSED
+    host_retry_time: float | None = None
+    # Images rejected as identical to, or looking the same as, the previous.
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    # Guards this webcam's fields. Each webcam has its own lock, so webcams
+    # don't wait on each other.
+    lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        """Get the fields as JSON-ready values."""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "lock"}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WebcamState":
+        """Build a state from `to_dict` values."""
+        state = cls(**data)
+        state.download_state = DownloadState(state.download_state)
+        state.video_state = VideoState(state.video_state)
+        state.host_circuit = CircuitState(state.host_circuit)
+        return state
+
+
+@dataclass(slots=True)
+class ProgramSnapshot:
+    """A copy of the program state for readers such as the UI."""
+
+    webcam_state: dict[WebcamID, WebcamState]
+    start_time: float
+    total_downloaded_bytes: int
+    total_downloaded_images: int
+    total_requests: int
+    total_unchanged_images: int
+    total_saved_bytes: int
+    write_queue_depth: int
+    total_write_wait_ms: int
+    total_dropped_writes: int
+    total_failed_writes: int
+    # Each webcam's first position in the video queue, and the queue's length.
+    video_queue_positions: dict[WebcamID, tuple[int, int]] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        """Get the snapshot as JSON-ready values."""
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        data["webcam_state"] = {
+            cam_id: state.to_dict() for cam_id, state in self.webcam_state.items()
+        }
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProgramSnapshot":
+        """Build a snapshot from `to_dict` values, skipping unknown webcams."""
+
+        data = dict(data)
+        known = {cam_id.value for cam_id in WebcamID}
+        data["webcam_state"] = {
+            WebcamID(code): WebcamState.from_dict(state)
+            for code, state in data["webcam_state"].items()
+            if code in known
+        }
+        data["video_queue_positions"] = {
+            WebcamID(code): tuple(position)
+            for code, position in data.get("video_queue_positions", {}).items()
+            if code in known
+        }
+        return cls(**data)
+
+
+def merge_snapshots(snapshots: list[ProgramSnapshot]) -> ProgramSnapshot:
+    """Combine the snapshots of several shards into one.
+
+    Webcams are listed in registry order and the totals are added up.
+    """
+
+    webcam_state = {}
+    positions = {}
+    for snapshot in snapshots:
+        webcam_state.update(snapshot.webcam_state)
+        positions.update(snapshot.video_queue_positions)
+    order = {cam_id: i for i, cam_id in enumerate(WebcamID)}
+
+    return ProgramSnapshot(
+        webcam_state=dict(sorted(webcam_state.items(), key=lambda kv: order[kv[0]])),
+        start_time=min((s.start_time for s in snapshots), default=time.time()),
+        total_downloaded_bytes=sum(s.total_downloaded_bytes for s in snapshots),
+        total_downloaded_images=sum(s.total_downloaded_images for s in snapshots),
+        total_requests=sum(s.total_requests for s in snapshots),
+        total_unchanged_images=sum(s.total_unchanged_images for s in snapshots),
+        total_saved_bytes=sum(s.total_saved_bytes for s in snapshots),
+        write_queue_depth=sum(s.write_queue_depth for s in snapshots),
+        total_write_wait_ms=sum(s.total_write_wait_ms for s in snapshots),
+        total_dropped_writes=sum(s.total_dropped_writes for s in snapshots),
+        total_failed_writes=sum(s.total_failed_writes for s in snapshots),
+        video_queue_positions=positions,
+    )
 
 
 @dataclass(slots=True)
@@ -46,15 +188,131 @@ class ProgramState:
 
     # State for UI panel information.
     start_time: float = field(default_factory=time.time)
-    total_downloaded_bytes: int = 0
-    total_downloaded_images: int = 0
+    total_downloaded_bytes: Counter = field(default_factory=Counter)
+    total_downloaded_images: Counter = field(default_factory=Counter)
+    total_requests: Counter = field(default_factory=Counter)
+    total_unchanged_images: Counter = field(default_factory=Counter)
+    total_saved_bytes: Counter = field(default_factory=Counter)
+
+    # State for the write-behind queue.
+    total_queued_writes: Counter = field(default_factory=Counter)
+    total_finished_writes: Counter = field(default_factory=Counter)
+    total_write_wait_ms: Counter = field(default_factory=Counter)
+    total_dropped_writes: Counter = field(default_factory=Counter)
+    total_failed_writes: Counter = field(default_factory=Counter)
 
     # Video worker queue and condition.
     video_queue: Queue = field(default_factory=Queue)
     video_condition: Condition = field(default_factory=Condition)
 
-    # The program lock.
-    lock: Lock = field(default_factory=Lock)
+    # Queue positions of video jobs. Each webcam's queued jobs are numbered in
+    # the order they were added, so a position is found without a scan.
+    video_jobs_added: int = 0
+    video_jobs_taken: int = 0
+    video_queue_index: dict[WebcamID, deque[int]] = field(default_factory=dict)
+
+    # Set whenever the state changes, so the UI knows to redraw.
+    changed: Event = field(default_factory=Event)
+
+    def update_webcam(self, cam_id: WebcamID, **changes):
+        """Change fields of a webcam's state, then tell the UI it changed."""
+        state = self.webcam_state[cam_id]
+        with state.lock:
+            for name, value in changes.items():
+                setattr(state, name, value)
+        self.mark_changed()
+
+    def end_video_state(self, cam_id: WebcamID, video_state: VideoState, **changes):
+        """Set a webcam's video state back to idle if it is still `video_state`.
+
+        Another job may have set its own state since, such as a daily video
+        waiting for a segment encode to finish. `changes` are made either way.
+        """
+        state = self.webcam_state[cam_id]
+        with state.lock:
+            if state.video_state == video_state:
+                state.video_state = VideoState.IDLE
+            for name, value in changes.items():
+                setattr(state, name, value)
+        self.mark_changed()
+
+    def mark_changed(self):
+        """Tell the UI the state changed."""
+        # Setting the event takes its lock, so skip it when already set.
+        if not self.changed.is_set():
+            self.changed.set()
+
+    def snapshot(self) -> ProgramSnapshot:
+        """Copy the program state.
+
+        Each webcam's state is copied as a whole, and the totals are read
+        without stopping the threads adding to them.
+        """
+        webcam_state = {}
+        for cam_id, state in list(self.webcam_state.items()):
+            with state.lock:
+                webcam_state[cam_id] = copy.copy(state)
+
+        return ProgramSnapshot(
+            webcam_state=webcam_state,
+            start_time=self.start_time,
+            total_downloaded_bytes=self.total_downloaded_bytes.value(),
+            total_downloaded_images=self.total_downloaded_images.value(),
+            total_requests=self.total_requests.value(),
+            total_unchanged_images=self.total_unchanged_images.value(),
+            total_saved_bytes=self.total_saved_bytes.value(),
+            write_queue_depth=(
+                self.total_queued_writes.value() - self.total_finished_writes.value()
+            ),
+            total_write_wait_ms=self.total_write_wait_ms.value(),
+            total_dropped_writes=self.total_dropped_writes.value(),
+            total_failed_writes=self.total_failed_writes.value(),
+            video_queue_positions={
+                cam_id: position
+                for cam_id in webcam_state
+                if (position := self.video_queue_position(cam_id)) is not None
+            },
+        )
+
+    def put_video_job(self, day: str, cam_id: WebcamID):
+        """Add a video job to the queue and notify a worker."""
+        with self.video_condition:
+            self.video_queue_index.setdefault(cam_id, deque()).append(
+                self.video_jobs_added
+            )
+            self.video_jobs_added += 1
+            self.video_queue.put((day, cam_id))
+            self.video_condition.notify()
+        self.mark_changed()
+
+    def take_video_job(self) -> tuple[str, WebcamID]:
+        """Wait for and remove the next video job from the queue."""
+        with self.video_condition:
+            while self.video_queue.empty():
+                # Wait until a job is added.
+                self.video_condition.wait()
+
+            day, cam_id = self.video_queue.get()
+            self.video_queue_index[cam_id].popleft()
+            self.video_jobs_taken += 1
+        self.mark_changed()
+        return day, cam_id
+
+    def queued_video_jobs(self) -> list[tuple[str, WebcamID]]:
+        """Get the video jobs waiting in the queue, in order."""
+        with self.video_condition:
+            return list(self.video_queue.queue)
+
+    def video_queue_position(self, cam_id: WebcamID) -> tuple[int, int] | None:
+        """Get a webcam's first position in the video queue, and its length."""
+        with self.video_condition:
+            queued = self.video_queue_index.get(cam_id)
+            if not queued:
+                return None
+            return (
+                queued[0] - self.video_jobs_taken + 1,
+                self.video_jobs_added - self.video_jobs_taken,
+            )
 
 
 # Singleton instance of program-wide state
@@ -0,0 +1,98 @@
+"""Serve the program's state as JSON on a local Unix socket.
+
+Each connection gets one `ProgramSnapshot.to_dict` as a JSON line, then the
+socket is closed. The `status` and `top` commands read it to show the
+dashboard of a recorder running headless, such as under systemd.
+"""
+
+import json
+import logging
+import socket
+import socketserver
+from collections.abc import Callable
+from pathlib import Path
+from threading import Thread
+
+from sfu_webcams_recorder.config.settings import STATUS_SOCKET
+from sfu_webcams_recorder.ui.state import ProgramSnapshot, program_state
+
+logger = logging.getLogger(__name__)
+
+# Seconds a client waits for the status.
+STATUS_CLIENT_TIMEOUT_SECONDS = 5
+
+
+class StatusHandler(socketserver.StreamRequestHandler):
+    """Send one snapshot to a client."""
+
+    def handle(self):
+        snapshot = self.server.read_snapshot()
+        self.wfile.write(json.dumps(snapshot.to_dict()).encode() + b"\n")
+
+
+class StatusServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A Unix socket server of snapshots."""
+
+    daemon_threads = True
+
+    def __init__(self, path: Path, read_snapshot: Callable[[], ProgramSnapshot]):
+        self.read_snapshot = read_snapshot
+        super().__init__(str(path), StatusHandler)
+
+    def handle_error(self, request, client_address):
+        # Log instead of printing over the dashboard.
+        logger.exception("Status request failed")
+
+
+def status_server_running(path: Path) -> bool:
+    """Check whether a program is already serving its status at a path."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(path))
+    except OSError:
+        return False
+    return True
+
+
+def start_status_server(
+    path: Path = STATUS_SOCKET,
+    read_snapshot: Callable[[], ProgramSnapshot] = program_state.snapshot,
+) -> StatusServer | None:
+    """Serve snapshots at a path on a background thread.
+
+    A socket left behind by a program that stopped is replaced. Returns None
+    where Unix sockets aren't supported, or if another program is serving.
+    """
+
+    if not hasattr(socket, "AF_UNIX"):
+        logger.warning("Status socket not supported on this platform")
+        return None
+    if status_server_running(path):
+        logger.warning("Another program is serving its status at %s", path)
+        return None
+
+    path.unlink(missing_ok=True)
+    server = StatusServer(path, read_snapshot)
+    Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving status at %s", path)
+    return server
+
+
+def stop_status_server(server: StatusServer | None):
+    """Stop serving and remove the socket."""
+    if server is None:
+        return
+    server.shutdown()
+    server.server_close()
+    Path(server.server_address).unlink(missing_ok=True)
+
+
+def read_status(path: Path = STATUS_SOCKET) -> ProgramSnapshot:
+    """Get a snapshot from a running program's status socket."""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(STATUS_CLIENT_TIMEOUT_SECONDS)
+        sock.connect(str(path))
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    return ProgramSnapshot.from_dict(json.loads(line))
@@ -0,0 +1,218 @@
+"""Time the phases of each download, and report on them.
+
+With `TRACE_DOWNLOADS`, each download gets a trace that its phases add their
+times to. Finished traces go in a fixed-size ring buffer in memory, which a
+background thread writes to `TRACE_FILE` as JSON lines. When tracing is off, a
+phase costs a thread-local lookup.
+"""
+
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock, Thread, local
+
+from sfu_webcams_recorder.config.settings import (
+    TRACE_BUFFER_SIZE,
+    TRACE_DOWNLOADS,
+    TRACE_FILE,
+    TRACE_MAX_BYTES,
+    TRACE_WRITE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Phases in the order they happen. "wait" is for a free download slot of the
+# host, "connect" and "tls" are only timed when a new connection is made, and
+# "ttfb" is from sending the request to having the response headers.
+PHASES = ("wait", "connect", "tls", "ttfb", "body", "dedup", "write", "total")
+
+# Percentiles in the report.
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass(slots=True)
+class DownloadTrace:
+    """The phase times of one download."""
+
+    code: str
+    start: float
+    counter_start: float
+    # Seconds spent in each phase.
+    phases: dict[str, float] = field(default_factory=dict)
+    outcome: str = "saved"
+
+    def add(self, phase: str, seconds: float):
+        """Add time to a phase."""
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def to_line(self) -> str:
+        """Write the trace as a compact JSON line, with times in milliseconds."""
+        ms = {phase: round(seconds * 1000, 2) for phase, seconds in self.phases.items()}
+        return json.dumps(
+            {
+                "t": round(self.start, 3),
+                "cam": self.code,
+                "out": self.outcome,
+                "ms": ms,
+            },
+            separators=(",", ":"),
+        )
+
+
+# The trace of the download running on each thread.
+current = local()
+
+
+def current_trace() -> DownloadTrace | None:
+    """Get the trace of this thread's download, if it's being traced."""
+    return getattr(current, "trace", None)
+
+
+@contextmanager
+def span(phase: str) -> Iterator[None]:
+    """Time a phase of this thread's download."""
+
+    trace = getattr(current, "trace", None)
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(phase, time.perf_counter() - start)
+
+
+class Tracer:
+    """Collect finished traces in a ring buffer and write them in the background."""
+
+    def __init__(
+        self, path: Path, size: int = TRACE_BUFFER_SIZE, enabled: bool = TRACE_DOWNLOADS
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.buffer: deque[DownloadTrace] = deque(maxlen=size)
+        self.lock = Lock()
+
+    def begin(self, code: str) -> DownloadTrace | None:
+        """Start tracing a download on this thread, if tracing is on."""
+
+        if not self.enabled:
+            return None
+        trace = DownloadTrace(code, time.time(), time.perf_counter())
+        current.trace = trace
+        return trace
+
+    def end(self, trace: DownloadTrace | None, error: str | None = None):
+        """Finish a download's trace and buffer it."""
+
+        if trace is None:
+            return
+        trace.phases["total"] = time.perf_counter() - trace.counter_start
+        if error is not None:
+            trace.outcome = error
+        current.trace = None
+        # Appending to a deque is thread safe.
+        self.buffer.append(trace)
+
+    def write(self):
+        """Write the buffered traces to the trace file."""
+
+        with self.lock:
+            traces = []
+            while self.buffer:
+                traces.append(self.buffer.popleft())
+            if not traces:
+                return
+
+            if self.path.exists() and self.path.stat().st_size >= TRACE_MAX_BYTES:
+                self.path.replace(self.path.with_name(self.path.name + ".1"))
+            with self.path.open("a") as f:
+                f.writelines(trace.to_line() + "\n" for trace in traces)
+
+    def loop(self):
+        """Write the buffered traces every `TRACE_WRITE_SECONDS`."""
+        while True:
+            time.sleep(TRACE_WRITE_SECONDS)
+            try:
+                self.write()
+            except OSError as e:
+                logger.exception("Trace write failed: %s", e)
+
+    def start(self):
+        """Start writing traces in the background."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        Thread(target=self.loop, daemon=True).start()
+
+
+def read_traces(paths: list[Path], since: float = 0) -> list[dict]:
+    """Read the traces started at or after `since`. Torn lines are skipped."""
+
+    traces = []
+    for path in paths:
+        try:
+            lines = path.read_text().splitlines()
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            try:
+                trace = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if trace["t"] >= since:
+                traces.append(trace)
+    return traces
+
+
+def trace_files(path: Path = TRACE_FILE) -> list[Path]:
+    """Find the trace files of every shard, older files first."""
+    pattern = f"{path.stem}*{path.suffix}"
+    return sorted(path.parent.glob(pattern + ".1")) + sorted(path.parent.glob(pattern))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Get a percentile of sorted values, by the nearest rank."""
+    rank = max(1, round(pct / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def phase_percentiles(
+    traces: list[dict],
+) -> dict[str, dict[str, tuple[int, list[float]]]]:
+    """Get the count and percentiles of each webcam's phase times, in ms.
+
+    Downloads that skipped a phase, such as "connect" on a reused connection,
+    are left out of that phase.
+    """
+
+    times: dict[str, dict[str, list[float]]] = {}
+    for trace in traces:
+        phases = times.setdefault(trace["cam"], {})
+        for phase, ms in trace["ms"].items():
+            phases.setdefault(phase, []).append(ms)
+
+    report = {}
+    for code in sorted(times):
+        report[code] = {}
+        for phase in sorted(times[code], key=phase_order):
+            values = sorted(times[code][phase])
+            report[code][phase] = (
+                len(values),
+                [percentile(values, pct) for pct in PERCENTILES],
+            )
+    return report
+
+
+def phase_order(phase: str) -> int:
+    """Sort known phases in order, before any others."""
+    return PHASES.index(phase) if phase in PHASES else len(PHASES)
+
+
+# Singleton instance of the tracer.
+tracer = Tracer(TRACE_FILE)
@@ -25,6 +25,15 @@ def day_folder_name(dt=None):
     return f"{dt.year}-{dt.month}-{dt.day}-{dt.strftime('%a').lower()[:3]}"
 
 
+def parse_day_folder_name(name: str) -> datetime.date | None:
+    """Get the date of a day folder name, or None if it isn't one."""
+    try:
+        year, month, day, _ = name.split("-")
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
 def debug_enabled():
     """Check if any debug option is enabled."""
     return (